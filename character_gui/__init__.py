@@ -1 +1,20 @@
-from character_gui import character_generator, extra_types
+from character_gui import (
+    background_writer,
+    batch_pricing,
+    character_generator,
+    character_io,
+    character_overlay,
+    character_pdf,
+    compact_character,
+    edit_history,
+    edit_journal,
+    extra_types,
+    npc_generator,
+    requirements,
+    roster_analytics,
+    roster_index,
+    rules_engine,
+    stat_scheduler,
+    template_compiler,
+    xp_planner,
+)
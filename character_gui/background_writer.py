@@ -0,0 +1,97 @@
+import threading
+from collections.abc import Callable, Hashable
+
+type WriteJob = Callable[[], str]
+type DoneCallback = Callable[[Hashable, str, bool], None]
+
+
+class BackgroundWriter:
+    """
+    Run file writes, one at a time, on a worker thread, so that a slow disk
+    or network share does not block the editor.
+
+    Jobs are submitted under a key, for example the kind of write and the
+    path. A job that is still waiting is replaced when a new one is submitted
+    under the same key, so repeated clicks only write the latest state. A job
+    that has already started runs to completion and the new one runs after
+    it.
+
+    The job returns a status message. When it is done, on_done is called
+    from the worker thread with the key, the message or the error, and
+    whether it failed.
+    """
+
+    def __init__(self, on_done: DoneCallback | None = None) -> None:
+        self._on_done = on_done
+        self._pending: dict[Hashable, WriteJob] = dict()
+        self._running: Hashable | None = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._work, name="BackgroundWriter", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, key: Hashable, job: WriteJob) -> bool:
+        """
+        Queue a job. Returns True if it replaced a waiting job with the same
+        key.
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The writer is closed")
+            superseded = self._pending.pop(key, None) is not None
+            self._pending[key] = job
+            self._condition.notify()
+        return superseded
+
+    def is_busy(self, key: Hashable | None = None) -> bool:
+        """
+        Whether a job is waiting or running, for the given key or any key.
+        """
+        with self._condition:
+            if key is None:
+                return bool(self._pending) or self._running is not None
+            return key in self._pending or self._running == key
+
+    def wait(self) -> None:
+        """
+        Block until every submitted job is done.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._pending and self._running is None
+            )
+
+    def close(self) -> None:
+        """
+        Finish the submitted jobs and stop the worker thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                key = next(iter(self._pending))
+                job = self._pending.pop(key)
+                self._running = key
+
+            try:
+                message = job()
+                failed = False
+            except Exception as error:
+                # Report anything, a failed write must not stop the worker
+                message = repr(error)
+                failed = True
+
+            if self._on_done is not None:
+                self._on_done(key, message, failed)
+            with self._condition:
+                self._running = None
+                self._condition.notify_all()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+from character_io import get_character_save_location
+from compact_character import CompactCharacter
+from rules_engine import RulesEngine
+from template_compiler import CompiledTemplate
+
+
+def _gather(table: np.ndarray, index: np.ndarray, name: str) -> np.ndarray:
+    """
+    Look up table[index] for every index, with the same negative index
+    behaviour and IndexError as indexing the list in the scalar rules.
+    """
+    index = np.where(index < 0, index + len(table), index)
+    if index.size and (index.min() < 0 or index.max() >= len(table)):
+        raise IndexError(f"{name} index out of range")
+    return table[index]
+
+
+class BatchPricer:
+    """
+    Price many characters of the same template and config at once, with the
+    same results as RulesEngine.get_stats() and get_total_xp_usage().
+
+    The values of the characters form a matrix with a row per character and
+    a column per property id. Skill costs are gathered from a padded table
+    with a row per skill, trait, expertise and psychotic costs are dot
+    products of the checked columns with the costs, and the derived stats are
+    gathers in the config tables.
+    """
+
+    xp_per_ap = RulesEngine.xp_per_ap
+
+    def __init__(self, template: CompiledTemplate, config: dict) -> None:
+        self._template = template
+        self._config = config
+
+        def get_ids(kind: str) -> np.ndarray:
+            return np.array(
+                [
+                    template.get_property_id(name)
+                    for name in template.get_property_names(kind)
+                ],
+                dtype=np.intp,
+            )
+
+        self._attribute_ids = get_ids("attribute")
+        self._skill_ids = get_ids("skill")
+        self._skill_names = template.get_property_names("skill")
+        cost_tables = []
+        for skill in self._skill_names:
+            cost_table = template.get_record(skill).cost_table
+            if cost_table is None:
+                cost_table = config["skill_cost_table"]
+            cost_tables.append(cost_table)
+        self._skill_table_lengths = np.array(
+            [len(cost_table) for cost_table in cost_tables], dtype=np.int64
+        )
+        self._skill_cost_tables = np.zeros(
+            (len(cost_tables), max(self._skill_table_lengths, default=0)),
+            dtype=np.int64,
+        )
+        for row, cost_table in enumerate(cost_tables):
+            self._skill_cost_tables[row, : len(cost_table)] = cost_table
+
+        self._checked_ids = dict()
+        self._checked_costs = dict()
+        for kind in ("trait", "expertise", "psychotic"):
+            self._checked_ids[kind] = get_ids(kind)
+            self._checked_costs[kind] = np.array(
+                [
+                    template.get_record(name).cost
+                    for name in template.get_property_names(kind)
+                ],
+                dtype=np.int64,
+            )
+
+        self._rank_bonus = np.array(config["Rank Bonus"], dtype=np.int64)
+        self._carry_capacity = np.array(config["Carry Capacity Table"], dtype=np.int64)
+        self._combat_load = np.array(config["Combat Load Table"], dtype=np.int64)
+
+    def _get_column(self, values: np.ndarray, name: str) -> np.ndarray:
+        return values[:, self._template.get_property_id(name)]
+
+    def _get_knowledge_cost(self, values: np.ndarray) -> np.ndarray:
+        levels = values[:, self._skill_ids]
+        levels = np.where(levels < 0, levels + self._skill_table_lengths, levels)
+        out_of_range = (levels < 0) | (levels >= self._skill_table_lengths)
+        if out_of_range.any():
+            _, column = np.argwhere(out_of_range)[0]
+            raise IndexError(f"{self._skill_names[column]} level out of range")
+        skill_rows = np.arange(len(self._skill_ids))
+        return self._skill_cost_tables[skill_rows, levels].sum(axis=1)
+
+    def _get_property_cost(self, values: np.ndarray, kind: str) -> np.ndarray:
+        checked = values[:, self._checked_ids[kind]] != 0
+        return checked.astype(np.int64) @ self._checked_costs[kind]
+
+    def price(self, values: np.ndarray, ranks: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Price a matrix of values, one row per character, and the rank of each
+        character. Returns "XP Usage" and every derived stat, with one entry
+        per character.
+        """
+        values = values.astype(np.int64)
+        config = self._config
+        total_attribute_cost = values[:, self._attribute_ids].sum(axis=1)
+        extra_attribute_points = np.maximum(
+            total_attribute_cost - config["Starting AP"], 0
+        )
+        xp_usage = (
+            self._get_knowledge_cost(values)
+            + self._get_property_cost(values, "expertise")
+            + self._get_property_cost(values, "trait")
+            + self.xp_per_ap * extra_attribute_points
+        )
+        num_traits = (values[:, self._checked_ids["trait"]] != 0).sum(axis=1) + (
+            values[:, self._checked_ids["psychotic"]] != 0
+        ).sum(axis=1)
+
+        strength_index = self._get_column(values, "Strength") - 1
+        psyche = self._get_column(values, "Psyche")
+        charisma = self._get_column(values, "Charisma")
+        rank_bonus = _gather(self._rank_bonus, ranks.astype(np.int64), "Rank Bonus")
+        return {
+            "XP Usage": xp_usage,
+            "Carry Capacity": _gather(
+                self._carry_capacity, strength_index, "Carry Capacity Table"
+            ),
+            "Combat Load": _gather(
+                self._combat_load, strength_index, "Combat Load Table"
+            ),
+            "Psycho Limit": psyche,
+            "Stress Limit": psyche * 2,
+            "Stunt Cap": charisma,
+            "Leadership Points": charisma + rank_bonus - 2,
+            "Health": self._get_column(values, "Endurance") + 3,
+            "Psycho Points": config.get("Psycho Points", 0)
+            - self._get_property_cost(values, "psychotic"),
+            "Attribute Points": np.maximum(
+                config["Starting AP"] - total_attribute_cost, 0
+            ),
+            "Extra Attribute Points": extra_attribute_points,
+            "Experience Points": config["Starting XP"] - xp_usage,
+            "Available Traits": config["Starting Traits"] - num_traits,
+        }
+
+
+def get_value_matrix(characters: Sequence[CompactCharacter]) -> np.ndarray:
+    """
+    The values of characters of the same template, a row per character.
+    """
+    num_properties = len(characters[0].get_values())
+    buffer = b"".join(character.get_values().tobytes() for character in characters)
+    return np.frombuffer(buffer, dtype=np.dtype(CompactCharacter.typecode)).reshape(
+        len(characters), num_properties
+    )
+
+
+def get_pricing_key(template: CompiledTemplate) -> tuple:
+    """
+    Everything in a template that prices use: the properties in id order with
+    their kind and costs. Templates with the same key price the same values
+    the same way, even when compiled from different characters.
+    """
+    return tuple(
+        (
+            record.name,
+            record.kind,
+            record.cost,
+            None if record.cost_table is None else tuple(record.cost_table),
+        )
+        for record in template.get_records()
+    )
+
+
+def group_characters(characters: Sequence[CompactCharacter]) -> list[list[int]]:
+    """
+    The indices of the characters, grouped by the pricing key of the template
+    and the content of the config. Characters loaded from files in the full
+    format each have a template and config of their own, so these are
+    compared by content rather than by identity.
+    """
+    template_keys: dict[int, tuple] = dict()
+    config_keys: dict[int, str] = dict()
+    groups: dict[tuple[tuple, str], list[int]] = dict()
+    for index, character in enumerate(characters):
+        template = character.get_template()
+        config = character.get_config()
+        if id(template) not in template_keys:
+            template_keys[id(template)] = get_pricing_key(template)
+        if id(config) not in config_keys:
+            config_keys[id(config)] = json.dumps(config, sort_keys=True)
+        key = (template_keys[id(template)], config_keys[id(config)])
+        groups.setdefault(key, []).append(index)
+    return list(groups.values())
+
+
+def price_characters(
+    characters: Sequence[CompactCharacter],
+) -> dict[str, np.ndarray]:
+    """
+    Price characters in batches of the same template and config, see
+    group_characters(). The results are in the order of the characters.
+    """
+    prices: dict[str, np.ndarray] = dict()
+    for indices in group_characters(characters):
+        group = [characters[index] for index in indices]
+        pricer = BatchPricer(group[0].get_template(), group[0].get_config())
+        ranks = np.array([character.get_player_info("Rank") for character in group])
+        for name, result in pricer.price(get_value_matrix(group), ranks).items():
+            if name not in prices:
+                prices[name] = np.zeros(len(characters), dtype=np.int64)
+            prices[name][indices] = result
+    return prices
+
+
+def load_characters(
+    directory: Path,
+) -> tuple[list[Path], list[CompactCharacter]]:
+    """
+    Load every character file in a directory. Files that can not be loaded
+    are reported and skipped.
+    """
+    character_files = []
+    characters = []
+    for character_path in sorted(directory.glob("*.json")):
+        try:
+            characters.append(CompactCharacter.from_json(character_path))
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            print(f"{character_path.name}: FAILED {error!r}")
+            continue
+        character_files.append(character_path)
+    return character_files, characters
+
+
+def verify_prices(
+    characters: Sequence[CompactCharacter], prices: dict[str, np.ndarray]
+) -> list[str]:
+    """
+    Compare batch prices with the scalar rules. Returns the mismatches.
+    """
+    mismatches = []
+    for index, character in enumerate(characters):
+        rules = RulesEngine(character)
+        expected = {"XP Usage": rules.get_total_xp_usage(), **rules.get_stats()}
+        for name, value in expected.items():
+            if prices[name][index] != value:
+                mismatches.append(
+                    f"{character.get_player_info('Name')}: {name} "
+                    f"{prices[name][index]} != {value}"
+                )
+    return mismatches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Price all characters in a directory in one batch."
+    )
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory with character json-files.",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Compare every result with the scalar rules.",
+    )
+    args = parser.parse_args()
+
+    character_files, characters = load_characters(args.directory)
+    if not characters:
+        print("No characters to price.")
+        return 0
+
+    start = time.perf_counter()
+    prices = price_characters(characters)
+    seconds = time.perf_counter() - start
+    for index, character_file in enumerate(character_files):
+        print(
+            f"{character_file.name}: {prices['XP Usage'][index]} XP used, "
+            f"{prices['Experience Points'][index]} XP left, "
+            f"{prices['Attribute Points'][index]} AP left"
+        )
+    print(
+        f"Priced {len(characters)} characters in {seconds * 1000:.1f} ms "
+        f"({len(characters) / max(seconds, 1e-9):.0f} characters/s)."
+    )
+    if args.verify:
+        mismatches = verify_prices(characters, prices)
+        for mismatch in mismatches:
+            print(f"    {mismatch}")
+        print(f"{len(mismatches)} differences from the scalar rules.")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
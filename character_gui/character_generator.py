@@ -1,27 +1,39 @@
 #!/usr/bin/env python3
 
-import json
 import os
 import subprocess
 import sys
-import textwrap
-from copy import deepcopy
+from collections import Counter, deque
+from collections.abc import Callable, Iterable
+from functools import partial
 from pathlib import Path
 
 import dearpygui.dearpygui as dpg
-from extra_types import (
-    AttributesTab,
-    AttributeSubtab,
-    CharacterData,
-    ExpertisesTab,
-    ExpertiseSubtab,
-    SkillsSubtab,
-    SkillsTab,
-    TraitsSubtab,
-    TraitsTab,
-    ValueType,
+from background_writer import BackgroundWriter
+from character_io import (
+    CharacterExport,
+    CharacterImport,
+    get_character_file_stem,
+    get_character_save_location,
+    get_character_template,
+    get_pdf_save_location,
 )
-from reportlab.pdfgen import canvas
+from character_overlay import CharacterOverlay
+from character_pdf import CharacterToPdf
+from edit_history import Change, EditHistory
+from edit_journal import EditJournal, recover_journal, recover_journals
+from extra_types import CharacterData, RosterEntryType, ValueType, XpPlanType
+from roster_index import RosterIndex
+from rules_engine import BonusRegistry, CostLedger, RulesEngine
+from stat_scheduler import StatScheduler
+from template_compiler import (
+    CompiledTemplate,
+    compile_character_template,
+    load_template,
+    serialize_properties,
+    wrap_tooltip,
+)
+from xp_planner import XpPlanner, describe_plan
 
 
 class CharacterGenerator:
@@ -30,32 +42,61 @@ class CharacterGenerator:
         character: CharacterData,
         create_mode: bool,
         extend_character: dict[str, bool],
+        coalesce_input: bool = True,
+        template: CompiledTemplate | None = None,
+        character_path: Path | None = None,
+        on_save: Callable[[], None] | None = None,
     ) -> None:
-        self._imported_character = character
+        """
+        The template, when given, must have the same properties as the
+        character, as for a character loaded in the values-only format.
+        The character path is the file the character was loaded from, None
+        for a new character. on_save is called on the GUI thread after a
+        character has been saved.
+        """
         self._extend_character = extend_character
-        self._current_character = deepcopy(self._imported_character)
+        self._on_save = on_save
+        self._enabled_state: dict[str, bool] = dict()
+        self._lazy_tabs: dict[int | str, Callable[[], dict]] = dict()
+        self._requirement_failures: dict[str, list[str]] = dict()
+        self._windows: list[int | str] = []
+        self._character_setup: int | str = 0
+        self._categories: list[tuple[int | str, dict, Callable]] = []
+        self._property_rows: dict[str, int | str] = dict()
+        self._tooltip_handlers: int | str = 0
 
-        self._serial_properties = self._serialize_properties(
-            self._current_character["Character"]
-        )
-        self._serial_properties.update(
-            self._serialize_properties(self._current_character["Character"])
-        )
         self._version = 0.1
         self._text_input_width = 200
 
-        self._config = self._current_character["Config"]
-        self._player_info = self._current_character["Player Info"]
+        """
+        When true, widget events are only recorded and applied once per
+        rendered frame, so that dragging a slider does not update the character
+        for every intermediate value.
+        """
+        self._coalesce_input = coalesce_input
+        self._pending_inputs: dict[int | str, tuple] = dict()
+        self._frame_callback_pending = False
 
-        self._platoon_alternatives = self._config["platoons"]
-        self._speciality_alternatives = self._config["specialities"]
-        self._gender_alternatives = self._config["genders"]
-        self._rank_alternatives = self._config["Rank Labels"]
+        """
+        Every change is appended to an edit journal, which is compacted by
+        saving the character once this many changes have been made.
+        """
+        self._autosave_interval = 50
 
-        self._create_mode = create_mode
-        self._extend_character["background"] = create_mode
+        self._player_info_tags = {
+            "Player": "player_input_text",
+            "E-mail": "email_input_text",
+            "Name": "name_input_text",
+            "Platoon": "platoon_input_combo",
+            "Speciality": "speciality_input_combo",
+            "Gender": "gender_input_combo",
+            "Age": "age_input_combo",
+        }
 
         self._section_title_color = [150, 250, 150]
+        self._error_color = [250, 100, 100]
+        self._writer = BackgroundWriter(self._write_done_callback)
+        self._write_results: deque[tuple[tuple[str, Path], str, bool]] = deque()
 
         self._stats: dict[str, ValueType] = {
             "Carry Capacity": {
@@ -84,188 +125,406 @@ class CharacterGenerator:
                 "tooltip": "Affected by Endurance and various Traits.",
             },
             "Psycho Points": {
-                "value": (
-                    self._get_base_psycho_points() - self._get_psycho_point_cost()
-                ),
+                "value": 0,
                 "tooltip": (
                     "Earned when playing and can be reduced by buying "
                     "psychotic disadvantages."
                 ),
             },
-            "Attribute Points": {"value": self._get_attribute_points()},
+            "Attribute Points": {"value": 0},
             "Extra Attribute Points": {
-                "value": self._get_extra_attribute_points(),
+                "value": 0,
                 "tooltip": "Additional Attribute Points costing 8 XP per extra point.",
             },
-            "Experience Points": {
-                "value": (
-                    self._get_base_experience_points() - self._get_total_xp_usage()
-                )
-            },
-            "Available Traits": {
-                "value": (self._get_base_available_traits() - self._get_count_traits())
-            },
+            "Experience Points": {"value": 0},
+            "Available Traits": {"value": 0},
         }
 
-        self._serial_properties.update(self._serialize_properties(self._stats))
-        self._serial_properties.update(
-            self._serialize_properties({"Rank": {"value": self._player_info["Rank"]}})
+        self._bind_character(character, create_mode, template, character_path)
+
+    def _bind_character(
+        self,
+        character: CharacterData,
+        create_mode: bool,
+        template: CompiledTemplate | None,
+        character_path: Path | None,
+    ) -> None:
+        """
+        Set up the model of a character: the overlay holding its changes, the
+        edit journal and history, the rules, the running cost totals, the
+        bonuses and the derived stats.
+        """
+        self._imported_character = character
+        self._template = template or compile_character_template(character)
+        self._character = CharacterOverlay(self._imported_character, self._template)
+        self._character_path = character_path
+        self._journal = EditJournal.create(
+            get_character_save_location(),
+            character_path.stem if character_path else "new_character",
+            base=character_path.name if character_path else None,
+            template=self._template.get_file_name() or get_character_template().name,
         )
+        self._history = EditHistory()
+        self._step_changes: list[Change] = []
+        self._plan: XpPlanType | None = None
+        self._rules = RulesEngine(self._character)
+        self._ledger = CostLedger(self._rules)
+        self._bonuses = BonusRegistry(self._rules)
 
-    def _serialize_properties(self, character: dict):
-        properties = dict()
-        for key, value in character.items():
-            if "value" in character[key]:
-                properties.update({key: value})
-            else:
-                properties.update(self._serialize_properties(character[key]))
-        return properties
+        self._serial_properties = dict(self._template.get_properties())
+        self._config = self._imported_character["Config"]
 
-    def _get_base_attribute_points(self) -> int:
-        return self._imported_character["Config"]["Starting AP"]
+        self._platoon_alternatives = self._config["platoons"]
+        self._speciality_alternatives = self._config["specialities"]
+        self._gender_alternatives = self._config["genders"]
+        self._rank_alternatives = self._config["Rank Labels"]
 
-    def _get_base_experience_points(self) -> int:
-        return self._imported_character["Config"]["Starting XP"]
+        self._create_mode = create_mode
+        self._extend_character["background"] = create_mode
+        self._pending_inputs = dict()
 
-    def _get_base_available_traits(self) -> int:
-        return self._imported_character["Config"]["Starting Traits"]
+        self._serial_properties.update(serialize_properties(self._stats))
+        self._serial_properties.update(
+            serialize_properties(
+                {"Rank": {"value": self._character.get_player_info("Rank")}}
+            )
+        )
 
-    def _get_base_psycho_points(self) -> int:
-        if "Psycho Points" in self._imported_character["Config"].keys():
-            imported_pp = self._imported_character["Config"]["Psycho Points"]
-        else:
-            imported_pp = 0
-        return imported_pp
+        self._scheduler = StatScheduler(push=self._push_stat)
+        self._add_derived_stats()
 
-    @staticmethod
-    def _get_total_knowledge_cost(skills: SkillsSubtab, default_cost: list[int]) -> int:
-        """
-        Calulate the xp cost for all skills.
+    def load_character(
+        self,
+        character: CharacterData,
+        create_mode: bool,
+        template: CompiledTemplate | None = None,
+        character_path: Path | None = None,
+    ) -> None:
         """
-        sum_cost = 0
-        for category in skills.values():
-            for knowledge in category.values():
-                if "cost_table" in knowledge:
-                    cost_table = knowledge["cost_table"]
-                else:
-                    cost_table = default_cost
-                sum_cost = sum_cost + cost_table[knowledge["value"]]
-        return sum_cost
-
-    def _character_attributes(self):
-        return self._current_character["Character"]["Attributes"]["All"]["Attribute"]
-
-    def _get_attribute_value(self, attribute: str) -> int:
-        attributes = self._character_attributes()
-        return attributes[attribute]["value"]
-
-    def _get_total_attribute_cost(self) -> int:
-        sum_points = 0
-        for attribute in self._character_attributes().values():
-            sum_points = sum_points + attribute["value"]
-        return sum_points
-
-    def _get_attribute_points(self) -> int:
-        AP = self._get_base_attribute_points() - self._get_total_attribute_cost()
-        return max(AP, 0)
-
-    def _get_extra_attribute_points(self) -> int:
-        extra_AP = self._get_total_attribute_cost() - self._get_base_attribute_points()
-        return max(extra_AP, 0)
-
-    def _get_extra_attribute_point_cost(self) -> int:
-        xp_per_ap = 8
-        cost = xp_per_ap * self._get_extra_attribute_points()
-        return cost
-
-    def _get_total_xp_usage(self) -> int:
-        return (
-            self._get_total_knowledge_cost(
-                skills=self._current_character["Character"]["Skills"]["All"],
-                default_cost=self._imported_character["Config"]["skill_cost_table"],
-            )
-            + self._get_total_property_cost(
-                self._current_character["Character"]["Expertise"]
-            )
-            + self._get_total_property_cost(
-                self._current_character["Character"]["Traits"]
-            )
-            + self._get_extra_attribute_point_cost()
+        Show another character in the windows that are already built. With
+        a template of the same structure, see get_structure_digest(), the
+        widgets are updated in place and only rows whose visibility differs
+        are added or removed. Otherwise all windows are rebuilt.
+
+        Changes to the previous character that have not been saved are saved
+        first, see close().
+        """
+        self._autosave()
+        previous_template = self._template
+        self._bind_character(character, create_mode, template, character_path)
+        if not self._windows:
+            return
+        if (
+            self._template is not previous_template
+            and self._template.get_structure_digest()
+            != previous_template.get_structure_digest()
+        ):
+            for window in self._windows:
+                dpg.delete_item(window)
+            self._windows = []
+            self._enabled_state = dict()
+            self._lazy_tabs = dict()
+            self._categories = []
+            self._property_rows = dict()
+            self.main()
+            return
+
+        dpg.delete_item(self._character_setup, children_only=True)
+        dpg.push_container_stack(self._character_setup)
+        try:
+            self._add_character_setup()
+        finally:
+            dpg.pop_container_stack()
+        self._update_rows()
+        self._refresh()
+        self._update_history_buttons()
+        self._show_plan(None, "")
+
+    def set_coalesce_input(self, coalesce_input: bool) -> None:
+        self._coalesce_input = coalesce_input
+
+    def _with_bonus(self, target: str):
+        """
+        Render a stat value followed by the active bonuses for it.
+        """
+        return lambda value: f"{value} {self._bonuses.get_bonus_string(target)}"
+
+    def _add_derived_stats(self):
+        """
+        Declare everything that is derived from the character together with the
+        inputs it depends on. An input is either a property name, a property
+        kind ('attribute', 'skill', 'trait', 'psychotic' or 'expertise'),
+        'Rank' or a bonus target followed by ' bonus'.
+        """
+        rules = self._rules
+        ledger = self._ledger
+        add_stat = self._scheduler.add_stat
+
+        add_stat(
+            "Carry Capacity",
+            ["Strength", "Carry Capacity bonus"],
+            rules.get_carry_capacity,
+            self._with_bonus("Carry Capacity"),
+        )
+        add_stat(
+            "Combat Load",
+            ["Strength", "Combat Load bonus"],
+            rules.get_combat_load,
+            self._with_bonus("Combat Load"),
+        )
+        add_stat("Psycho Limit", ["Psyche"], rules.get_psycho_limit)
+        add_stat(
+            "Stress Limit",
+            ["Psyche", "Stress Limit bonus"],
+            rules.get_stress_limit,
+            self._with_bonus("Stress Limit"),
+        )
+        add_stat("Stunt Cap", ["Charisma"], rules.get_stunt_cap)
+        add_stat(
+            "Leadership Points",
+            ["Charisma", "Rank", "Leadership Points bonus"],
+            rules.get_leadership_points,
+            self._with_bonus("Leadership Points"),
+        )
+        add_stat("Health", ["Endurance"], rules.get_health)
+        add_stat("Psycho Points", ["psychotic"], ledger.get_remaining_psycho_points)
+        add_stat("Attribute Points", ["attribute"], ledger.get_attribute_points)
+        add_stat(
+            "Extra Attribute Points", ["attribute"], ledger.get_extra_attribute_points
+        )
+        add_stat(
+            "Experience Points",
+            ["attribute", "skill", "trait", "expertise"],
+            ledger.get_remaining_experience_points,
+        )
+        add_stat(
+            "Available Traits", ["trait", "psychotic"], ledger.get_remaining_traits
         )
 
-    def _get_count_traits(self) -> int:
-        sum_traits = 0
-        traits = self._current_character["Character"]["Traits"]
-        for main_group in traits:
-            for sub_group in traits[main_group]:
-                for property in traits[main_group][sub_group].values():
-                    if property["value"]:
-                        sum_traits = sum_traits + 1
-        return sum_traits
+        for target in self._bonuses.get_targets():
+            if target not in self._stats:
+                add_stat(
+                    "bonus_" + target,
+                    [target + " bonus"],
+                    partial(self._bonuses.get_bonus_string, target),
+                )
 
-    @staticmethod
-    def _get_total_property_cost(properties: TraitsTab | ExpertisesTab) -> int:
+        add_stat(
+            "overview_list", ["trait", "psychotic", "expertise"], self._get_overview
+        )
+
+    def _push_stat(self, name: str, text: str):
+        if dpg.does_item_exist(name):
+            dpg.set_value(item=name, value=text)
+
+    def _refresh(self, changed_properties: list[str] | None = None):
         """
-        Calculate the total cost from boolean poperties .
-        For example 'Advantages'.
+        Recompute the derived stats affected by the changed properties and
+        re-evaluate the requirements depending on them. Without any changed
+        properties given, everything is recomputed.
+        Must be called whenever a value have been changed.
         """
-        sum_cost = 0
+        if changed_properties is None:
+            self._scheduler.mark_all_dirty()
+        changed_stats = self._scheduler.flush()
+        for stat in changed_stats:
+            if stat in self._stats:
+                self._stats[stat]["value"] = self._scheduler.get_value(stat)
 
-        for main_group in properties:
-            if main_group != "Psychotic Disadvantages":
-                for sub_group in properties[main_group]:
-                    for property in properties[main_group][sub_group].values():
-                        if property["value"]:
-                            sum_cost = sum_cost + property["cost"]
-        return sum_cost
+        if changed_properties is None:
+            self._check_property_disable()
+        else:
+            self._check_property_disable(changed_properties + changed_stats)
 
-    def _get_psycho_point_cost(self) -> int:
+    def _get_tooltip_text(self, tooltip_label: str, tooltip_dict: ValueType) -> str:
         """
-        Calculate the total cost of Psychotic Disadvantages.
+        The wrapped tooltip, followed by any requirements that are not met.
         """
-        properties = self._current_character["Character"]["Traits"]
-        trait_tab = properties["Psychotic Disadvantages"]
-        sum_cost = 0
-        for sub_group in trait_tab:
-            for property in trait_tab[sub_group].values():
-                if property["value"]:
-                    sum_cost = sum_cost + property["cost"]
-        return sum_cost
-
-    @staticmethod
-    def _wrap_tooltip(tooltip: str) -> str:
-        tooltip_width: int = 70
-
-        # Remove multiple whitespaces
-        tooltip_str = " ".join(tooltip.split())
-
-        if "Req:" in tooltip_str and not tooltip_str.startswith("Req:"):
-            # Put Req on a new line, wrapped separately
-            desc_str, req, req_str = tooltip_str.partition("Req:")
-            desc_str = textwrap.fill(desc_str, width=tooltip_width)
-            req_str = " ".join([req, req_str])
-            req_str = textwrap.fill(req_str, width=tooltip_width)
-            wrapped_text = "\n".join([desc_str, req_str])
+        if tooltip_label in self._template.get_properties():
+            tooltip_text = self._template.get_wrapped_tooltip(tooltip_label)
         else:
-            wrapped_text = textwrap.fill(tooltip_str, width=tooltip_width)
-        return wrapped_text
+            tooltip_text = wrap_tooltip(tooltip_dict.get("tooltip", ""))
+        failures = self._requirement_failures.get(tooltip_label)
+        if failures:
+            missing = "\n".join(["Missing:"] + failures)
+            tooltip_text = "\n\n".join([tooltip_text, missing]).strip()
+        return tooltip_text
 
     def _add_tooltip(self, tooltip_label: str, tooltip_dict: ValueType) -> None:
-        if "tooltip" in tooltip_dict:
-            tooltip_text = self._wrap_tooltip(tooltip_dict["tooltip"])
-            with dpg.tooltip("tooltip_" + tooltip_label):
-                dpg.add_text(tooltip_text)
+        """
+        Make the label show a tooltip. The tooltip is only created the first
+        time the label is hovered.
+        """
+        if "tooltip" in tooltip_dict or "requirements" in tooltip_dict:
+            if not dpg.does_item_exist(self._tooltip_handlers):
+                with dpg.item_handler_registry() as self._tooltip_handlers:
+                    dpg.add_item_hover_handler(callback=self._tooltip_hover_callback)
+            dpg.bind_item_handler_registry(
+                "tooltip_" + tooltip_label, self._tooltip_handlers
+            )
 
-    def _allow_change(self, item: ValueType) -> bool:
+    def _tooltip_hover_callback(self, sender, app_data):
+        """
+        Triggered every frame a label with a tooltip is hovered, app_data is
+        the label.
+        """
+        tooltip_label = dpg.get_item_alias(app_data).removeprefix("tooltip_")
+        if dpg.does_item_exist("tooltip_text_" + tooltip_label):
+            return
+        tooltip_text = self._get_tooltip_text(
+            tooltip_label, self._serial_properties[tooltip_label]
+        )
+        with dpg.tooltip(app_data):
+            dpg.add_text(tooltip_text, tag="tooltip_text_" + tooltip_label)
+
+    def _allow_change(self, property: str) -> bool:
         """
         When editing an existing character, boxes are not allowed to be
         unchecked.
         """
         allowed = False
-        if self._create_mode or not item["value"]:
+        if self._create_mode or not self._character.get_imported_value(property):
             allowed = True
         return allowed
 
+    def _input_handler(self, apply_input, continuous: bool = False):
+        """
+        Create the widget callback for an input.
+        With input coalescing, only the latest value of each widget is recorded
+        and all recorded inputs are applied together on the next frame.
+        Changes of a continuous input, a slider or text, made in quick
+        succession are undone in one step.
+        """
+
+        def callback(sender, app_data, user_data: dict):
+            self._pending_inputs[sender] = (
+                apply_input,
+                app_data,
+                user_data,
+                continuous,
+            )
+            if not self._coalesce_input:
+                self._process_pending_inputs()
+            else:
+                self._request_frame_callback()
+
+        return callback
+
+    def _request_frame_callback(self):
+        """
+        Run _frame_callback() on the next frame. Dear PyGui keeps a single
+        callback per frame, so everything done once per frame goes through it.
+        """
+        if not self._frame_callback_pending:
+            self._frame_callback_pending = True
+            dpg.set_frame_callback(dpg.get_frame_count() + 1, self._frame_callback)
+
+    def _frame_callback(self, sender=None, app_data=None):
+        self._frame_callback_pending = False
+        if self._pending_inputs:
+            self._process_pending_inputs()
+        self._poll_write_results()
+
+    def _process_pending_inputs(self):
+        """
+        Apply all recorded inputs to the character and refresh the display once.
+        """
+        pending_inputs = self._pending_inputs
+        self._pending_inputs = dict()
+
+        changed_properties = []
+        merge = bool(pending_inputs)
+        for input_sender, pending_input in pending_inputs.items():
+            apply_input, value, user_data, continuous = pending_input
+            apply_input(input_sender, value, user_data)
+            changed_properties.append(user_data["label"])
+            merge = merge and continuous
+        self._history.record(self._step_changes, merge=merge)
+        self._step_changes = []
+        self._refresh(changed_properties)
+        self._update_history_buttons()
+
+    def _undo_callback(self):
+        self._process_pending_inputs()
+        self._apply_changes(self._history.undo(), undo=True)
+
+    def _redo_callback(self):
+        self._process_pending_inputs()
+        self._apply_changes(self._history.redo(), undo=False)
+
+    def _apply_changes(self, changes: list[Change], undo: bool):
+        """
+        Set the old (undo) or new (redo) values of changes from the history,
+        through the same path as an edit, and show them in the widgets.
+        """
+        changed_properties = []
+        for kind, name, old_value, new_value in changes:
+            value = old_value if undo else new_value
+            if kind == "value":
+                self._set_value_in_character_state({"label": name}, value)
+                if name in self._property_rows:
+                    self._update_row(name)
+            else:
+                self._set_player_info(name, value)
+                tag = self._player_info_tags.get(name)
+                if tag is not None and dpg.does_item_exist(tag):
+                    dpg.set_value(tag, value)
+            changed_properties.append(name)
+        self._step_changes = []
+        self._refresh(changed_properties)
+        self._update_history_buttons()
+
+    def _update_history_buttons(self):
+        if dpg.does_item_exist("undo_button"):
+            dpg.configure_item("undo_button", enabled=self._history.can_undo())
+            dpg.configure_item("redo_button", enabled=self._history.can_redo())
+
+    def _plan_callback(self):
+        """
+        Find the cheapest purchases reaching the goals in the planner input.
+        """
+        self._process_pending_inputs()
+        planner = XpPlanner(self._character, self._extend_character)
+        try:
+            plan = planner.plan(dpg.get_value("planner_goals_input"))
+        except ValueError as error:
+            self._show_plan(None, str(error), failed=True)
+            return
+        if plan["possible"] and plan["steps"]:
+            self._show_plan(plan, describe_plan(plan))
+        else:
+            self._show_plan(None, describe_plan(plan), failed=not plan["possible"])
+
+    def _show_plan(self, plan: XpPlanType | None, text: str, failed: bool = False):
+        self._plan = plan
+        if dpg.does_item_exist("plan_text"):
+            color = self._error_color if failed else self._section_title_color
+            dpg.configure_item("plan_text", default_value=text, color=color)
+            dpg.configure_item("apply_plan_button", enabled=plan is not None)
+
+    def _apply_plan_callback(self):
+        """
+        Buy everything in the plan as one step that can be undone. Values
+        raised beyond the plan since it was made are kept.
+        """
+        if self._plan is None:
+            return
+        self._process_pending_inputs()
+        changed_properties = []
+        for step in self._plan["steps"]:
+            name = step["property"]
+            if self._character.get_value(name) >= step["new"]:
+                continue
+            self._set_value_in_character_state({"label": name}, step["new"])
+            if name in self._property_rows:
+                self._update_row(name)
+            changed_properties.append(name)
+        self._history.record(self._step_changes)
+        self._step_changes = []
+        self._refresh(changed_properties)
+        self._update_history_buttons()
+        self._show_plan(None, "Plan applied.")
+
     def _attribute_callback(self, sender, app_data, user_data: dict):
         """
         Triggered when any slider for attribute points have changed.
@@ -275,39 +534,30 @@ class CharacterGenerator:
             sender=sender,
             new_value=app_data,
         )
-        self._update_ap_status()
-        self._update_xp_status()
-        self._update_psycho_limit()
-        self._update_stress_limit()
-        self._update_stunt_cap()
-        self._update_health_limit()
-        self._update_leadership_points()
-        self._update_carry_capacity()
-        self._update_combat_load()
-        self._check_property_disable()
-
-    def _get_value_from_character_state(self, property_data: dict[str, str]) -> int:
-        """
-        Helper function to get a specific value.
-        """
-        section = property_data["section"]
-        tab = property_data["tab_label"]
-        sub_tab = property_data["sub_tab_label"]
-        category = property_data["category"]
-        label = property_data["label"]
-        return self._current_character[section][tab][sub_tab][category][label]["value"]
 
     def _set_value_in_character_state(self, property_data: dict, new_value: int):
         """
         Helper function to set a specific value.
+        The cost ledger and bonuses are updated and the derived stats depending
+        on the value are marked for recomputation.
         """
-        section = property_data["section"]
-        tab = property_data["tab_label"]
-        sub_tab = property_data["sub_tab_label"]
-        cat = property_data["category"]
         label = property_data["label"]
+        old_value = self._character.set_value(label, new_value)
+        self._ledger.apply(label, old_value, new_value)
+        if old_value != new_value:
+            self._step_changes.append(("value", label, old_value, int(new_value)))
+            self._journal.append_value(label, int(new_value), old_value)
+            self._flush_journal()
+            if (
+                self._journal.get_count() >= self._autosave_interval
+                and self._can_autosave()
+            ):
+                self._save_character("Autosaving")
 
-        self._current_character[section][tab][sub_tab][cat][label]["value"] = new_value
+        changed_inputs = [label, self._rules.get_property_kind(label)]
+        for target in self._bonuses.toggle(label, new_value):
+            changed_inputs.append(target + " bonus")
+        self._scheduler.mark_dirty(changed_inputs)
 
     def _set_value_and_display_difference(
         self,
@@ -323,18 +573,22 @@ class CharacterGenerator:
             property_data=property_data,
             new_value=new_value,
         )
-        difference = new_value - self._get_value_from_character_state(
-            property_data=property_data,
+        dpg.set_item_label(
+            item=sender, label=self._get_difference_label(property_data["label"])
         )
 
-        if difference != 0:
-            difference_string = str(difference)
-            if difference > 0:
-                difference_string = "+" + difference_string
-
-            dpg.set_item_label(item=sender, label=difference_string)
-        else:
-            dpg.set_item_label(item=sender, label="")
+    def _get_difference_label(self, property: str) -> str:
+        """
+        The difference between the current and the imported value, if any.
+        """
+        difference = self._character.get_value(
+            property
+        ) - self._character.get_imported_value(property)
+        if difference > 0:
+            return "+" + str(difference)
+        if difference < 0:
+            return str(difference)
+        return ""
 
     def _skills_callback(self, sender, app_data, user_data: dict):
         """
@@ -346,7 +600,6 @@ class CharacterGenerator:
             sender=sender,
             new_value=app_data,
         )
-        self._update_xp_status()
 
     def _property_callback(self, sender, app_data, user_data: dict):
         """
@@ -357,23 +610,12 @@ class CharacterGenerator:
             new_value=app_data,
         )
 
-        self._update_xp_status()
-        self._update_pp_status()
-        self._check_property_disable()
-        self._update_trait_status()
-        self._update_stress_limit()
-        self._update_overview()
-
-    def _has_requirements(self, property: str) -> bool:
-        return "requirements" in self._serial_properties[property]
-
     @staticmethod
     def _property_is_extended(property: ValueType) -> bool:
         return "extended" in property
 
-    @staticmethod
-    def _property_has_value(property: ValueType) -> bool:
-        return bool(property["value"])
+    def _property_has_value(self, property: str) -> bool:
+        return bool(self._character.get_value(property))
 
     def _extension_active(self, property: ValueType) -> bool:
         if self._property_is_extended(property):
@@ -386,246 +628,248 @@ class CharacterGenerator:
             return self._extension_active(self._serial_properties[property])
         return True
 
-    def _requirements_fulfilled(self, property: str) -> bool:
-        reqs: dict = self._serial_properties[property]["requirements"]
-        fulfilled = True
-        for req_name, req in reqs.items():
-            # TODO: An OR option would be useful but not trivial to include
-            actual_value: int = self._serial_properties[req_name]["value"]
-            if (req["type"] == "==") and (not actual_value == req["value"]):
-                fulfilled = False
-            if (req["type"] == ">=") and (not actual_value >= req["value"]):
-                fulfilled = False
-            if (req["type"] == "<=") and (not actual_value <= req["value"]):
-                fulfilled = False
-        return fulfilled
-
-    def _check_property_disable(self):
-        for property in self._serial_properties:
-            if self._has_requirements(property) and self._extensions_not_hidden(
+    def _check_property_disable(self, changed_properties: list[str] | None = None):
+        """
+        Enable or disable checkboxes depending on their requirements.
+        When the changed properties are given, only the properties depending
+        on them are re-evaluated. A checkbox is only reconfigured when its
+        enabled state actually flips, and its tooltip only when the list of
+        unfulfilled requirements changes.
+        """
+        if changed_properties is None:
+            properties = self._rules.get_properties()
+        else:
+            properties = set()
+            for changed in changed_properties:
+                properties.update(self._rules.get_requirement_dependents(changed))
+        self._update_property_states(properties)
+
+    def _update_property_states(self, properties: Iterable[str]):
+        """
+        Apply the requirements of the given properties to their checkboxes and
+        tooltips. For properties on tabs that have not been built yet, or
+        tooltips that have not been shown yet, only the unfulfilled
+        requirements are recorded. The widgets are created in the right state.
+        """
+        for property in properties:
+            if self._rules.has_requirements(property) and self._extensions_not_hidden(
                 property
             ):
-                fulfilled = self._requirements_fulfilled(property)
-                dpg.configure_item(property, enabled=fulfilled)
-
-    def _check_active_bonuses(self, target: str) -> list:
-        final_bonus = []
-        for property in self._serial_properties:
-            if "bonus" in self._serial_properties[property]:
-                if self._serial_properties[property]["value"] > 0:
-                    for bonus in self._serial_properties[property]["bonus"]:
-                        if bonus["target"] == target:
-                            this_bonus = bonus["value"]
-                            if bonus["type"] == "permanent":
-                                final_bonus.append(f"{this_bonus:+g}")
-                            else:
-                                final_bonus.append(f"({this_bonus:+g})")
-        return final_bonus
+                built = dpg.does_item_exist(property)
+                fulfilled = self._rules.requirements_fulfilled(property)
+                if built and self._enabled_state.get(property) != fulfilled:
+                    self._enabled_state[property] = fulfilled
+                    dpg.configure_item(property, enabled=fulfilled)
+
+                failures = []
+                if not fulfilled:
+                    failures = self._rules.get_unfulfilled_requirements(property)
+                if self._requirement_failures.get(property, []) != failures:
+                    self._requirement_failures[property] = failures
+                    if dpg.does_item_exist("tooltip_text_" + property):
+                        dpg.set_value(
+                            "tooltip_text_" + property,
+                            self._get_tooltip_text(
+                                property, self._serial_properties[property]
+                            ),
+                        )
 
     def _player_info_callback(self, sender, app_data, user_data: dict[str, str]):
         """
         Triggered when changing player info such as name, platoon etc.
         """
-        idx = user_data["label"]
-        state = self._current_character["Player Info"][idx] = app_data  # noqa: F841
-        self._player_info = self._current_character["Player Info"]
+        self._set_player_info(user_data["label"], app_data)
 
-    def _update_psycho_limit(self):
-        """
-        Update the printout of current Psycho limit.
-        Must be called whenever a related value have been change.
-        """
-        psycho_limit = self._get_attribute_value("Psyche")
-        self._stats["Psycho Limit"]["value"] = psycho_limit
-        dpg.set_value(
-            item="Psycho Limit",
-            value=psycho_limit,
-        )
+    def _set_player_info(self, key: str, value):
+        old_value = self._character.get_player_info(key)
+        self._character.set_player_info(key, value)
+        if old_value != value:
+            self._step_changes.append(("player_info", key, old_value, value))
+            self._journal.append_player_info(key, value, old_value)
+            self._flush_journal()
 
-    def _update_stress_limit(self):
+    def _get_overview(self) -> str:
         """
-        Update the printout of current Stress limit.
-        Must be called whenever a related value have been change.
+        The checked traits, psychotic disadvantages and expertise with their
+        cost, as kept up to date by the cost ledger.
         """
+        overview_list: str = ""
+        for property_key in self._ledger.get_checked_properties():
+            cost: int = self._template.get_record(property_key).cost
+            overview_list = overview_list + f"{property_key} ({cost})\n"
+        return overview_list
 
-        stress_limit = self._get_attribute_value("Psyche") * 2
-        bonus_string = "".join(self._check_active_bonuses("Stress Limit"))
-        self._stats["Stress Limit"]["value"] = stress_limit
-        dpg.set_value(
-            item="Stress Limit",
-            value=f"{stress_limit} {bonus_string}",
-        )
+    def _get_current_character_name(self):
+        return get_character_file_stem(self._character.get_player_info("Name"))
+
+    def _save_character_callback(self):
+        self._process_pending_inputs()
+        self._save_character("Saving")
 
-    def _update_stunt_cap(self):
+    def _can_autosave(self) -> bool:
         """
-        Update the printout of current stunt cap.
-        Must be called whenever a related value have been change.
+        Whether the character can be saved without the user asking for it: it
+        was loaded from a file or has been given a name of its own. Until
+        then, its changes are only kept in the edit journal.
         """
+        name = self._character.get_player_info("Name").strip()
+        if not name:
+            return False
+        if self._character_path is not None:
+            return True
+        return name != self._template.get_character()["Player Info"]["Name"]
 
-        stunt_cap = self._get_attribute_value("Charisma")
-        self._stats["Stunt Cap"]["value"] = stunt_cap
-        dpg.set_value(
-            item="Stunt Cap",
-            value=stunt_cap,
-        )
-
-    def _update_health_limit(self):
+    def _autosave(self):
         """
-        Update the printout of current health.
-        Must be called whenever a related value have been change.
+        Save the character if it has changes and can be saved without asking,
+        including inputs not applied yet, see _can_autosave().
         """
+        self._process_pending_inputs()
+        if self._journal.get_count() and self._can_autosave():
+            self._save_character("Autosaving")
 
-        health = self._get_attribute_value("Endurance") + 3
-        self._stats["Health"]["value"] = health
-        dpg.set_value(
-            item="Health",
-            value=health,
-        )
-
-    def _update_carry_capacity(self):
+    def _save_character(self, status: str):
         """
-        Update the printout of current carry capacity.
-        Must be called whenever a related value have been change.
+        Save the character on the background writer. Once written, the
+        changes included are dropped from the edit journal.
+
+        A character loaded from a file in the full format is saved in the
+        full format again, see convert_to_values_format() for converting it.
         """
-        idx = self._get_attribute_value("Strength") - 1
-        carry_capacity = self._config["Carry Capacity Table"][idx]
-        self._stats["Carry Capacity"]["value"] = carry_capacity
-        dpg.set_value(
-            item="Carry Capacity",
-            value=carry_capacity,
+        file_path = (
+            get_character_save_location()
+            .joinpath(self._get_current_character_name())
+            .with_suffix(".json")
+        )
+        # Only a template loaded from a file can be referred to by a saved file
+        template = self._template if self._template.get_digest() else None
+        save = partial(
+            self._write_character,
+            file_path,
+            self._character.to_character(),
+            template,
+            self._ledger.get_remaining_experience_points(),
+            self._journal,
+            self._journal.get_sequence(),
         )
+        self._submit_write(("save", file_path), f"{status} {file_path.name}", save)
 
-    def _update_combat_load(self):
-        """
-        Update the printout of current combat load.
-        Must be called whenever a related value have been change.
-        """
-        idx = self._get_attribute_value("Strength") - 1
-        combat_load = self._current_character["Config"]["Combat Load Table"][idx]
-        self._stats["Combat Load"]["value"] = combat_load
-        dpg.set_value(
-            item="Combat Load",
-            value=combat_load,
+    @staticmethod
+    def _write_character(
+        file_path: Path,
+        character: CharacterData,
+        template: CompiledTemplate | None,
+        remaining_xp: int,
+        journal: EditJournal,
+        journal_sequence: int,
+    ) -> str:
+        CharacterExport.to_json(file_path, character, template)
+        RosterIndex(get_character_save_location()).update(
+            file_path, character, remaining_xp
         )
+        journal.compact(file_path.name, journal_sequence)
+        return f"Saved {file_path.name}"
 
-    def _update_leadership_points(self):
-        """
-        Update the printout of current health.
-        Must be called whenever a related value have been change.
-        """
-        rank_index = self._player_info["Rank"]
-        rank_bonus = self._current_character["Config"]["Rank Bonus"][rank_index]
-        leadership_points = self._get_attribute_value("Charisma") + rank_bonus - 2
-        bonus_string = "".join(self._check_active_bonuses("Leadership Points"))
-        self._stats["Leadership Points"]["value"] = leadership_points
-        dpg.set_value(
-            item="Leadership Points",
-            value=f"{leadership_points} {bonus_string}",
+    def _export_to_pdf_callback(self):
+        self._process_pending_inputs()
+        file_path = (
+            get_pdf_save_location()
+            .joinpath(self._get_current_character_name())
+            .with_suffix(".pdf")
+        )
+        stats = {name: {"value": stat["value"]} for name, stat in self._stats.items()}
+        export = partial(
+            self._write_pdf, file_path, self._character.to_character(), stats
         )
+        self._submit_write(("pdf", file_path), f"Exporting {file_path.name}", export)
+
+    @staticmethod
+    def _write_pdf(
+        file_path: Path, character: CharacterData, stats: dict[str, ValueType]
+    ) -> str:
+        ctp = CharacterToPdf(character, stats, file_path)
+        ctp.write_pdf()
 
-    def _update_ap_status(self):
+        # Open the viewer without waiting for it to close
+        try:
+            if sys.platform == "win32":
+                os.startfile(file_path, "open")
+            elif sys.platform == "darwin":
+                subprocess.Popen(["open", file_path])
+            else:
+                subprocess.Popen(["xdg-open", file_path])
+        except OSError as error:
+            return f"Created {file_path.name}, but could not open it: {error}"
+        return f"Created {file_path.name}"
+
+    def _flush_journal(self):
         """
-        Update the printout of available attribute points.
-        Must be called whenever a related value have been change.
+        Write the changes appended to the edit journal on the background
+        writer. Flushes submitted before the writer gets to them are merged.
         """
-        extra = self._get_extra_attribute_points()
-        remaining = self._get_attribute_points()
-        self._stats["Attribute Points"]["value"] = remaining
-        dpg.set_value(item="Attribute Points", value=remaining)
-        self._stats["Extra Attribute Points"]["value"] = extra
-        dpg.set_value(item="Extra Attribute Points", value=extra)
+        self._writer.submit(("journal", self._journal.get_path()), self._journal.flush)
+        self._request_frame_callback()
 
-    def _update_xp_status(self):
+    def _submit_write(self, key: tuple[str, Path], status: str, write: Callable):
         """
-        Update the printout of available experience points.
-        Must be called whenever a related value have been change.
+        Run a save or export on the background writer. The character is
+        copied when submitting, so editing can continue while it is written.
         """
-        remaining = self._get_base_experience_points() - self._get_total_xp_usage()
-        self._stats["Experience Points"]["value"] = remaining
-        dpg.set_value(item="Experience Points", value=remaining)
+        self._set_write_status(f"{status}...", failed=False)
+        if self._writer.submit(key, write):
+            self._set_write_status(f"{status} (replaced earlier)...", failed=False)
+        self._request_frame_callback()
 
-    def _update_pp_status(self):
+    def _write_done_callback(self, key: tuple[str, Path], message: str, failed: bool):
         """
-        Update the printout of available psycho points.
-        Must be called whenever a related value have been change.
+        Called from the background writer thread. The result is only queued,
+        it is shown by _poll_write_results() on the GUI thread.
         """
-        remaining = self._get_base_psycho_points() - self._get_psycho_point_cost()
-        self._stats["Psycho Points"]["value"] = remaining
-        dpg.set_value(item="Psycho Points", value=remaining)
+        if failed:
+            message = f"Failed to write {key[1].name}: {message}"
+        self._write_results.append((key, message, failed))
 
-    def _update_trait_status(self):
+    def _poll_write_results(self):
         """
-        Update the printout of remaining traits.
-        Must be called whenever a related value have been change.
+        Show the results of finished writes. Called every frame while any
+        write is in progress.
         """
-        remaining = self._get_base_available_traits() - self._get_count_traits()
-        self._stats["Available Traits"]["value"] = remaining
-        dpg.set_value(item="Available Traits", value=remaining)
-
-    def _update_overview(self):
-        overview_list: str = ""
-        for property_key, property_value in self._serial_properties.items():
-            if "cost" in property_value and property_value["value"]:
-                cost: int = property_value["cost"]
-                overview_list = overview_list + f"{property_key} ({cost})\n"
-        dpg.set_value("overview_list", overview_list)
+        while self._write_results:
+            key, message, failed = self._write_results.popleft()
+            if key[0] == "journal" and not failed:
+                continue
+            self._set_write_status(message, failed)
+            if key[0] == "save" and not failed and self._on_save is not None:
+                self._on_save()
+        # The writer reports a job as done before it is no longer busy
+        if self._writer.is_busy() or self._write_results:
+            self._request_frame_callback()
 
-    def _get_current_character_name(self):
-        current_character_name = self._player_info["Name"]
-        return current_character_name.replace(" ", "_").lower()
-
-    def _save_character_callback(self):
-        file_path = (
-            get_character_save_location()
-            .joinpath(self._get_current_character_name())
-            .with_suffix(".json")
-        )
-        CharacterExport.to_json(file_path, self._current_character)
-
-    def _export_to_pdf_callback(self):
-        file_path = (
-            get_pdf_save_location()
-            .joinpath(self._get_current_character_name())
-            .with_suffix(".pdf")
-        )
-        ctp = CharacterToPdf(self._current_character, self._stats, file_path)
-        ctp.write_pdf()
-        print(f"Created: {file_path}")
+    def show_warnings(self, warnings: list[str]) -> None:
+        """
+        Show problems found when loading the character in the status line.
+        """
+        for warning in warnings:
+            print(warning)
+        if warnings:
+            self._set_write_status(". ".join(warnings) + ".", failed=True)
 
-        if sys.platform == "win32":
-            os.startfile(file_path, "open")
-        elif sys.platform == "darwin":
-            subprocess.call(["open", file_path])
-        else:
-            subprocess.call(["xdg-open", file_path])
+    def _set_write_status(self, message: str, failed: bool):
+        if dpg.does_item_exist("write_status"):
+            color = self._error_color if failed else self._section_title_color
+            dpg.configure_item("write_status", default_value=message, color=color)
 
-    @staticmethod
-    def _split_dict(source: dict, num_per_part: int, max_row_count=24):
-        """
-        Helper function to dived a set of components into groups
-        in order to control the number of items shown horisontally.
-        For example.
-        * Limit the amount traits/advantages/disadvantages for each column.
-        " Limit the amount of skill sub categories for each column.
-        """
-        split_items: list[dict] = []
-        part = dict()
-        row_count: int = 0
-        category_count: int = 0
-        for item_key, item_value in source.items():
-            part[item_key] = item_value
-            category_count = category_count + 1
-            row_count = row_count + len(item_value)
-            if (category_count >= num_per_part) or (row_count >= max_row_count):
-                split_items.append(part)
-                part = dict()
-                category_count = 0
-                row_count = 0
-        if category_count > 0:
-            split_items.append(part)
-        return split_items
+    def close(self):
+        """
+        Save any changes not saved yet and finish all saves and exports in
+        progress. Changes to a character that can not be autosaved are left
+        in the edit journal, and recovered on the next start.
+        """
+        self._autosave()
+        self._writer.close()
 
     def _add_character_setup(self):
+        player_info = self._character.get_player_info()
         dpg.add_text("Character Setup", color=self._section_title_color)
         with dpg.table(
             header_row=False, policy=dpg.mvTable_SizingStretchProp, row_background=False
@@ -637,81 +881,90 @@ class CharacterGenerator:
                 if self._create_mode:
                     dpg.add_input_text(
                         tag="player_input_text",
-                        default_value=self._player_info["Player"],
+                        default_value=player_info["Player"],
                         width=self._text_input_width,
                         enabled=self._create_mode,
                         user_data={"label": "Player"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(
+                            self._player_info_callback, continuous=True
+                        ),
                     )
                 else:
-                    dpg.add_text(self._player_info["Player"])
+                    dpg.add_text(player_info["Player"])
 
             with dpg.table_row():
                 dpg.add_text("E-mail:")
                 if self._create_mode:
                     dpg.add_input_text(
                         tag="email_input_text",
-                        default_value=self._player_info["E-mail"],
+                        default_value=player_info["E-mail"],
                         width=self._text_input_width,
                         enabled=self._create_mode,
                         user_data={"label": "E-mail"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(
+                            self._player_info_callback, continuous=True
+                        ),
                     )
                 else:
-                    dpg.add_text(self._player_info["E-mail"])
+                    dpg.add_text(player_info["E-mail"])
 
             with dpg.table_row():
                 dpg.add_text("Name:")
                 if self._create_mode:
                     dpg.add_input_text(
-                        default_value=self._player_info["Name"],
+                        tag="name_input_text",
+                        default_value=player_info["Name"],
                         width=self._text_input_width,
                         enabled=self._create_mode,
                         user_data={"label": "Name"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(
+                            self._player_info_callback, continuous=True
+                        ),
                     )
                 else:
-                    dpg.add_text(self._player_info["Name"])
+                    dpg.add_text(player_info["Name"])
 
             with dpg.table_row():
                 dpg.add_text("Platoon:")
-                current_platoon = self._player_info["Platoon"]
+                current_platoon = player_info["Platoon"]
 
                 if self._create_mode:
                     dpg.add_combo(
+                        tag="platoon_input_combo",
                         items=self._platoon_alternatives,
                         width=self._text_input_width,
                         default_value=self._platoon_alternatives[0],
                         user_data={"label": "Platoon"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(self._player_info_callback),
                     )
                 else:
                     dpg.add_text(current_platoon)
 
             with dpg.table_row():
                 dpg.add_text("Rank:")
-                rank_index = self._player_info["Rank"]
+                rank_index = player_info["Rank"]
                 rank_label = self._rank_alternatives[rank_index]
                 dpg.add_text(rank_label)
 
             with dpg.table_row():
                 dpg.add_text("Speciality:")
-                current_speciality = self._player_info["Speciality"]
+                current_speciality = player_info["Speciality"]
                 if self._create_mode:
                     dpg.add_combo(
+                        tag="speciality_input_combo",
                         items=self._speciality_alternatives,
                         width=self._text_input_width,
                         default_value=current_speciality,
                         enabled=self._create_mode,
                         user_data={"label": "Speciality"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(self._player_info_callback),
                     )
                 else:
                     dpg.add_text(current_speciality)
 
             with dpg.table_row():
                 dpg.add_text("Gender:")
-                current_gender = self._player_info["Gender"]
+                current_gender = player_info["Gender"]
 
                 if self._create_mode:
                     dpg.add_combo(
@@ -721,24 +974,24 @@ class CharacterGenerator:
                         default_value=current_gender,
                         enabled=self._create_mode,
                         user_data={"label": "Gender"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(self._player_info_callback),
                     )
                 else:
                     dpg.add_text(current_gender)
 
             with dpg.table_row():
                 dpg.add_text("Age:")
-                current_age = self._player_info["Age"]
+                current_age = player_info["Age"]
 
                 if self._create_mode:
                     dpg.add_slider_int(
                         tag="age_input_combo",
-                        min_value=(self._imported_character["Config"]["age"]["min"]),
-                        max_value=(self._imported_character["Config"]["age"]["max"]),
+                        min_value=(self._config["age"]["min"]),
+                        max_value=(self._config["age"]["max"]),
                         default_value=current_age,
                         enabled=self._create_mode,
                         user_data={"label": "Age"},
-                        callback=self._player_info_callback,
+                        callback=self._input_handler(self._player_info_callback),
                     )
                 else:
                     dpg.add_text(str(current_age))
@@ -757,70 +1010,17 @@ class CharacterGenerator:
         """
         Add components for traits, advantages or disadvantages.
         """
-        item_refs = dict()
-        tab: TraitsTab | ExpertisesTab = self._current_character[section][tab_label]
-        properties = tab[sub_tab_label]
-        split_items: list[TraitsSubtab | ExpertiseSubtab]
-        split_items = self._split_dict(properties, num_per_row)
-
-        with dpg.group(horizontal=True):
-            for part in split_items:
-                with dpg.group():
-                    for category_key, category_value in part.items():
-                        with dpg.group(width=300):
-                            dpg.add_text(category_key, color=self._section_title_color)
-                            for property_key, property_value in category_value.items():
-                                active = self._extension_active(property_value)
-                                has_value = self._property_has_value(property_value)
-                                allow_change = self._allow_change(property_value)
-                                if active or has_value:
-                                    with dpg.group(horizontal=True):
-                                        with dpg.table(
-                                            header_row=False,
-                                            row_background=False,
-                                            no_host_extendX=True,
-                                        ):
-                                            dpg.add_table_column(
-                                                width_fixed=True,
-                                                init_width_or_weight=20,
-                                            )
-                                            dpg.add_table_column(
-                                                width_fixed=True,
-                                                init_width_or_weight=label_width,
-                                            )
-                                            if show_cost and "cost" in property_value:
-                                                dpg.add_table_column(
-                                                    width_fixed=True,
-                                                    init_width_or_weight=cost_width,
-                                                )
-                                            with dpg.table_row():
-                                                item_id = dpg.add_checkbox(
-                                                    tag=property_key,
-                                                    user_data={
-                                                        "section": section,
-                                                        "tab_label": tab_label,
-                                                        "sub_tab_label": sub_tab_label,
-                                                        "category": category_key,
-                                                        "label": property_key,
-                                                    },
-                                                    indent=5,
-                                                    callback=callback,
-                                                    default_value=has_value,
-                                                    enabled=allow_change,
-                                                )
-                                                item_refs[property_key] = item_id
-                                                dpg.add_text(
-                                                    property_key,
-                                                    tag="tooltip_" + property_key,
-                                                )
-                                                if show_cost:
-                                                    dpg.add_text(
-                                                        f"({property_value['cost']})"
-                                                    )
-                                                self._add_tooltip(
-                                                    property_key, property_value
-                                                )
-        return item_refs
+        add_row = partial(
+            self._add_check_box_row,
+            section=section,
+            tab_label=tab_label,
+            sub_tab_label=sub_tab_label,
+            label_width=label_width,
+            cost_width=cost_width,
+            show_cost=show_cost,
+            callback=callback,
+        )
+        return self._add_categories(tab_label, sub_tab_label, num_per_row, add_row)
 
     def _add_slider_input(
         self,
@@ -834,67 +1034,249 @@ class CharacterGenerator:
         """
         Add sliders for skills.
         """
+        add_row = partial(
+            self._add_slider_row,
+            section=section,
+            tab_label=tab_label,
+            sub_tab_label=sub_tab_label,
+            label_width=label_width,
+            callback=callback,
+        )
+        return self._add_categories(tab_label, sub_tab_label, num_per_row, add_row)
+
+    def _add_categories(self, tab_label, sub_tab_label, num_per_row, add_row):
+        """
+        Add the categories of a sub tab in columns, with a row for each
+        property that is shown. The rows can later be added or removed one by
+        one, see _update_rows().
+        """
         item_refs = dict()
-        tab: AttributesTab | SkillsTab = self._current_character[section][tab_label]
-        categories = tab[sub_tab_label]
-        split_items: list[AttributeSubtab | SkillsSubtab]
-        split_items = self._split_dict(categories, num_per_row)
+        split_items = self._template.get_layout(tab_label, sub_tab_label, num_per_row)
 
         with dpg.group(horizontal=True):
             for part in split_items:
                 with dpg.group():
                     for category_key, category_value in part.items():
-                        with dpg.group(width=300):
+                        with dpg.group(width=300) as category_group:
                             dpg.add_text(category_key, color=self._section_title_color)
                             for property_key, property_value in category_value.items():
-                                if self._create_mode:
-                                    min_value = property_value["min"]
-                                else:
-                                    min_value = property_value["value"]
-
-                                active = self._extension_active(property_value)
-                                has_value = self._property_has_value(property_value)
-                                if active or has_value:
-                                    with dpg.table(
-                                        header_row=False,
-                                        row_background=False,
-                                        no_host_extendX=True,
-                                    ):
-                                        dpg.add_table_column(
-                                            width_fixed=True,
-                                            init_width_or_weight=label_width,
-                                        )
-                                        dpg.add_table_column(
-                                            width_fixed=True, init_width_or_weight=100
-                                        )
-                                        with dpg.table_row():
-                                            dpg.add_text(
-                                                property_key,
-                                                tag="tooltip_" + property_key,
-                                                indent=5,
-                                            )
-                                            item_id = dpg.add_slider_int(
-                                                tag=property_key,
-                                                default_value=property_value["value"],
-                                                min_value=min_value,
-                                                max_value=property_value["max"],
-                                                width=50,
-                                                user_data={
-                                                    "section": section,
-                                                    "tab_label": tab_label,
-                                                    "sub_tab_label": sub_tab_label,
-                                                    "category": category_key,
-                                                    "label": property_key,
-                                                },
-                                                callback=callback,
-                                            )
-                                            item_refs[property_key] = item_id
-
-                                            self._add_tooltip(
-                                                property_key, property_value
-                                            )
+                                if self._property_is_shown(property_key):
+                                    item_refs[property_key] = add_row(
+                                        category=category_key,
+                                        label=property_key,
+                                        property_value=property_value,
+                                    )
+                        self._categories.append(
+                            (category_group, category_value, add_row)
+                        )
         return item_refs
 
+    def _property_is_shown(self, property: str) -> bool:
+        active = self._extension_active(self._serial_properties[property])
+        return active or self._property_has_value(property)
+
+    def _add_check_box_row(
+        self,
+        section,
+        tab_label,
+        sub_tab_label,
+        category,
+        label,
+        property_value,
+        label_width,
+        cost_width,
+        show_cost,
+        callback,
+        before: int | str = 0,
+    ):
+        with dpg.group(horizontal=True, before=before) as row:
+            with dpg.table(
+                header_row=False,
+                row_background=False,
+                no_host_extendX=True,
+            ):
+                dpg.add_table_column(width_fixed=True, init_width_or_weight=20)
+                dpg.add_table_column(width_fixed=True, init_width_or_weight=label_width)
+                if show_cost and "cost" in property_value:
+                    dpg.add_table_column(
+                        width_fixed=True, init_width_or_weight=cost_width
+                    )
+                with dpg.table_row():
+                    item_id = dpg.add_checkbox(
+                        tag=label,
+                        user_data={
+                            "section": section,
+                            "tab_label": tab_label,
+                            "sub_tab_label": sub_tab_label,
+                            "category": category,
+                            "label": label,
+                        },
+                        indent=5,
+                        callback=callback,
+                        default_value=self._property_has_value(label),
+                        enabled=self._allow_change(label),
+                    )
+                    dpg.add_text(label, tag="tooltip_" + label)
+                    if show_cost:
+                        dpg.add_text(f"({property_value['cost']})")
+                    self._add_tooltip(label, property_value)
+        self._property_rows[label] = row
+        return item_id
+
+    def _add_slider_row(
+        self,
+        section,
+        tab_label,
+        sub_tab_label,
+        category,
+        label,
+        property_value,
+        label_width,
+        callback,
+        before: int | str = 0,
+    ):
+        with dpg.table(
+            header_row=False,
+            row_background=False,
+            no_host_extendX=True,
+            before=before,
+        ) as row:
+            dpg.add_table_column(width_fixed=True, init_width_or_weight=label_width)
+            dpg.add_table_column(width_fixed=True, init_width_or_weight=100)
+            has_bonus = self._bonuses.is_target(label)
+            if has_bonus:
+                dpg.add_table_column(width_fixed=True)
+            with dpg.table_row():
+                dpg.add_text(label, tag="tooltip_" + label, indent=5)
+                item_id = dpg.add_slider_int(
+                    tag=label,
+                    label=self._get_difference_label(label),
+                    default_value=self._character.get_value(label),
+                    min_value=self._get_slider_min_value(label),
+                    max_value=property_value["max"],
+                    width=50,
+                    user_data={
+                        "section": section,
+                        "tab_label": tab_label,
+                        "sub_tab_label": sub_tab_label,
+                        "category": category,
+                        "label": label,
+                    },
+                    callback=callback,
+                )
+                if has_bonus:
+                    dpg.add_text(
+                        self._bonuses.get_bonus_string(label),
+                        tag="bonus_" + label,
+                    )
+                self._add_tooltip(label, property_value)
+        self._property_rows[label] = row
+        return item_id
+
+    def _get_slider_min_value(self, property: str) -> int:
+        """
+        When editing an existing character, values can not be lowered below
+        the imported value.
+        """
+        if self._create_mode:
+            return self._serial_properties[property]["min"]
+        return self._character.get_imported_value(property)
+
+    def _update_rows(self) -> None:
+        """
+        Show the current character in the rows that are already built. Rows
+        are only added or removed where the character changes which
+        properties are shown.
+        """
+        for category_group, category_value, add_row in self._categories:
+            next_row: int | str = 0
+            for property_key in reversed(category_value):
+                row = self._property_rows.get(property_key)
+                shown = self._property_is_shown(property_key)
+                if shown and row is None:
+                    dpg.push_container_stack(category_group)
+                    try:
+                        add_row(
+                            category=self._character.get_path(property_key)[2],
+                            label=property_key,
+                            property_value=category_value[property_key],
+                            before=next_row,
+                        )
+                    finally:
+                        dpg.pop_container_stack()
+                    self._enabled_state.pop(property_key, None)
+                elif not shown and row is not None:
+                    dpg.delete_item(row)
+                    del self._property_rows[property_key]
+                    self._enabled_state.pop(property_key, None)
+                elif shown:
+                    self._update_row(property_key)
+                if shown:
+                    next_row = self._property_rows[property_key]
+
+    def _update_row(self, property: str) -> None:
+        if self._rules.get_property_kind(property) in ("attribute", "skill"):
+            dpg.configure_item(
+                property,
+                label=self._get_difference_label(property),
+                min_value=self._get_slider_min_value(property),
+            )
+            dpg.set_value(property, self._character.get_value(property))
+        else:
+            dpg.set_value(property, self._property_has_value(property))
+            managed = self._rules.has_requirements(property)
+            if not managed or not self._extensions_not_hidden(property):
+                dpg.configure_item(property, enabled=self._allow_change(property))
+
+    def _add_lazy_tab(self, tab: int | str, build) -> None:
+        """
+        Register the function that fills a tab with its widgets. The tab is
+        built the first time it is selected.
+        """
+        self._lazy_tabs[tab] = build
+
+    def _build_tab(self, tab: int | str) -> None:
+        build = self._lazy_tabs.pop(tab, None)
+        if build is None:
+            return
+        dpg.push_container_stack(tab)
+        try:
+            item_refs = build()
+        finally:
+            dpg.pop_container_stack()
+        self._update_property_states(item_refs)
+
+    def _tab_callback(self, sender, app_data):
+        """
+        Triggered when selecting a tab, app_data is the selected tab.
+        """
+        self._build_tab(app_data)
+
+    def _add_property_sub_tabs(self, tab_label: str) -> dict:
+        """
+        Add a tab bar with a tab for each sub tab, of which only the first is
+        built right away.
+        """
+        sub_tabs = []
+        with dpg.tab_bar(callback=self._tab_callback):
+            for sub_tab_label in self._imported_character["Character"][tab_label]:
+                with dpg.tab(label=sub_tab_label) as sub_tab:
+                    self._add_lazy_tab(
+                        sub_tab,
+                        partial(
+                            self._add_property_check_boxes,
+                            section="Character",
+                            tab_label=tab_label,
+                            sub_tab_label=sub_tab_label,
+                            num_per_row=3,
+                            label_width=180,
+                            callback=self._input_handler(self._property_callback),
+                        ),
+                    )
+                sub_tabs.append(sub_tab)
+        self._build_tab(sub_tabs[0])
+        return dict()
+
     def main(self):
         with dpg.window(
             width=300,
@@ -905,9 +1287,11 @@ class CharacterGenerator:
             no_collapse=True,
             no_resize=True,
             no_title_bar=True,
-        ):
+        ) as window:
+            self._windows.append(window)
             with dpg.group(width=300):
-                self._add_character_setup()
+                with dpg.group() as self._character_setup:
+                    self._add_character_setup()
 
                 # Display Stats
                 dpg.add_text("Stats", color=self._section_title_color)
@@ -935,6 +1319,40 @@ class CharacterGenerator:
                 dpg.add_button(
                     label="Export to PDF", callback=self._export_to_pdf_callback
                 )
+                dpg.add_text(tag="write_status", wrap=300)
+                dpg.add_spacer(height=10)
+                with dpg.group(horizontal=True):
+                    dpg.add_button(
+                        tag="undo_button",
+                        label="Undo",
+                        enabled=False,
+                        callback=self._undo_callback,
+                    )
+                    dpg.add_button(
+                        tag="redo_button",
+                        label="Redo",
+                        enabled=False,
+                        callback=self._redo_callback,
+                    )
+
+            with dpg.group(width=300):
+                dpg.add_spacer(height=10)
+                dpg.add_text("XP Planner", color=self._section_title_color)
+                dpg.add_input_text(
+                    tag="planner_goals_input",
+                    hint="Pilot: Space 3 + Scarred Veteran",
+                    on_enter=True,
+                    callback=self._plan_callback,
+                )
+                with dpg.group(horizontal=True):
+                    dpg.add_button(label="Plan", callback=self._plan_callback)
+                    dpg.add_button(
+                        tag="apply_plan_button",
+                        label="Apply Plan",
+                        enabled=False,
+                        callback=self._apply_plan_callback,
+                    )
+                dpg.add_text(tag="plan_text", wrap=300)
 
             """ Hide button for character upload until implemented
             with dpg.group(width=300):
@@ -954,40 +1372,44 @@ class CharacterGenerator:
             no_collapse=True,
             no_resize=True,
             no_title_bar=True,
-        ):
+        ) as window:
+            self._windows.append(window)
             with dpg.group(width=300):
-                with dpg.tab_bar(tag="Tabs"):
-                    with dpg.tab(label="Attributes"):
-                        self._add_slider_input(
-                            section="Character",
-                            tab_label="Attributes",
-                            sub_tab_label="All",
-                            callback=self._attribute_callback,
+                with dpg.tab_bar(tag="Tabs", callback=self._tab_callback):
+                    with dpg.tab(label="Attributes") as tab:
+                        self._add_lazy_tab(
+                            tab,
+                            partial(
+                                self._add_slider_input,
+                                section="Character",
+                                tab_label="Attributes",
+                                sub_tab_label="All",
+                                callback=self._input_handler(
+                                    self._attribute_callback, continuous=True
+                                ),
+                            ),
                         )
-
-                    with dpg.tab(label="Skills"):
-                        self._add_slider_input(
-                            section="Character",
-                            tab_label="Skills",
-                            sub_tab_label="All",
-                            callback=self._skills_callback,
+                    self._build_tab(tab)
+
+                    with dpg.tab(label="Skills") as tab:
+                        self._add_lazy_tab(
+                            tab,
+                            partial(
+                                self._add_slider_input,
+                                section="Character",
+                                tab_label="Skills",
+                                sub_tab_label="All",
+                                callback=self._input_handler(
+                                    self._skills_callback, continuous=True
+                                ),
+                            ),
                         )
 
                     for tab_label in ["Traits", "Expertise"]:
-                        with dpg.tab(label=tab_label):
-                            with dpg.tab_bar():
-                                for sub_tab_label in self._current_character[
-                                    "Character"
-                                ][tab_label].keys():
-                                    with dpg.tab(label=sub_tab_label):
-                                        self._add_property_check_boxes(
-                                            section="Character",
-                                            tab_label=tab_label,
-                                            sub_tab_label=sub_tab_label,
-                                            num_per_row=3,
-                                            label_width=180,
-                                            callback=self._property_callback,
-                                        )
+                        with dpg.tab(label=tab_label) as tab:
+                            self._add_lazy_tab(
+                                tab, partial(self._add_property_sub_tabs, tab_label)
+                            )
         with dpg.window(
             width=300,
             height=1000,
@@ -997,24 +1419,15 @@ class CharacterGenerator:
             no_collapse=True,
             no_resize=True,
             no_title_bar=True,
-        ):
+        ) as window:
+            self._windows.append(window)
             with dpg.group(width=300):
                 dpg.add_text(
                     "Traits and Experise Overview", color=self._section_title_color
                 )
                 dpg.add_text("", tag="overview_list", indent=5)
-                self._update_overview()
 
-        self._update_xp_status()
-        self._update_pp_status()
-        self._update_psycho_limit()
-        self._update_stress_limit()
-        self._update_stunt_cap()
-        self._update_health_limit()
-        self._update_leadership_points()
-        self._update_carry_capacity()
-        self._update_combat_load()
-        self._check_property_disable()
+        self._refresh()
 
 
 class CharacterSelector:
@@ -1024,6 +1437,7 @@ class CharacterSelector:
 
     def __init__(self):
         self._section_title_color = [150, 250, 150]
+        self._error_color = [250, 100, 100]
 
         self._available_characters: list[str] = []
         self._characters_files: list[Path] = []
@@ -1035,6 +1449,8 @@ class CharacterSelector:
         This feature will be remove/hidden in the final version.
         """
         self._create_mode: bool = False
+        self._coalesce_input: bool = True
+        self._generator: CharacterGenerator | None = None
 
         self._extend_character = {
             "military": True,
@@ -1043,15 +1459,14 @@ class CharacterSelector:
             "background": self._create_mode,
         }
 
-        for file in get_character_save_location().glob("*.json"):
-            self._available_characters.append(file.stem.replace("_", " ").title())
-            self._characters_files.append(file)
+        # Changes from a session that did not end normally. Recovering those
+        # that replace a character file, or have no name, is asked in main().
+        _, self._undecided_journals = recover_journals(get_character_save_location())
 
+        self._load_roster()
         if self._available_characters:
-            self._selected_character = self._available_characters[0]
             self._selected_character_file = self._characters_files[0]
         else:
-            self._selected_character = None
             self._selected_character_file = None
 
         # ci = CharacterImport.from_json(self._selected_character_file)
@@ -1060,26 +1475,67 @@ class CharacterSelector:
         #                        extend_character=self._extend_character)
         # cg.main()
 
+    def _load_roster(self):
+        """
+        List the characters in the roster index. Characters with the same
+        label get their file name added, so that each label names one file.
+        """
+        roster = RosterIndex(get_character_save_location())
+        roster.refresh()
+        entries = roster.get_entries()
+        labels = [self._get_roster_label(entry) for entry in entries]
+        label_counts = Counter(labels)
+        self._available_characters = [
+            f"{label} [{entry['file']}]" if label_counts[label] > 1 else label
+            for label, entry in zip(labels, entries)
+        ]
+        self._characters_files = [roster.get_path(entry) for entry in entries]
+
+    def _refresh_character_list(self):
+        """
+        Called when the generator has saved a character, to show new, renamed
+        and changed characters. The selected file stays selected.
+        """
+        self._load_roster()
+        if dpg.does_item_exist("character_list"):
+            dpg.configure_item("character_list", items=self._available_characters)
+            if self._selected_character_file in self._characters_files:
+                idx = self._characters_files.index(self._selected_character_file)
+                dpg.set_value("character_list", self._available_characters[idx])
+
+    @staticmethod
+    def _get_roster_label(entry: RosterEntryType) -> str:
+        label = entry["name"]
+        if entry["rank"]:
+            label = (
+                f"{label} ({entry['rank']} {entry['speciality']}, {entry['platoon']})"
+            )
+        if entry["remaining_xp"] is not None:
+            label = f"{label} {entry['remaining_xp']} XP"
+        return label
+
     def _character_list_callback(self, sender, app_data):
         """
         Called when selecting a character in the list.
         """
-        self._selected_character = app_data
+        idx = self._available_characters.index(app_data)
+        self._selected_character_file = self._characters_files[idx]
 
     def _edit_button_callback(self, sender, app_data):
         """
         Continue with the selected character and setup next stage for edit mode.
         """
-        idx = self._available_characters.index(self._selected_character)
-        self._selected_character_file = self._characters_files[idx]
+        if self._selected_character_file is None:
+            return
 
         ci = CharacterImport.from_json(self._selected_character_file)
-        cg = CharacterGenerator(
-            character=ci.get_character(),
-            create_mode=self._create_mode,
-            extend_character=self._extend_character,
+        self._open_character(
+            ci.get_character(),
+            self._create_mode,
+            ci.get_template(),
+            self._selected_character_file,
         )
-        cg.main()
+        self._generator.show_warnings(ci.get_warnings())
 
     def _admin_button_callback(self, sender, app_data):
         """
@@ -1087,20 +1543,107 @@ class CharacterSelector:
         """
         self._create_mode = app_data
 
+    def _coalesce_input_callback(self, sender, app_data):
+        """
+        Update whether slider and text input is applied once per frame.
+        """
+        self._coalesce_input = app_data
+        if self._generator is not None:
+            self._generator.set_coalesce_input(app_data)
+
     def _create_button_callback(self, sender, app_data):
         """
         Continue with template character and setup next stage for creation mode.
         """
-        self._selected_character_file = get_character_template()
+        template = load_template(get_character_template())
+        self._open_character(template.get_character(), True, template, None)
 
-        ci = CharacterImport.from_json(self._selected_character_file)
+    def _open_character(
+        self,
+        character: CharacterData,
+        create_mode: bool,
+        template: CompiledTemplate | None,
+        character_path: Path | None,
+    ):
+        """
+        The generator is created once per session. Opening another character
+        rebinds its widgets to the new character.
+        """
+        if self._generator is None:
+            self._generator = CharacterGenerator(
+                character=character,
+                create_mode=create_mode,
+                extend_character=self._extend_character,
+                coalesce_input=self._coalesce_input,
+                template=template,
+                character_path=character_path,
+                on_save=self._refresh_character_list,
+            )
+            self._generator.main()
+        else:
+            self._generator.load_character(
+                character, create_mode, template, character_path
+            )
 
-        cg = CharacterGenerator(
-            character=ci.get_character(),
-            create_mode=True,
-            extend_character=self._extend_character,
-        )
-        cg.main()
+    def close(self):
+        if self._generator is not None:
+            self._generator.close()
+
+    def _ask_next_recovery(self, error: str = ""):
+        """
+        Ask whether to recover the next journal that could not be recovered
+        without asking, see recover_journals(). An error from the previous
+        answer to the same journal is shown in the dialog.
+        """
+        if dpg.does_item_exist("recovery_window"):
+            dpg.delete_item("recovery_window")
+        if not self._undecided_journals:
+            return
+        journal_path, character_path = self._undecided_journals[0]
+        with dpg.window(
+            label="Recover Changes",
+            tag="recovery_window",
+            modal=True,
+            no_close=True,
+            width=360,
+            pos=[10, 10],
+        ):
+            if character_path.exists():
+                outcome = f"Recovering them replaces {character_path.name}."
+            else:
+                outcome = f"Recovering them saves {character_path.name}."
+            dpg.add_text(
+                f"{journal_path.name} has changes from a session that did not "
+                f"end normally. {outcome}",
+                wrap=340,
+            )
+            if error:
+                dpg.add_text(error, wrap=340, color=self._error_color)
+            with dpg.group(horizontal=True):
+                for label in ("Recover", "Discard", "Later"):
+                    dpg.add_button(
+                        label=label, callback=self._recovery_callback, user_data=label
+                    )
+
+    def _recovery_callback(self, sender, app_data, user_data: str):
+        """
+        Recover, discard or keep the journal asked about. If that fails, the
+        same journal is asked about again, with the error.
+        """
+        journal_path, _ = self._undecided_journals[0]
+        try:
+            if user_data == "Recover":
+                recover_journal(journal_path)
+            elif user_data == "Discard":
+                journal_path.unlink(missing_ok=True)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            action = "recover" if user_data == "Recover" else "discard"
+            self._ask_next_recovery(f"Could not {action} the changes: {error!r}")
+            return
+        self._undecided_journals.pop(0)
+        if user_data == "Recover":
+            self._refresh_character_list()
+        self._ask_next_recovery()
 
     def _extend_with_military_callback(self, sender, app_data):
         self._extend_character["military"] = app_data
@@ -1135,10 +1678,16 @@ class CharacterSelector:
 
             dpg.add_listbox(
                 self._available_characters,
+                tag="character_list",
                 callback=self._character_list_callback,
                 num_items=10,
             )
             dpg.add_checkbox(label="Admin Mode", callback=self._admin_button_callback)
+            dpg.add_checkbox(
+                label="Coalesce Input",
+                default_value=self._coalesce_input,
+                callback=self._coalesce_input_callback,
+            )
             dpg.add_button(label="Edit Character", callback=self._edit_button_callback)
 
             dpg.add_text("Extend character:")
@@ -1188,177 +1737,7 @@ class CharacterSelector:
             # Skip login for now and go directly to the character selector
             # self._add_login()
             self._add_character_selection()
-
-
-class CharacterImport:
-    """
-    Handle import of character. Currenty only from json-file.
-    """
-
-    def __init__(self, character: CharacterData):
-        self._character = character
-
-    @classmethod
-    def from_json(cls, character_path: Path):
-        with character_path.open() as setup_file:
-            imported_character = json.load(setup_file)
-
-        return cls(imported_character)
-
-    def get_character(self):
-        return self._character
-
-
-class CharacterExport:
-    """
-    Handle export of character. Currenty only to json-file.
-    """
-
-    def __init__(self, character_path: Path, character: CharacterData):
-        self._character = deepcopy(character)
-        self._character_path = character_path
-
-    @classmethod
-    def to_json(cls, character_path: Path, character: CharacterData):
-        character_out = deepcopy(character)
-
-        # Convert from true/false to 1/0
-        char_prop = character_out["Character"]
-        for tab in char_prop:
-            for sub_tab in char_prop[tab].keys():
-                for category in char_prop[tab][sub_tab].keys():
-                    for label in char_prop[tab][sub_tab][category].keys():
-                        val = char_prop[tab][sub_tab][category][label]["value"]
-                        char_prop[tab][sub_tab][category][label]["value"] = int(val)
-        character_out["Character"] = char_prop
-
-        as_json = json.dumps(character_out, indent=4)
-        with character_path.open(mode="w") as out_file:
-            out_file.write(as_json)
-        return cls(character_path, character)
-
-
-class CharacterToPdf:
-    def __init__(self, character: CharacterData, stats: dict[str, ValueType], out_file):
-        self._line_height = 15
-        self._current_y = 820
-        self._current_x = 20
-        self._font_size = 12
-        self._character = character
-        self._stats = stats
-        self.out_file = str(out_file)
-        self._canvas = canvas.Canvas(self.out_file, pagesize=(595, 842))
-
-    def _write_line(self, line: str, title=False):
-        if title:
-            self._canvas.setFont("Helvetica-Bold", self._font_size)
-        else:
-            self._canvas.setFont("Helvetica", self._font_size)
-        self._canvas.drawString(self._current_x, self._current_y, line)
-        self._current_y = self._current_y - self._line_height
-        if self._current_y < 0:
-            self._current_y = 820
-            self._current_x = 200
-
-    def write_pdf(self):
-        self._write_line("Character Info", title=True)
-        for key, value in self._character["Player Info"].items():
-            if key == "Rank":
-                rank_index = self._character["Player Info"]["Rank"]
-                rank_label = self._character["Config"]["Rank Labels"][rank_index]
-                self._write_line(f"{key}: {rank_label}")
-            else:
-                self._write_line(f"{key}: {value}")
-
-        total_xp = self._character["Config"]["Starting XP"]
-        remaining_xp = self._stats["Experience Points"]["value"]
-        total_ap = self._character["Config"]["Starting AP"]
-        remaining_ap = self._stats["Attribute Points"]["value"]
-        total_traits = self._character["Config"]["Starting Traits"]
-        remaining_traits = self._stats["Available Traits"]["value"]
-        if "Psycho Points" in self._character["Config"].keys():
-            total_pp = self._character["Config"]["Psycho Points"]
-        else:
-            total_pp = 0
-        remaining_pp = self._stats["Psycho Points"]["value"]
-
-        self._write_line(" ")
-        self._write_line(f"Total XP: {total_xp}")
-        self._write_line(f"Remaining XP: {remaining_xp}")
-        self._write_line(f"Total AP: {total_ap}")
-        self._write_line(f"Remaining AP: {remaining_ap}")
-        self._write_line(f"Total PP: {total_pp}")
-        self._write_line(f"Remaining PP: {remaining_pp}")
-        self._write_line(f"Total traits: {total_traits}")
-        self._write_line(f"Remaining traits: {remaining_traits}")
-        self._write_line(" ")
-
-        self._write_line("Attributes", title=True)
-        attributes = self._character["Character"]["Attributes"]["All"]["Attribute"]
-        for attribute, content in attributes.items():
-            value = content["value"]
-            self._write_line(f"{attribute}: {value}")
-
-        self._write_line("Skills", title=True)
-        for content in self._character["Character"]["Skills"]["All"].values():
-            for skill, skill_content in content.items():
-                value = skill_content["value"]
-                if value > 0:
-                    self._write_line(f"{skill}: {value}")
-
-        for tab_label in ["Traits", "Expertise"]:
-            self._write_line(tab_label, title=True)
-            tab: TraitsTab | ExpertisesTab = self._character["Character"][tab_label]
-            for sub_tab_label, sub_tab_content in tab.items():
-                self._write_line(sub_tab_label, title=True)
-                for category_content in sub_tab_content.values():
-                    for label, label_content in category_content.items():
-                        value = label_content["value"]
-                        cost = label_content["cost"]
-                        if value > 0:
-                            self._write_line(f"{label} ({cost})")
-
-        self._canvas.showPage()
-        self._canvas.save()
-
-
-def get_installation_dir() -> Path:
-    installation_path = Path(__file__).resolve().parent
-    return installation_path
-
-
-def get_character_template_location() -> Path:
-    template_dir = Path(
-        os.getenv(
-            "USCM_TEMPLATE_DIR",
-            default=get_installation_dir().joinpath("local_characters", "template"),
-        )
-    )
-    return template_dir
-
-
-def get_character_save_location() -> Path:
-    character_save_dir = Path(
-        os.getenv(
-            "USCM_CHARACTER_DIR",
-            default=get_installation_dir().joinpath("local_characters"),
-        )
-    )
-    return character_save_dir
-
-
-def get_pdf_save_location() -> Path:
-    pdf_save_dir = Path(
-        os.getenv(
-            "USCM_PDF_DIR", default=get_installation_dir().joinpath("local_characters")
-        )
-    )
-    return pdf_save_dir
-
-
-def get_character_template() -> Path:
-    template = get_character_template_location().joinpath("template.json")
-    return template
+        self._ask_next_recovery()
 
 
 def set_theme():
@@ -1394,6 +1773,7 @@ def main() -> None:
 
     dpg.show_viewport()
     dpg.start_dearpygui()
+    cs.close()
     dpg.destroy_context()
 
 
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import stat
+import sys
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+from typing import TextIO
+
+from character_overlay import CharacterOverlay
+from extra_types import CharacterData, SavedCharacterType
+from template_compiler import CompiledTemplate, load_template, serialize_properties
+
+VALUES_FORMAT = "values"
+
+# The permissions of new files, read once since it can only be read by
+# setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class CharacterImport:
+    """
+    Handle import of character. Currenty only from json-file.
+
+    Both the full format, with the complete template in every file, and the
+    values-only format are read. A values-only character is merged with its
+    compiled template.
+    """
+
+    def __init__(
+        self,
+        character: CharacterData,
+        template: CompiledTemplate | None = None,
+        warnings: list[str] | None = None,
+    ):
+        self._character = character
+        self._template = template
+        self._warnings = warnings or []
+
+    @classmethod
+    def from_json(cls, character_path: Path):
+        with character_path.open() as setup_file:
+            imported_character = json.load(setup_file)
+
+        if "Values" in imported_character:
+            return cls.from_values(imported_character)
+        return cls(imported_character)
+
+    @classmethod
+    def from_values(cls, saved: SavedCharacterType):
+        """
+        Merge a values-only character with its template. Values are matched by
+        property name, so a character saved with an earlier version of the
+        template can still be loaded.
+
+        When the template has changed since the character was saved, a
+        template in the template directory with the saved hash is used if
+        there is one. Otherwise the current template is used, and the change
+        is reported in the warnings, together with any values for properties
+        the template no longer has, which are left out.
+        """
+        warnings = []
+        template_name = Path(saved["Template"]["File"]).name
+        template_path = get_character_template_location().joinpath(template_name)
+        if not template_path.is_file():
+            template_path = get_character_template()
+        template = load_template(template_path)
+
+        saved_digest = saved["Template"]["Hash"]
+        if saved_digest and saved_digest != template.get_digest():
+            saved_template_path = find_template(saved_digest)
+            if saved_template_path is not None:
+                template = load_template(saved_template_path)
+            else:
+                warnings.append(
+                    f"{template_path.name} has changed since the character was "
+                    "saved, its current costs and requirements are used"
+                )
+
+        unknown = saved["Values"].keys() - template.get_properties().keys()
+        if unknown:
+            warnings.append(
+                f"Values for properties not in {template.get_file_name()} left "
+                "out: " + ", ".join(sorted(unknown))
+            )
+
+        base = template.get_character()
+        character: CharacterData = {
+            **base,
+            "Player Info": saved["Player Info"],
+            "Config": {**base["Config"], **saved["Config"]},
+        }
+        overlay = CharacterOverlay(character, template)
+        for name, value in saved["Values"].items():
+            if name not in unknown:
+                overlay.set_value(name, value)
+        return cls(overlay.to_character(), template, warnings)
+
+    def get_character(self):
+        return self._character
+
+    def get_template(self) -> CompiledTemplate | None:
+        """
+        The template a values-only character was merged with, None for a
+        character in the full format.
+        """
+        return self._template
+
+    def get_warnings(self) -> list[str]:
+        """
+        Problems found when merging a values-only character with its
+        template, see from_values().
+        """
+        return self._warnings
+
+
+def _iter_json(data, indent: str | None, level: int = 0) -> Iterator[str]:
+    """
+    Encode data as json in chunks, formatted as json.dumps(). Property values
+    stored as true/false are written as 1/0.
+    """
+    if isinstance(data, dict):
+        if not data:
+            yield "{}"
+            return
+        if indent is None:
+            item_separator = ","
+            key_separator = ":"
+            closing = "}"
+            yield "{"
+        else:
+            item_separator = ",\n" + indent * (level + 1)
+            key_separator = ": "
+            closing = "\n" + indent * level + "}"
+            yield "{\n" + indent * (level + 1)
+        first = True
+        for key, value in data.items():
+            if not first:
+                yield item_separator
+            first = False
+            yield encode_basestring_ascii(key) + key_separator
+            if key == "value" and isinstance(value, bool):
+                yield "1" if value else "0"
+            else:
+                yield from _iter_json(value, indent, level + 1)
+        yield closing
+    elif isinstance(data, list):
+        if not data:
+            yield "[]"
+            return
+        if indent is None:
+            item_separator = ","
+            closing = "]"
+            yield "["
+        else:
+            item_separator = ",\n" + indent * (level + 1)
+            closing = "\n" + indent * level + "]"
+            yield "[\n" + indent * (level + 1)
+        for index, value in enumerate(data):
+            if index:
+                yield item_separator
+            yield from _iter_json(value, indent, level + 1)
+        yield closing
+    elif isinstance(data, str):
+        yield encode_basestring_ascii(data)
+    elif data is None:
+        yield "null"
+    elif data is True:
+        yield "true"
+    elif data is False:
+        yield "false"
+    elif isinstance(data, int):
+        yield int.__repr__(data)
+    elif isinstance(data, float):
+        yield float.__repr__(data)
+    else:
+        raise TypeError(
+            f"Object of type {type(data).__name__} is not JSON serializable"
+        )
+
+
+@contextmanager
+def open_atomic(path: Path) -> Iterator[TextIO]:
+    """
+    Open a temporary file next to a file for writing, which replaces the file
+    once the block is done without an error.
+
+    The temporary file is unique to the call, so threads and processes
+    writing the same file never write to the same temporary file. It is
+    synced to disk before it replaces the file, so that a crash leaves either
+    the old or the whole new content, and it keeps the permissions of the
+    file it replaces.
+    """
+    temporary_file = tempfile.NamedTemporaryFile(
+        mode="w", dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+    )
+    temporary_path = Path(temporary_file.name)
+    try:
+        with temporary_file:
+            yield temporary_file
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        try:
+            mode = stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temporary_path, mode)
+        os.replace(temporary_path, path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+def write_json(path: Path, data, compact: bool = False) -> None:
+    """
+    Stream data as json to a temporary file, which then replaces the file.
+    Nothing is written over the file unless the whole content was written,
+    see open_atomic().
+    """
+    with open_atomic(path) as out_file:
+        for chunk in _iter_json(data, None if compact else "    "):
+            out_file.write(chunk)
+
+
+class CharacterExport:
+    """
+    Handle export of character. Currenty only to json-file.
+    """
+
+    def __init__(self, character_path: Path, character: CharacterData):
+        self._character = character
+        self._character_path = character_path
+
+    @staticmethod
+    def to_values(
+        character: CharacterData, template: CompiledTemplate
+    ) -> SavedCharacterType:
+        """
+        Reduce a character to the player info and the values and config that
+        differ from the template. Raises ValueError if the character has
+        properties that the template does not have.
+        """
+        defaults = template.get_properties()
+        values = dict()
+        for name, property in serialize_properties(character["Character"]).items():
+            if name not in defaults:
+                raise ValueError(f"{name} is not in {template.get_file_name()}")
+            value = int(property["value"])
+            if value != defaults[name]["value"]:
+                values[name] = value
+
+        template_config = template.get_character()["Config"]
+        config = {
+            key: value
+            for key, value in character["Config"].items()
+            if key not in template_config or template_config[key] != value
+        }
+
+        saved: SavedCharacterType = {
+            "Format": VALUES_FORMAT,
+            "Template": {
+                "File": template.get_file_name(),
+                "Hash": template.get_digest(),
+            },
+            "Player Info": character["Player Info"],
+            "Config": config,
+            "Values": values,
+        }
+        return saved
+
+    @classmethod
+    def to_json(
+        cls,
+        character_path: Path,
+        character: CharacterData,
+        template: CompiledTemplate | None = None,
+        compact: bool = False,
+    ):
+        """
+        With a template, the character is saved in the values-only format,
+        unless it has properties that the template does not have. Otherwise
+        the full character is saved. Compact files are written without
+        indentation.
+        """
+        character_out: CharacterData | SavedCharacterType | None = None
+        if template is not None:
+            try:
+                character_out = cls.to_values(character, template)
+            except ValueError:
+                # Not saved with this template, keep the full format
+                character_out = None
+        if character_out is None:
+            character_out = character
+
+        write_json(character_path, character_out, compact)
+        return cls(character_path, character)
+
+
+def convert_to_values_format(character_path: Path, template: CompiledTemplate) -> bool:
+    """
+    Rewrite a character file in the full format to the values-only format.
+    The converted character uses the costs and requirements of the template
+    from now on. Returns False if the file already is in the values-only
+    format.
+    """
+    character_import = CharacterImport.from_json(character_path)
+    if character_import.get_template() is not None:
+        return False
+
+    saved = CharacterExport.to_values(character_import.get_character(), template)
+    write_json(character_path, saved)
+    return True
+
+
+def get_installation_dir() -> Path:
+    installation_path = Path(__file__).resolve().parent
+    return installation_path
+
+
+def get_character_template_location() -> Path:
+    template_dir = Path(
+        os.getenv(
+            "USCM_TEMPLATE_DIR",
+            default=get_installation_dir().joinpath("local_characters", "template"),
+        )
+    )
+    return template_dir
+
+
+def get_character_save_location() -> Path:
+    character_save_dir = Path(
+        os.getenv(
+            "USCM_CHARACTER_DIR",
+            default=get_installation_dir().joinpath("local_characters"),
+        )
+    )
+    return character_save_dir
+
+
+def get_pdf_save_location() -> Path:
+    pdf_save_dir = Path(
+        os.getenv(
+            "USCM_PDF_DIR", default=get_installation_dir().joinpath("local_characters")
+        )
+    )
+    return pdf_save_dir
+
+
+def get_character_file_stem(character_name: str) -> str:
+    """
+    The file name, without suffix, that a character is saved and exported as.
+    """
+    return character_name.replace(" ", "_").lower()
+
+
+def get_character_template() -> Path:
+    template = get_character_template_location().joinpath("template.json")
+    return template
+
+
+def find_template(digest: str) -> Path | None:
+    """
+    The template file in the template directory with the content hash, if
+    there is one.
+    """
+    for template_path in sorted(get_character_template_location().glob("*.json")):
+        if hashlib.sha256(template_path.read_bytes()).hexdigest() == digest:
+            return template_path
+    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert character files to the values-only format."
+    )
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory with character json-files.",
+    )
+    parser.add_argument("--template", type=Path, default=get_character_template())
+    args = parser.parse_args()
+
+    template = load_template(args.template)
+    num_failed = 0
+    for character_file in sorted(args.directory.glob("*.json")):
+        size_before = character_file.stat().st_size
+        try:
+            converted = convert_to_values_format(character_file, template)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            num_failed = num_failed + 1
+            print(f"{character_file.name}: FAILED ({error})")
+            continue
+        if converted:
+            size_after = character_file.stat().st_size
+            print(f"{character_file.name}: {size_before} -> {size_after} bytes")
+        else:
+            print(f"{character_file.name}: already converted")
+    return 1 if num_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+from extra_types import CharacterData, PlayerInfoType
+from template_compiler import (
+    CompiledTemplate,
+    compile_character_template,
+    serialize_properties,
+)
+
+
+class CharacterOverlay:
+    """
+    The working state of a character, stored as the values that differ from
+    the imported character. The imported data is shared and never modified,
+    so editing, resetting and saving never require a copy of the whole tree.
+
+    The template, when given, must have the same properties as the imported
+    character, only the values may differ.
+    """
+
+    def __init__(
+        self, base: CharacterData, template: CompiledTemplate | None = None
+    ) -> None:
+        self._base = base
+        self._template = template or compile_character_template(base)
+        if base["Character"] is self._template.get_character()["Character"]:
+            self._base_properties = self._template.get_properties()
+        else:
+            self._base_properties = serialize_properties(base["Character"])
+        self._paths = self._template.get_paths()
+        self._values: dict[str, int] = dict()
+        self._player_info: dict = dict()
+
+    def get_base(self) -> CharacterData:
+        return self._base
+
+    def get_template(self) -> CompiledTemplate:
+        return self._template
+
+    def get_config(self):
+        return self._base["Config"]
+
+    def get_properties(self) -> dict:
+        """
+        The imported value nodes, keyed by name. Use get_value() for the
+        current value.
+        """
+        return self._base_properties
+
+    def get_path(self, name: str) -> tuple[str, str, str]:
+        return self._paths[name]
+
+    def get_value(self, name: str) -> int:
+        if name in self._values:
+            return self._values[name]
+        return self._base_properties[name]["value"]
+
+    def get_imported_value(self, name: str) -> int:
+        return self._base_properties[name]["value"]
+
+    def set_value(self, name: str, value: int) -> int:
+        """
+        Set the value of a property and return the previous value.
+        Check boxes are stored as 1/0.
+        """
+        old_value = self.get_value(name)
+        value = int(value)
+        if value == self._base_properties[name]["value"]:
+            self._values.pop(name, None)
+        else:
+            self._values[name] = value
+        return old_value
+
+    def get_player_info(self, key: str | None = None):
+        """
+        Get a single player info entry, or all of them when no key is given.
+        """
+        if key is None:
+            player_info: PlayerInfoType = {
+                **self._base["Player Info"],
+                **self._player_info,
+            }
+            return player_info
+        if key in self._player_info:
+            return self._player_info[key]
+        return self._base["Player Info"][key]
+
+    def set_player_info(self, key: str, value) -> None:
+        if value == self._base["Player Info"].get(key):
+            self._player_info.pop(key, None)
+        else:
+            self._player_info[key] = value
+
+    def reset(self, name: str | None = None) -> None:
+        """
+        Reset a property to its imported value, or everything when no name is
+        given.
+        """
+        if name is None:
+            self._values.clear()
+            self._player_info.clear()
+        else:
+            self._values.pop(name, None)
+
+    def has_changes(self) -> bool:
+        return bool(self._values or self._player_info)
+
+    def get_changes(self) -> dict[str, tuple[int, int]]:
+        """
+        All changed properties, as name: (imported value, current value).
+        """
+        return {
+            name: (self._base_properties[name]["value"], value)
+            for name, value in self._values.items()
+        }
+
+    def get_player_info_changes(self) -> dict:
+        return dict(self._player_info)
+
+    def to_character(self) -> CharacterData:
+        """
+        Build the character with all changes applied. Only the dicts on the
+        path to a changed value are copied, everything else is shared with the
+        imported character.
+        """
+        character: CharacterData = {
+            **self._base,
+            "Player Info": self.get_player_info(),
+        }
+        if self._values:
+            tree = character["Character"] = dict(self._base["Character"])
+            copied: set[tuple] = set()
+            for name, value in self._values.items():
+                path = self._paths[name] + (name,)
+                node = tree
+                for depth, key in enumerate(path):
+                    if path[: depth + 1] not in copied:
+                        node[key] = dict(node[key])
+                        copied.add(path[: depth + 1])
+                    node = node[key]
+                node["value"] = value
+        return character
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from pathlib import Path
+from typing import BinaryIO
+
+from character_io import (
+    CharacterImport,
+    get_character_save_location,
+    get_character_template,
+    get_pdf_save_location,
+    open_atomic,
+)
+from extra_types import CharacterData, ExpertisesTab, TraitsTab, ValueType
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+from rules_engine import RulesEngine
+from template_compiler import load_template
+
+
+@cache
+def _get_text_width(text: str, font: str, font_size: int) -> float:
+    return pdfmetrics.stringWidth(text, font, font_size)
+
+
+class CharacterToPdf:
+    """
+    Write the sheet of a character to a PDF file, or to any binary stream.
+
+    The labels at the top of the sheet are the same for every character, so
+    they are drawn once per document as a form and stamped on each sheet,
+    with only the values drawn around them. Lines flow down the columns of a
+    page and continue on a new page when the last column is full.
+    """
+
+    page_size = (595, 842)
+    margin = 20
+    columns = 3
+    line_height = 15
+    font_size = 12
+    fonts = {False: "Helvetica", True: "Helvetica-Bold"}
+
+    def __init__(
+        self,
+        character: CharacterData,
+        stats: dict[str, ValueType],
+        out_file: Path | str | BinaryIO,
+    ):
+        self._character = character
+        self._stats = stats
+        self.out_file = out_file if hasattr(out_file, "write") else str(out_file)
+        self._canvas = canvas.Canvas(self.out_file, pagesize=self.page_size)
+        self._column_width = (self.page_size[0] - 2 * self.margin) / self.columns
+        self._forms: dict[tuple[str, ...], str] = dict()
+        self._font: str | None = None
+        self._move_to_column(0)
+        self._begin_text()
+
+    @classmethod
+    def write_pdfs(
+        cls,
+        sheets: Iterable[tuple[CharacterData, dict[str, ValueType]]],
+        out_file: Path | str | BinaryIO,
+    ) -> None:
+        """
+        Write several characters to one document, each starting on a new page.
+        The form with the static labels is only added to the document once.
+        """
+        writer = None
+        for character, stats in sheets:
+            if writer is None:
+                writer = cls(character, stats, out_file)
+            writer._write_sheet(character, stats)
+        if writer is not None:
+            writer._canvas.save()
+
+    @classmethod
+    def to_bytes(cls, character: CharacterData, stats: dict[str, ValueType]) -> bytes:
+        pdf_buffer = io.BytesIO()
+        cls(character, stats, pdf_buffer).write_pdf()
+        return pdf_buffer.getvalue()
+
+    def _begin_text(self):
+        self._text = self._canvas.beginText(self._current_x, self._current_y)
+        # A new text object starts with the font of the canvas
+        self._font = None
+
+    def _set_font(self, title: bool):
+        font = self.fonts[title]
+        if font != self._font:
+            self._text.setFont(font, self.font_size, leading=self.line_height)
+            self._font = font
+
+    def _move_to_column(self, column: int):
+        self._column = column
+        self._current_x = self.margin + column * self._column_width
+        self._current_y = self.page_size[1] - self.margin
+
+    def _next_line(self):
+        self._current_y = self._current_y - self.line_height
+        if self._current_y < self.margin:
+            if self._column + 1 < self.columns:
+                self._canvas.drawText(self._text)
+                self._move_to_column(self._column + 1)
+                self._begin_text()
+            else:
+                self._new_page()
+
+    def _new_page(self):
+        self._canvas.drawText(self._text)
+        self._canvas.showPage()
+        self._move_to_column(0)
+        self._begin_text()
+
+    def _write_line(self, line: str, title=False):
+        self._set_font(title)
+        self._text.textLine(line)
+        self._next_line()
+
+    def _get_header(
+        self, character: CharacterData, stats: dict[str, ValueType]
+    ) -> list[tuple[str, str, bool]]:
+        """
+        The lines at the top of the sheet, as (label, value, title). The
+        labels are the same for every character using the same template.
+        """
+        player_info = character["Player Info"]
+        config = character["Config"]
+        header = [("Character Info", "", True)]
+        for key, value in player_info.items():
+            if key == "Rank":
+                value = config["Rank Labels"][player_info["Rank"]]
+            header.append((f"{key}: ", str(value), False))
+
+        points = [
+            ("XP", config["Starting XP"], stats["Experience Points"]["value"]),
+            ("AP", config["Starting AP"], stats["Attribute Points"]["value"]),
+            ("PP", config.get("Psycho Points", 0), stats["Psycho Points"]["value"]),
+            ("traits", config["Starting Traits"], stats["Available Traits"]["value"]),
+        ]
+        header.append((" ", "", False))
+        for label, total, remaining in points:
+            header.append((f"Total {label}: ", str(total), False))
+            header.append((f"Remaining {label}: ", str(remaining), False))
+        header.append((" ", "", False))
+
+        header.append(("Attributes", "", True))
+        attributes = character["Character"]["Attributes"]["All"]["Attribute"]
+        for attribute, content in attributes.items():
+            header.append((f"{attribute}: ", str(content["value"]), False))
+        return header
+
+    def _write_header(self, header: list[tuple[str, str, bool]], labels: bool):
+        """
+        Draw either the labels or the values of the header, at the same
+        positions.
+        """
+        for label, value, title in header:
+            if labels:
+                self._write_line(label, title)
+                continue
+            if value:
+                self._set_font(title)
+                label_width = _get_text_width(label, self.fonts[title], self.font_size)
+                self._text.setTextOrigin(self._current_x + label_width, self._current_y)
+                self._text.textOut(value)
+            self._next_line()
+        self._text.setTextOrigin(self._current_x, self._current_y)
+
+    def _stamp_header(self, header: list[tuple[str, str, bool]]):
+        labels = tuple(label for label, _, _ in header)
+        if labels not in self._forms:
+            form_name = f"header{len(self._forms)}"
+            self._canvas.beginForm(form_name)
+            self._begin_text()
+            self._write_header(header, labels=True)
+            self._canvas.drawText(self._text)
+            self._canvas.endForm()
+            self._forms[labels] = form_name
+            self._move_to_column(0)
+            self._begin_text()
+        self._canvas.doForm(self._forms[labels])
+        self._write_header(header, labels=False)
+
+    def _write_sheet(self, character: CharacterData, stats: dict[str, ValueType]):
+        self._stamp_header(self._get_header(character, stats))
+
+        self._write_line("Skills", title=True)
+        for content in character["Character"]["Skills"]["All"].values():
+            for skill, skill_content in content.items():
+                value = skill_content["value"]
+                if value > 0:
+                    self._write_line(f"{skill}: {value}")
+
+        for tab_label in ["Traits", "Expertise"]:
+            self._write_line(tab_label, title=True)
+            tab: TraitsTab | ExpertisesTab = character["Character"][tab_label]
+            for sub_tab_label, sub_tab_content in tab.items():
+                self._write_line(sub_tab_label, title=True)
+                for category_content in sub_tab_content.values():
+                    for label, label_content in category_content.items():
+                        value = label_content["value"]
+                        cost = label_content["cost"]
+                        if value > 0:
+                            self._write_line(f"{label} ({cost})")
+
+        self._new_page()
+
+    def write_pdf(self):
+        self._write_sheet(self._character, self._stats)
+        self._canvas.save()
+
+
+class PdfExportIndex:
+    """
+    The content hash of each character at its last PDF export, stored in an
+    index file in the PDF directory, so that unchanged characters are not
+    rendered again.
+    """
+
+    file_name = "pdf_export.index"
+    # Increase when PDFs are rendered or named differently
+    version = 2
+
+    def __init__(self, pdf_dir: Path) -> None:
+        self._index_path = pdf_dir.joinpath(self.file_name)
+        self._exports: dict[str, dict[str, str]] = self._read()
+
+    def _read(self) -> dict[str, dict[str, str]]:
+        try:
+            with self._index_path.open() as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return dict()
+        if not isinstance(index, dict) or index.get("version") != self.version:
+            return dict()
+        return index["exports"]
+
+    def save(self) -> None:
+        index = {"version": self.version, "exports": self._exports}
+        try:
+            with open_atomic(self._index_path) as index_file:
+                json.dump(index, index_file, indent=1)
+        except OSError:
+            pass
+
+    def is_unchanged(self, character_file: str, digest: str, pdf_dir: Path) -> bool:
+        export = self._exports.get(character_file)
+        if export is None or export["hash"] != digest:
+            return False
+        return pdf_dir.joinpath(export["pdf"]).is_file()
+
+    def update(self, character_file: str, digest: str, pdf_file: str) -> None:
+        self._exports[character_file] = {"hash": digest, "pdf": pdf_file}
+
+
+def get_export_digest(character_path: Path, template_digest: str) -> str:
+    """
+    Hash the character file together with the template, since a values-only
+    character renders differently when the template changes.
+    """
+    content_hash = hashlib.sha256(character_path.read_bytes())
+    content_hash.update(template_digest.encode())
+    return content_hash.hexdigest()
+
+
+def get_pdf_stats(character: CharacterData, template=None) -> dict[str, ValueType]:
+    """
+    The derived stats of a character, in the shape CharacterToPdf expects.
+    """
+    stats = RulesEngine(character, template).get_stats()
+    return {name: {"value": value} for name, value in stats.items()}
+
+
+def export_character_file(
+    character_path: Path, pdf_dir: Path
+) -> tuple[str | None, float, str]:
+    """
+    Render the PDF of a single character file, named after the file, since
+    several files may have the same character name. Returns the PDF file name,
+    the time taken in seconds and an error, if any. Errors are returned
+    instead of raised, so that one broken file does not abort a batch.
+    """
+    start = time.perf_counter()
+    try:
+        character_import = CharacterImport.from_json(character_path)
+        character = character_import.get_character()
+        stats = get_pdf_stats(character, character_import.get_template())
+        pdf_path = pdf_dir.joinpath(f"{character_path.stem}.pdf")
+        CharacterToPdf(character, stats, pdf_path).write_pdf()
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+        return None, time.perf_counter() - start, repr(error)
+    return pdf_path.name, time.perf_counter() - start, ""
+
+
+def export_directory(
+    directory: Path, pdf_dir: Path, max_workers: int | None = None, force=False
+) -> int:
+    """
+    Export every character file in a directory to PDF across a process pool,
+    skipping the characters that are unchanged since their last export.
+    Returns the number of files that failed.
+    """
+    start = time.perf_counter()
+    pdf_dir.mkdir(parents=True, exist_ok=True)
+    export_index = PdfExportIndex(pdf_dir)
+    template_digest = load_template(get_character_template()).get_digest()
+
+    changed: dict[Path, str] = dict()
+    num_skipped = 0
+    for character_path in sorted(directory.glob("*.json")):
+        digest = get_export_digest(character_path, template_digest)
+        if not force and export_index.is_unchanged(
+            character_path.name, digest, pdf_dir
+        ):
+            num_skipped = num_skipped + 1
+            print(f"{character_path.name}: unchanged")
+        else:
+            changed[character_path] = digest
+
+    num_failed = 0
+    if changed:
+        workers = min(max_workers or os.cpu_count() or 1, len(changed))
+        chunksize = max(1, len(changed) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                export_character_file,
+                changed,
+                [pdf_dir] * len(changed),
+                chunksize=chunksize,
+            )
+            for character_path, (pdf_file, seconds, error) in zip(changed, results):
+                if pdf_file is None:
+                    num_failed = num_failed + 1
+                    print(f"{character_path.name}: FAILED ({error})")
+                    continue
+                export_index.update(
+                    character_path.name, changed[character_path], pdf_file
+                )
+                print(f"{character_path.name}: {pdf_file} ({seconds * 1000:.0f} ms)")
+        export_index.save()
+
+    num_exported = len(changed) - num_failed
+    print(
+        f"Exported {num_exported}, skipped {num_skipped}, failed {num_failed} "
+        f"in {time.perf_counter() - start:.2f} s."
+    )
+    return num_failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Export all characters in a directory to PDF."
+    )
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory with character json-files.",
+    )
+    parser.add_argument("--output", type=Path, default=get_pdf_save_location())
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Also export unchanged characters."
+    )
+    args = parser.parse_args()
+
+    num_failed = export_directory(
+        args.directory, args.output, max_workers=args.workers, force=args.force
+    )
+    return 1 if num_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
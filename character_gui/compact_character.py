@@ -0,0 +1,225 @@
+from array import array
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+from character_io import CharacterImport
+from character_overlay import CharacterOverlay
+from extra_types import CharacterData, PlayerInfoType
+from template_compiler import (
+    CompiledTemplate,
+    compile_character_template,
+    serialize_properties,
+)
+
+
+class PropertyView(Mapping):
+    """
+    A property of a compact character shaped as its value node: the template
+    definition, with the current value of the character as "value".
+    """
+
+    __slots__ = ("_character", "_property", "_id")
+
+    def __init__(self, character: "CompactCharacter", property: dict, id: int):
+        self._character = character
+        self._property = property
+        self._id = id
+
+    def __getitem__(self, key: str):
+        if key == "value":
+            return self._character.get_value_by_id(self._id)
+        return self._property[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._property)
+
+    def __len__(self) -> int:
+        return len(self._property)
+
+
+class PropertiesView(Mapping):
+    """
+    All properties of a compact character keyed by name, shaped as the flat
+    property dict of a character, see serialize_properties().
+    """
+
+    __slots__ = ("_character",)
+
+    def __init__(self, character: "CompactCharacter"):
+        self._character = character
+
+    def __getitem__(self, name: str) -> PropertyView:
+        template = self._character.get_template()
+        return PropertyView(
+            self._character,
+            template.get_properties()[name],
+            template.get_property_id(name),
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._character.get_template().get_properties())
+
+    def __len__(self) -> int:
+        return len(self._character.get_template().get_properties())
+
+
+class CompactCharacter:
+    """
+    A character stored as one small integer per property, in the order of the
+    template, plus its player info and config. Everything static is kept in
+    the compiled template, which is shared, so a character costs about a
+    kilobyte instead of a tree of dicts.
+
+    It can be read like a character overlay, so a RulesEngine can price and
+    validate it directly.
+    """
+
+    # Signed 16 bit values
+    typecode = "h"
+
+    __slots__ = ("_template", "_values", "_player_info", "_config")
+
+    def __init__(
+        self,
+        template: CompiledTemplate,
+        values: array | None = None,
+        player_info: PlayerInfoType | None = None,
+        config: dict | None = None,
+    ) -> None:
+        """
+        Without values, player info or config, those of the template are used.
+        """
+        base = template.get_character()
+        if values is None:
+            values = array(
+                self.typecode, (record.default for record in template.get_records())
+            )
+        if len(values) != len(template.get_records()):
+            raise ValueError(
+                f"Expected {len(template.get_records())} values, got {len(values)}"
+            )
+        self._template = template
+        self._values = values
+        self._player_info = dict(player_info or base["Player Info"])
+        # The config of the template is shared when not overridden
+        self._config = base["Config"] if config in (None, base["Config"]) else config
+
+    @classmethod
+    def from_character(
+        cls, character: CharacterData, template: CompiledTemplate | None = None
+    ):
+        """
+        The template must have the same properties as the character. Without
+        a template, the one shared by characters of the same structure is used,
+        see compile_character_template().
+        """
+        template = template or compile_character_template(character)
+        if character["Character"] is template.get_character()["Character"]:
+            properties = template.get_properties()
+        else:
+            properties = serialize_properties(character["Character"])
+        if properties.keys() != template.get_properties().keys():
+            raise ValueError(f"The character does not match {template.get_file_name()}")
+        values = array(
+            cls.typecode,
+            (
+                int(properties[record.name]["value"])
+                for record in template.get_records()
+            ),
+        )
+        return cls(template, values, character["Player Info"], character["Config"])
+
+    @classmethod
+    def from_overlay(cls, overlay: CharacterOverlay):
+        template = overlay.get_template()
+        values = array(
+            cls.typecode,
+            (overlay.get_value(record.name) for record in template.get_records()),
+        )
+        return cls(template, values, overlay.get_player_info(), overlay.get_config())
+
+    @classmethod
+    def from_json(cls, character_path: Path):
+        character_import = CharacterImport.from_json(character_path)
+        return cls.from_character(
+            character_import.get_character(), character_import.get_template()
+        )
+
+    def copy(self) -> "CompactCharacter":
+        return CompactCharacter(
+            self._template,
+            array(self.typecode, self._values),
+            self._player_info,
+            self._config,
+        )
+
+    def get_template(self) -> CompiledTemplate:
+        return self._template
+
+    def get_config(self) -> dict:
+        return self._config
+
+    def get_properties(self) -> dict:
+        """
+        The property definitions of the template keyed by name, with the
+        template values. Use get_value() or get_properties_view() for the
+        values of the character.
+        """
+        return self._template.get_properties()
+
+    def get_properties_view(self) -> PropertiesView:
+        return PropertiesView(self)
+
+    def get_path(self, name: str) -> tuple[str, str, str]:
+        return self._template.get_paths()[name]
+
+    def get_values(self) -> array:
+        """
+        The value of every property, indexed by property id.
+        """
+        return self._values
+
+    def get_value(self, name: str) -> int:
+        return self._values[self._template.get_property_id(name)]
+
+    def get_value_by_id(self, id: int) -> int:
+        return self._values[id]
+
+    def set_value(self, name: str, value: int) -> int:
+        """
+        Set the value of a property and return the previous value.
+        """
+        id = self._template.get_property_id(name)
+        old_value = self._values[id]
+        self._values[id] = int(value)
+        return old_value
+
+    def get_player_info(self, key: str | None = None):
+        """
+        Get a single player info entry, or all of them when no key is given.
+        """
+        if key is None:
+            player_info: PlayerInfoType = dict(self._player_info)
+            return player_info
+        return self._player_info[key]
+
+    def set_player_info(self, key: str, value) -> None:
+        self._player_info[key] = value
+
+    def to_character(self) -> CharacterData:
+        """
+        Build the nested character. Only the dicts on the path to a value
+        that differs from the template are copied.
+        """
+        base = self._template.get_character()
+        character: CharacterData = {
+            **base,
+            "Player Info": self.get_player_info(),
+            "Config": self._config,
+        }
+        overlay = CharacterOverlay(character, self._template)
+        for record in self._template.get_records():
+            value = self._values[record.id]
+            if value != record.default:
+                overlay.set_value(record.name, value)
+        return overlay.to_character()
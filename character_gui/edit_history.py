@@ -0,0 +1,90 @@
+import time
+from collections import deque
+
+# A change of a character: the kind, "value" or "player_info", the property or
+# player info key, the old value and the new value
+type Change = tuple[str, str, object, object]
+
+
+class EditHistory:
+    """
+    Undo and redo of character changes.
+
+    Each step is the list of changes applied together, stored as the old and
+    new values only, so a long history costs a few bytes per step. Undoing a
+    step gives the changes to apply backwards, redoing it the changes to apply
+    again.
+
+    Consecutive mergeable steps changing the same single property within
+    merge_seconds are merged into one, so dragging a slider or typing a name
+    is undone in one step. Toggles are recorded as steps of their own, so
+    quickly checking and unchecking a box can be undone step by step.
+    """
+
+    def __init__(self, max_steps: int = 500, merge_seconds: float = 1.0) -> None:
+        self._undo: deque[list[Change]] = deque(maxlen=max_steps)
+        self._redo: list[list[Change]] = []
+        self._merge_seconds = merge_seconds
+        self._last_record = 0.0
+        self._last_mergeable = False
+
+    def record(self, changes: list[Change], merge: bool = False) -> None:
+        """
+        Add a step. Any steps undone before are no longer redoable.
+        With merge, the step is merged into the previous step if that was
+        also recorded with merge and changed the same single property.
+        """
+        changes = [change for change in changes if change[2] != change[3]]
+        if not changes:
+            return
+        now = time.monotonic()
+        mergeable = merge
+        merge = (
+            mergeable
+            and self._last_mergeable
+            and self._undo
+            and len(changes) == 1
+            and len(self._undo[-1]) == 1
+            and self._undo[-1][0][:2] == changes[0][:2]
+            and now - self._last_record < self._merge_seconds
+        )
+        self._last_record = now
+        self._last_mergeable = mergeable
+        self._redo.clear()
+        if not merge:
+            self._undo.append(changes)
+            return
+
+        kind, name, old_value, _ = self._undo.pop()[0]
+        new_value = changes[0][3]
+        if old_value != new_value:
+            self._undo.append([(kind, name, old_value, new_value)])
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo(self) -> list[Change]:
+        """
+        The changes of the latest step, in the order to undo them. Apply the
+        old value of each.
+        """
+        if not self._undo:
+            return []
+        changes = self._undo.pop()
+        self._redo.append(changes)
+        self._last_record = 0.0
+        return list(reversed(changes))
+
+    def redo(self) -> list[Change]:
+        """
+        The changes of the latest undone step. Apply the new value of each.
+        """
+        if not self._redo:
+            return []
+        changes = self._redo.pop()
+        self._undo.append(changes)
+        self._last_record = 0.0
+        return changes
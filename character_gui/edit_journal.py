@@ -0,0 +1,340 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from character_io import (
+    CharacterExport,
+    CharacterImport,
+    get_character_file_stem,
+    get_character_template_location,
+    open_atomic,
+)
+from character_overlay import CharacterOverlay
+from extra_types import CharacterData
+from template_compiler import CompiledTemplate, load_template
+
+
+class EditJournal:
+    """
+    Every change of a character appended to a small journal file next to the
+    character files, so that an edit session survives a crash without
+    rewriting the whole character for every change.
+
+    The first line names the base the changes apply to, a character file in
+    the same directory or the template for a new character, and the computer
+    and process editing it. Each following line is one change, with a
+    sequence number, the new and the old value and a timestamp.
+
+    Every edit session has a journal file of its own, see create(), so two
+    sessions never write to or compact the same journal.
+
+    Appending a change only adds it to a buffer in memory. flush() writes the
+    buffer to the file, and is meant to run on a background thread, so that
+    editing never waits for the disk. Changes not flushed yet are lost in a
+    crash.
+
+    Compacting the journal, after the character has been saved, drops the
+    changes included in the save and makes the saved file the new base. The
+    journal is only written when there are changes, and removed when none
+    are left.
+    """
+
+    suffix = ".journal"
+    version = 2
+
+    def __init__(self, journal_path: Path, base: str | None, template: str) -> None:
+        self._journal_path = journal_path
+        self._base = base
+        self._template = template
+        self._sequence = 0
+        self._compacted = 0
+        self._buffer: list[str] = []
+        # Guards the buffer and counters, never held while writing the file
+        self._lock = threading.Lock()
+        # Keeps flushes and compactions of the file one at a time
+        self._file_lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory: Path, stem: str, base: str | None, template: str):
+        """
+        Start the journal of a new edit session, named after the character
+        file stem and unique to the session.
+        """
+        journal_path = directory.joinpath(f"{stem}.{uuid.uuid4().hex[:12]}{cls.suffix}")
+        return cls(journal_path, base, template)
+
+    def get_path(self) -> Path:
+        return self._journal_path
+
+    def get_sequence(self) -> int:
+        """
+        The sequence number of the last change appended.
+        """
+        return self._sequence
+
+    def get_count(self) -> int:
+        """
+        The number of changes not yet compacted.
+        """
+        return self._sequence - self._compacted
+
+    def _get_header(self) -> dict:
+        return {
+            "version": self.version,
+            "base": self._base,
+            "template": self._template,
+            **get_owner(),
+        }
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            self._sequence = self._sequence + 1
+            entry["seq"] = self._sequence
+            entry["time"] = round(time.time(), 3)
+            self._buffer.append(json.dumps(entry))
+
+    def append_value(self, name: str, value: int, old_value: int) -> None:
+        self._append({"property": name, "value": value, "old": old_value})
+
+    def append_player_info(self, key: str, value, old_value) -> None:
+        self._append({"player_info": key, "value": value, "old": old_value})
+
+    def has_buffered(self) -> bool:
+        """
+        Whether there are changes not flushed to the file yet.
+        """
+        return bool(self._buffer)
+
+    def _write_buffered(self) -> None:
+        with self._lock:
+            lines = self._buffer
+            self._buffer = []
+        if not lines:
+            return
+        try:
+            header = []
+            if not self._journal_path.exists():
+                header.append(json.dumps(self._get_header()))
+            with self._journal_path.open(mode="a") as journal_file:
+                journal_file.write("\n".join(header + lines) + "\n")
+        except OSError:
+            # Kept for the next flush
+            with self._lock:
+                self._buffer[:0] = lines
+            raise
+
+    def flush(self) -> str:
+        """
+        Write the buffered changes to the journal file. Raises OSError if the
+        file can not be written, the changes are then kept for the next flush.
+        """
+        with self._file_lock:
+            self._write_buffered()
+        return ""
+
+    def compact(self, base: str, sequence: int) -> None:
+        """
+        Drop the changes up to and including the sequence number, which have
+        been saved to the base file.
+        """
+        with self._file_lock:
+            self._write_buffered()
+            _, entries = self.read(self._journal_path)
+            remaining = [entry for entry in entries if entry["seq"] > sequence]
+            with self._lock:
+                self._base = base
+                self._compacted = max(self._compacted, sequence)
+            if not remaining:
+                self._journal_path.unlink(missing_ok=True)
+                return
+            lines = [json.dumps(self._get_header())]
+            lines.extend(json.dumps(entry) for entry in remaining)
+            with open_atomic(self._journal_path) as journal_file:
+                journal_file.write("\n".join(lines) + "\n")
+
+    @staticmethod
+    def read(journal_path: Path) -> tuple[dict, list[dict]]:
+        """
+        Read the header and changes of a journal. A last line cut short by a
+        crash is ignored.
+        """
+        header = dict()
+        entries = []
+        try:
+            with journal_path.open() as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not header:
+                        header = record
+                    else:
+                        entries.append(record)
+        except FileNotFoundError:
+            pass
+        return header, entries
+
+    @staticmethod
+    def replay(overlay: CharacterOverlay, entries: list[dict]) -> None:
+        for entry in entries:
+            if "property" in entry:
+                overlay.set_value(entry["property"], entry["value"])
+            else:
+                overlay.set_player_info(entry["player_info"], entry["value"])
+
+
+def get_owner() -> dict:
+    """
+    The computer and process of this session, as recorded in journals.
+    """
+    return {"host": socket.gethostname(), "pid": os.getpid()}
+
+
+def _process_exists(pid: int) -> bool:
+    if sys.platform == "win32":
+        import ctypes
+
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+def is_orphaned(header: dict) -> bool:
+    """
+    Whether the session that wrote a journal has ended without saving: the
+    journal was written on this computer by a process that is no longer
+    running. A journal of another computer, for example in a synced
+    directory, is never orphaned here.
+    """
+    owner = get_owner()
+    if header.get("host") != owner["host"]:
+        return False
+    pid = header.get("pid")
+    if not isinstance(pid, int) or pid == owner["pid"]:
+        return False
+    return not _process_exists(pid)
+
+
+def replay_journal(
+    journal_path: Path,
+) -> tuple[CharacterData, CompiledTemplate | None, bool] | None:
+    """
+    Apply the changes in a journal to its base. Returns the character, the
+    template to save it with and whether it has a name of its own, or None
+    if the journal has no changes.
+    """
+    header, entries = EditJournal.read(journal_path)
+    if not entries:
+        return None
+    if header.get("version") != EditJournal.version:
+        raise ValueError(f"Unknown journal version {header.get('version')}")
+
+    template = load_template(
+        get_character_template_location().joinpath(header["template"])
+    )
+    if header["base"] is None:
+        overlay = CharacterOverlay(template.get_character(), template)
+    else:
+        character_import = CharacterImport.from_json(
+            journal_path.with_name(header["base"])
+        )
+        # Saved in the format of the base
+        template = character_import.get_template()
+        overlay = CharacterOverlay(character_import.get_character(), template)
+    EditJournal.replay(overlay, entries)
+    character = overlay.to_character()
+    name = character["Player Info"]["Name"].strip()
+    has_name = bool(name) and (
+        header["base"] is not None or name != overlay.get_base()["Player Info"]["Name"]
+    )
+    return character, template, has_name
+
+
+def get_recovery_path(journal_path: Path, character: CharacterData) -> Path:
+    """
+    The character file a journal is recovered to, named after the character
+    or else after the journal.
+    """
+    stem = get_character_file_stem(character["Player Info"]["Name"].strip())
+    return journal_path.with_name(stem or journal_path.name.split(".")[0]).with_suffix(
+        ".json"
+    )
+
+
+def _save_recovered(
+    journal_path: Path, character: CharacterData, template: CompiledTemplate | None
+) -> Path:
+    character_path = get_recovery_path(journal_path, character)
+    CharacterExport.to_json(character_path, character, template)
+    journal_path.unlink()
+    return character_path
+
+
+def recover_journal(journal_path: Path) -> Path | None:
+    """
+    Apply the changes in a journal left by an interrupted session to its
+    base, save the character and remove the journal. A character file with
+    the same name is replaced. Returns the path of the saved character, or
+    None if the journal has no changes.
+    """
+    replayed = replay_journal(journal_path)
+    if replayed is None:
+        journal_path.unlink()
+        return None
+    character, template, _ = replayed
+    return _save_recovered(journal_path, character, template)
+
+
+def recover_journals(
+    directory: Path,
+) -> tuple[list[Path], list[tuple[Path, Path]]]:
+    """
+    Recover the orphaned journals in a directory, see is_orphaned().
+    Journals of sessions still running or of other computers are left alone,
+    as is a journal that can not be recovered.
+
+    A journal is only recovered here if that creates a new character file
+    for a character with a name of its own. Returns the characters recovered,
+    and every other orphaned journal with the file recover_journal() would
+    save it to, for the user to decide on.
+    """
+    recovered = []
+    undecided = []
+    for journal_path in sorted(directory.glob(f"*{EditJournal.suffix}")):
+        header, _ = EditJournal.read(journal_path)
+        if not is_orphaned(header):
+            continue
+        try:
+            replayed = replay_journal(journal_path)
+            if replayed is None:
+                journal_path.unlink()
+                continue
+            character, template, has_name = replayed
+            character_path = get_recovery_path(journal_path, character)
+            if character_path.exists() or not has_name:
+                undecided.append((journal_path, character_path))
+                continue
+            _save_recovered(journal_path, character, template)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            print(f"Could not recover {journal_path.name}: {error!r}")
+            continue
+        print(f"Recovered {character_path.name} from {journal_path.name}")
+        recovered.append(character_path)
+    return recovered, undecided
@@ -13,9 +13,9 @@ class MinMaxType(ValueType):
 
 
 class BonusType(TypedDict):
-    Target: str
-    Type: str
-    Value: int
+    target: str
+    type: str
+    value: int
 
 
 class CostType(ValueType):
@@ -28,6 +28,13 @@ class RequirementType(TypedDict):
     value: int
 
 
+# A requirement per named value, or the groups "all"/"any" (lists of
+# requirements) and "not" (a nested requirement).
+type RequirementsType = dict[
+    str, RequirementType | list[RequirementsType] | RequirementsType
+]
+
+
 class AttributeType(TypedDict):
     value: int
     max: int
@@ -58,7 +65,7 @@ class SkillsTab(TypedDict):
 
 
 class TraitType(CostType):
-    requirements: NotRequired[dict[str, RequirementType]]
+    requirements: NotRequired[RequirementsType]
 
 
 type TraitsCategory = dict[str, TraitType]
@@ -124,3 +131,72 @@ CharacterData = TypedDict(
         "Character": CharacterProperties,
     },
 )
+
+
+class TemplateIdentityType(TypedDict):
+    File: str
+    Hash: str
+
+
+# A character saved as only the values that differ from its template.
+SavedCharacterType = TypedDict(
+    "SavedCharacterType",
+    {
+        "Format": str,
+        "Template": TemplateIdentityType,
+        "Player Info": PlayerInfoType,
+        "Config": dict[str, object],
+        "Values": dict[str, int],
+    },
+)
+
+
+class BalanceType(TypedDict):
+    total: int
+    spent: int
+    remaining: int
+
+
+class ViolationType(TypedDict):
+    property: str
+    reason: str
+
+
+class CharacterReport(TypedDict):
+    Balances: dict[str, BalanceType]
+    Stats: dict[str, int]
+    Violations: list[ViolationType]
+
+
+class RosterEntryType(TypedDict):
+    file: str
+    mtime_ns: int
+    size: int
+    hash: str
+    name: str
+    player: str
+    platoon: str
+    rank: str
+    speciality: str
+    remaining_xp: int | None
+
+
+class PlanStepType(TypedDict):
+    property: str
+    old: int
+    new: int
+    xp: int
+
+
+class XpPlanType(TypedDict):
+    possible: bool
+    reason: str
+    steps: list[PlanStepType]
+    xp: int
+    remaining_xp: int
+
+
+class NpcProfileType(TypedDict):
+    speciality: str | None
+    platoon: str | None
+    rank: int | None
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import sys
+import time
+from array import array
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from character_io import (
+    CharacterExport,
+    get_character_file_stem,
+    get_character_save_location,
+    get_character_template,
+)
+from character_pdf import CharacterToPdf, get_pdf_stats
+from compact_character import CompactCharacter
+from extra_types import CharacterData, NpcProfileType, PlayerInfoType, ValueType
+from requirements import Requirement
+from roster_index import RosterIndex
+from rules_engine import RulesEngine, debug_enabled
+from template_compiler import CompiledTemplate, load_template
+
+type GeneratedNpc = tuple[bytes, PlayerInfoType]
+
+
+class NpcGenerator:
+    """
+    Create random characters that follow the rules, for non-player marines.
+
+    All attribute points are spread over the attributes. After that traits,
+    skill levels and expertise are bought at random from candidate pools
+    until no candidate fits in the XP, traits and psycho points left. The
+    budgets are tracked as each purchase is made, so a character is never
+    generated and thrown away.
+
+    A candidate whose requirements are not fulfilled is set aside until one
+    of the properties its requirements depend on changes. A purchase that
+    would break the requirements of something already bought is undone.
+    """
+
+    # How often each pool is picked, while it has candidates
+    pool_weights = {"trait": 2, "skill": 6, "expertise": 3}
+    # Derived stats that change with every purchase
+    budget_stats = ("Experience Points", "Psycho Points", "Available Traits")
+
+    def __init__(
+        self, template: CompiledTemplate, extensions: dict[str, bool] | None = None
+    ) -> None:
+        """
+        Properties of an extension not set to True in extensions are never
+        bought.
+        """
+        self._template = template
+        self._config = template.get_character()["Config"]
+        self._requirements = template.get_requirements()
+        extensions = extensions or dict()
+
+        self._attributes = [
+            template.get_record(name)
+            for name in template.get_property_names("attribute")
+        ]
+        # The candidates of each kind by property id, grouped by the XP of
+        # their next step
+        self._candidates: dict[str, dict[int, list[int]]] = {
+            kind: dict() for kind in self.pool_weights
+        }
+        self._step_costs: dict[int, list[int]] = dict()
+        for record in template.get_records():
+            if record.extended is not None and not extensions.get(record.extended):
+                continue
+            if record.kind == "skill":
+                cost_table = record.cost_table
+                if cost_table is None:
+                    cost_table = self._config["skill_cost_table"]
+                step_costs = [
+                    cost_table[level + 1] - cost_table[level]
+                    for level in range(min(record.max, len(cost_table) - 1))
+                ]
+                self._step_costs[record.id] = step_costs
+                if record.default < len(step_costs):
+                    self._add_candidate(
+                        self._candidates, "skill", step_costs[record.default], record.id
+                    )
+            elif record.default:
+                continue
+            elif record.kind == "trait":
+                self._add_candidate(self._candidates, "trait", record.cost, record.id)
+            elif record.kind == "psychotic":
+                # Paid with psycho points, not XP
+                self._add_candidate(self._candidates, "trait", 0, record.id)
+            elif record.kind == "expertise":
+                self._add_candidate(
+                    self._candidates, "expertise", record.cost, record.id
+                )
+
+        # The budgets left by the template, before the attribute points
+        base_rules = RulesEngine(CompactCharacter(template))
+        self._base_xp_usage = (
+            base_rules.get_total_xp_usage()
+            - base_rules.get_extra_attribute_point_cost()
+        )
+        self._base_remaining_traits = base_rules.get_remaining_traits()
+        self._base_remaining_psycho_points = base_rules.get_remaining_psycho_points()
+
+        # The requirements to check when a property is bought: those of
+        # everything depending on it, or on the budgets every purchase changes
+        self._dependents: dict[int, list[tuple[int, Requirement]]] = dict()
+        requirement_dependents = template.get_requirement_dependents()
+        budget_dependents = set()
+        for stat in self.budget_stats:
+            budget_dependents.update(requirement_dependents.get(stat, []))
+        for record in template.get_records():
+            dependents = budget_dependents.union(
+                requirement_dependents.get(record.name, [])
+            )
+            self._dependents[record.id] = [
+                (template.get_property_id(name), self._requirements[name])
+                for name in sorted(dependents)
+            ]
+
+    @staticmethod
+    def _add_candidate(
+        pools: dict[str, dict[int, list[int]]], kind: str, cost: int, id: int
+    ) -> None:
+        pools[kind].setdefault(cost, []).append(id)
+
+    def _get_player_info(
+        self, profile: NpcProfileType, rng: random.Random, name: str
+    ) -> PlayerInfoType:
+        config = self._config
+        player_info: PlayerInfoType = {
+            "Player": "NPC",
+            "E-mail": "",
+            "Name": name,
+            "Platoon": profile["platoon"] or rng.choice(config["platoons"]),
+            "Rank": (
+                profile["rank"]
+                if profile["rank"] is not None
+                else rng.randrange(len(config["Rank Labels"]))
+            ),
+            "Speciality": profile["speciality"] or rng.choice(config["specialities"]),
+            "Gender": rng.choice(config["genders"]),
+            "Age": rng.randint(config["age"]["min"], config["age"]["max"]),
+        }
+        return player_info
+
+    def _spread_attribute_points(
+        self, character: CompactCharacter, rng: random.Random
+    ) -> None:
+        values = {record.name: record.min for record in self._attributes}
+        points = self._config["Starting AP"] - sum(values.values())
+        open_attributes = [
+            record for record in self._attributes if record.max > values[record.name]
+        ]
+        while points > 0 and open_attributes:
+            index = rng.randrange(len(open_attributes))
+            record = open_attributes[index]
+            values[record.name] = values[record.name] + 1
+            points = points - 1
+            if values[record.name] == record.max:
+                open_attributes[index] = open_attributes[-1]
+                open_attributes.pop()
+        for name, value in values.items():
+            character.set_value(name, value)
+
+    def _requirements_hold(self, rules: RulesEngine, values: array, id: int) -> bool:
+        """
+        The requirements of a property just raised, and of everything bought
+        that depends on it, are fulfilled.
+        """
+        requirement = self._template.get_records()[id].requirements
+        if requirement is not None and not requirement.is_fulfilled(rules.get_value):
+            return False
+        for dependent, requirement in self._dependents[id]:
+            if values[dependent] and not requirement.is_fulfilled(rules.get_value):
+                return False
+        return True
+
+    def generate(
+        self, profile: NpcProfileType, seed: int, index: int
+    ) -> CompactCharacter:
+        """
+        The character with the given index in a batch. The same seed and
+        index always give the same character. The seed is part of the name,
+        so batches of different seeds do not share names.
+        """
+        rng = random.Random(f"{seed}-{index}")
+        character = CompactCharacter(
+            self._template,
+            player_info=self._get_player_info(profile, rng, f"NPC {seed}-{index + 1}"),
+        )
+        rules = RulesEngine(character)
+        self._spread_attribute_points(character, rng)
+        # Changed in place, the character reads its values from it
+        values = character.get_values()
+        records = self._template.get_records()
+
+        remaining_xp = (
+            self._config["Starting XP"]
+            - self._base_xp_usage
+            - rules.get_extra_attribute_point_cost()
+        )
+        remaining_traits = self._base_remaining_traits
+        remaining_psycho_points = self._base_remaining_psycho_points
+        pools = {
+            kind: {cost: list(ids) for cost, ids in buckets.items()}
+            for kind, buckets in self._candidates.items()
+        }
+        kinds = list(pools)
+        set_aside: dict[int, tuple[str, int]] = dict()
+
+        while True:
+            # Only candidates that fit in the XP left are drawn
+            num_affordable = []
+            for kind in kinds:
+                num = 0
+                if kind != "trait" or remaining_traits > 0:
+                    for cost, bucket in pools[kind].items():
+                        if cost <= remaining_xp:
+                            num = num + len(bucket)
+                num_affordable.append(num)
+            weights = [
+                self.pool_weights[kind] if num else 0
+                for kind, num in zip(kinds, num_affordable)
+            ]
+            if not any(weights):
+                break
+            kind_index = rng.choices(range(len(kinds)), weights)[0]
+            kind = kinds[kind_index]
+            position = rng.randrange(num_affordable[kind_index])
+            for cost, bucket in pools[kind].items():
+                if cost <= remaining_xp:
+                    if position < len(bucket):
+                        break
+                    position = position - len(bucket)
+            id = bucket[position]
+            bucket[position] = bucket[-1]
+            bucket.pop()
+
+            record = records[id]
+            psycho_point_cost = 0
+            if record.kind == "psychotic":
+                psycho_point_cost = record.cost
+                if psycho_point_cost > remaining_psycho_points:
+                    continue
+            value = values[id]
+            values[id] = value + 1
+            if not self._requirements_hold(rules, values, id):
+                values[id] = value
+                set_aside[id] = (kind, cost)
+                continue
+
+            remaining_xp = remaining_xp - cost
+            remaining_psycho_points = remaining_psycho_points - psycho_point_cost
+            if kind == "trait":
+                remaining_traits = remaining_traits - 1
+            if kind == "skill" and value + 1 < len(self._step_costs[id]):
+                self._add_candidate(pools, kind, self._step_costs[id][value + 1], id)
+            for dependent, _ in self._dependents[id]:
+                if dependent in set_aside:
+                    dependent_kind, dependent_cost = set_aside.pop(dependent)
+                    self._add_candidate(
+                        pools, dependent_kind, dependent_cost, dependent
+                    )
+
+        if debug_enabled():
+            violations = rules.get_violations()
+            if violations or remaining_xp != rules.get_remaining_experience_points():
+                raise RuntimeError(f"Generated an invalid character: {violations}")
+        return character
+
+
+def generate_npcs(
+    template_path: Path,
+    profile: NpcProfileType,
+    seed: int,
+    start: int,
+    count: int,
+    extensions: dict[str, bool],
+) -> list[GeneratedNpc]:
+    """
+    Generate a range of a batch, as values and player info, which are small
+    to send between processes.
+    """
+    generator = NpcGenerator(load_template(template_path), extensions)
+    generated = []
+    for index in range(start, start + count):
+        character = generator.generate(profile, seed, index)
+        generated.append(
+            (character.get_values().tobytes(), character.get_player_info())
+        )
+    return generated
+
+
+def generate_batch(
+    template_path: Path,
+    profile: NpcProfileType,
+    seed: int,
+    count: int,
+    extensions: dict[str, bool] | None = None,
+    max_workers: int = 1,
+) -> list[CompactCharacter]:
+    """
+    Generate count characters, split across a process pool with more than
+    one worker. The result does not depend on the number of workers.
+    """
+    extensions = extensions or dict()
+    template = load_template(template_path)
+    if max_workers <= 1 or count < 2:
+        generated = generate_npcs(template_path, profile, seed, 0, count, extensions)
+    else:
+        chunk_size = -(-count // max_workers)
+        starts = range(0, count, chunk_size)
+        generated = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for chunk in executor.map(
+                generate_npcs,
+                [template_path] * len(starts),
+                [profile] * len(starts),
+                [seed] * len(starts),
+                starts,
+                [min(chunk_size, count - start) for start in starts],
+                [extensions] * len(starts),
+            ):
+                generated.extend(chunk)
+
+    characters = []
+    for values, player_info in generated:
+        character_values = array(CompactCharacter.typecode)
+        character_values.frombytes(values)
+        characters.append(CompactCharacter(template, character_values, player_info))
+    return characters
+
+
+def save_npcs(
+    characters: list[CompactCharacter], directory: Path
+) -> tuple[list[Path], list[Path]]:
+    """
+    Save characters as the generator does, and add them to the roster index.
+    Characters whose file already exists are not saved, so no character is
+    overwritten. Returns the saved and the skipped paths.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    character_paths = []
+    skipped_paths = []
+    for character in characters:
+        character_path = directory.joinpath(
+            get_character_file_stem(character.get_player_info("Name"))
+        ).with_suffix(".json")
+        if character_path.exists():
+            skipped_paths.append(character_path)
+            continue
+        CharacterExport.to_json(
+            character_path, character.to_character(), character.get_template()
+        )
+        character_paths.append(character_path)
+    RosterIndex(directory).refresh()
+    return character_paths, skipped_paths
+
+
+def _get_sheets(
+    characters: list[CompactCharacter],
+) -> Iterator[tuple[CharacterData, dict[str, ValueType]]]:
+    """
+    The nested character and the stats of each character, built one at a
+    time while the PDF is written.
+    """
+    for character in characters:
+        nested_character = character.to_character()
+        yield nested_character, get_pdf_stats(
+            nested_character, character.get_template()
+        )
+
+
+def export_npcs_pdf(characters: list[CompactCharacter], pdf_path: Path) -> None:
+    """
+    Write all characters to one PDF, a character per page.
+    """
+    CharacterToPdf.write_pdfs(_get_sheets(characters), pdf_path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate random non-player characters that follow the rules."
+    )
+    parser.add_argument("count", type=int, help="Number of characters.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--template", type=Path, default=get_character_template(), help="Template."
+    )
+    parser.add_argument("--speciality", help="Default: random for each character.")
+    parser.add_argument("--platoon", help="Default: random for each character.")
+    parser.add_argument(
+        "--rank", help="Rank label or number. Default: random for each character."
+    )
+    parser.add_argument(
+        "--extension",
+        action="append",
+        default=[],
+        help="Also buy properties of an extension, such as navy. Repeatable.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory to save the characters to.",
+    )
+    parser.add_argument(
+        "--pdf", type=Path, default=None, help="Write one PDF instead of saving."
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    config = load_template(args.template).get_character()["Config"]
+    rank = None
+    if args.rank is not None:
+        if args.rank in config["Rank Labels"]:
+            rank = config["Rank Labels"].index(args.rank)
+        elif args.rank.isdigit() and int(args.rank) < len(config["Rank Labels"]):
+            rank = int(args.rank)
+        else:
+            parser.error(f"Unknown rank {args.rank}")
+    for option, known in (
+        (args.speciality, config["specialities"]),
+        (args.platoon, config["platoons"]),
+    ):
+        if option is not None and option not in known:
+            parser.error(f"Unknown {option}, choose from {', '.join(known)}")
+    profile: NpcProfileType = {
+        "speciality": args.speciality,
+        "platoon": args.platoon,
+        "rank": rank,
+    }
+
+    start = time.perf_counter()
+    characters = generate_batch(
+        args.template,
+        profile,
+        args.seed,
+        args.count,
+        {extension: True for extension in args.extension},
+        args.workers,
+    )
+    seconds = time.perf_counter() - start
+    print(
+        f"Generated {len(characters)} characters in {seconds:.2f} s "
+        f"({len(characters) / max(seconds, 1e-9):.0f} characters/s)."
+    )
+    if args.pdf is not None:
+        export_npcs_pdf(characters, args.pdf)
+        print(f"Wrote {args.pdf}")
+    else:
+        character_paths, skipped_paths = save_npcs(characters, args.output)
+        for character_path in skipped_paths:
+            print(f"{character_path.name}: SKIPPED, already exists")
+        print(f"Saved {len(character_paths)} characters to {args.output}")
+        if skipped_paths:
+            print(f"Skipped {len(skipped_paths)} existing characters.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import operator
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+from extra_types import RequirementsType
+
+type ValueGetter = Callable[[str], int]
+
+COMPARISONS: dict[str, Callable[[int, int], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class Requirement(ABC):
+    """
+    A compiled requirement that can be evaluated against current values.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def is_fulfilled(self, get_value: ValueGetter) -> bool:
+        pass
+
+    @abstractmethod
+    def get_failures(self, get_value: ValueGetter) -> list[str]:
+        """
+        Describe each clause that prevents the requirement from being fulfilled.
+        """
+
+    @abstractmethod
+    def describe(self) -> str:
+        pass
+
+    @abstractmethod
+    def get_sources(self) -> set[str]:
+        """
+        All property, stat or rank names the requirement depends on.
+        """
+
+
+class Comparison(Requirement):
+    __slots__ = ("source", "type", "value", "_compare")
+
+    def __init__(self, source: str, comparison: str, value: int) -> None:
+        if comparison not in COMPARISONS:
+            raise ValueError(f"Unknown requirement type '{comparison}' for {source}")
+        self.source = source
+        self.type = comparison
+        self.value = value
+        self._compare = COMPARISONS[comparison]
+
+    def is_fulfilled(self, get_value: ValueGetter) -> bool:
+        return self._compare(get_value(self.source), self.value)
+
+    def get_failures(self, get_value: ValueGetter) -> list[str]:
+        actual_value = get_value(self.source)
+        if self._compare(actual_value, self.value):
+            return []
+        return [f"{self.describe()} (is {actual_value})"]
+
+    def describe(self) -> str:
+        return f"{self.source} {self.type} {self.value}"
+
+    def get_sources(self) -> set[str]:
+        return {self.source}
+
+
+class AllOf(Requirement):
+    __slots__ = ("children",)
+
+    def __init__(self, children: list[Requirement]) -> None:
+        self.children = children
+
+    def is_fulfilled(self, get_value: ValueGetter) -> bool:
+        for child in self.children:
+            if not child.is_fulfilled(get_value):
+                return False
+        return True
+
+    def get_failures(self, get_value: ValueGetter) -> list[str]:
+        failures = []
+        for child in self.children:
+            failures.extend(child.get_failures(get_value))
+        return failures
+
+    def describe(self) -> str:
+        return "(" + " and ".join(child.describe() for child in self.children) + ")"
+
+    def get_sources(self) -> set[str]:
+        return set().union(*(child.get_sources() for child in self.children))
+
+
+class AnyOf(Requirement):
+    __slots__ = ("children",)
+
+    def __init__(self, children: list[Requirement]) -> None:
+        self.children = children
+
+    def is_fulfilled(self, get_value: ValueGetter) -> bool:
+        for child in self.children:
+            if child.is_fulfilled(get_value):
+                return True
+        return False
+
+    def get_failures(self, get_value: ValueGetter) -> list[str]:
+        if self.is_fulfilled(get_value):
+            return []
+        return [self.describe()]
+
+    def describe(self) -> str:
+        return "(" + " or ".join(child.describe() for child in self.children) + ")"
+
+    def get_sources(self) -> set[str]:
+        return set().union(*(child.get_sources() for child in self.children))
+
+
+class Not(Requirement):
+    __slots__ = ("child",)
+
+    def __init__(self, child: Requirement) -> None:
+        self.child = child
+
+    def is_fulfilled(self, get_value: ValueGetter) -> bool:
+        return not self.child.is_fulfilled(get_value)
+
+    def get_failures(self, get_value: ValueGetter) -> list[str]:
+        if self.is_fulfilled(get_value):
+            return []
+        return [self.describe()]
+
+    def describe(self) -> str:
+        return f"not {self.child.describe()}"
+
+    def get_sources(self) -> set[str]:
+        return self.child.get_sources()
+
+
+def compile_requirements(requirements: RequirementsType) -> Requirement:
+    """
+    Compile the requirements of a property, as written in the template, into a
+    predicate. All entries must be fulfilled. Besides comparisons against a
+    named value, an entry can be a group:
+
+    * "all": a list of requirements that must all be fulfilled.
+    * "any": a list of requirements where at least one must be fulfilled.
+    * "not": requirements that must not be fulfilled.
+
+    For example, either pilot skill of at least 3, and not Loner:
+    {"any": [{"Pilot: Atmospheric": {"type": ">=", "value": 3}},
+             {"Pilot: Space": {"type": ">=", "value": 3}}],
+     "not": {"Loner": {"type": "==", "value": 1}}}
+    """
+    children: list[Requirement] = []
+    for key, requirement in requirements.items():
+        if key == "all":
+            children.append(AllOf([compile_requirements(r) for r in requirement]))
+        elif key == "any":
+            children.append(AnyOf([compile_requirements(r) for r in requirement]))
+        elif key == "not":
+            children.append(Not(compile_requirements(requirement)))
+        else:
+            children.append(Comparison(key, requirement["type"], requirement["value"]))
+
+    if len(children) == 1:
+        return children[0]
+    return AllOf(children)
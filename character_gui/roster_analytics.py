@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from character_io import CharacterImport, get_character_save_location
+from rules_engine import RulesEngine
+
+
+class RosterAggregate:
+    """
+    Counts over many characters, built one character at a time so that only
+    a single character is loaded at once.
+
+    Properties are grouped by the tab, sub tab and group they are shown under
+    in the character generator. Checked properties, such as traits, count the
+    characters that have them, and leveled properties, attributes and skills,
+    count the characters at each level.
+
+    Two aggregates of different characters merge into the aggregate of all of
+    them, so a roster can be split across processes.
+    """
+
+    # The balances reported as left unspent
+    pools = ("Experience Points", "Attribute Points", "Available Traits")
+
+    def __init__(self) -> None:
+        self.num_characters = 0
+        self.num_invalid = 0
+        self.failed: list[str] = []
+        self.paths: dict[str, tuple[str, str, str]] = dict()
+        self.kinds: dict[str, str] = dict()
+        self.checked: Counter[str] = Counter()
+        self.levels: dict[str, Counter[int]] = dict()
+        self.unspent: dict[str, Counter[int]] = {pool: Counter() for pool in self.pools}
+        self.specialities: Counter[str] = Counter()
+        self.platoons: Counter[str] = Counter()
+        self.speciality_unspent_xp: Counter[str] = Counter()
+        self.platoon_unspent_xp: Counter[str] = Counter()
+        self.violations: Counter[str] = Counter()
+
+    def add_character(self, rules: RulesEngine) -> None:
+        character = rules.get_character()
+        template = rules.get_template()
+        self.num_characters = self.num_characters + 1
+        for name, path in template.get_paths().items():
+            kind = rules.get_property_kind(name)
+            self.paths.setdefault(name, path)
+            self.kinds.setdefault(name, kind)
+            value = character.get_value(name)
+            if kind in ("attribute", "skill"):
+                self.levels.setdefault(name, Counter())[int(value)] += 1
+            elif value:
+                self.checked[name] += 1
+
+        balances = rules.get_balances()
+        for pool in self.pools:
+            self.unspent[pool][balances[pool]["remaining"]] += 1
+        remaining_xp = balances["Experience Points"]["remaining"]
+        speciality = character.get_player_info("Speciality")
+        platoon = character.get_player_info("Platoon")
+        self.specialities[speciality] += 1
+        self.platoons[platoon] += 1
+        self.speciality_unspent_xp[speciality] += remaining_xp
+        self.platoon_unspent_xp[platoon] += remaining_xp
+
+        violations = rules.get_violations()
+        if violations:
+            self.num_invalid = self.num_invalid + 1
+        for violation in violations:
+            self.violations[violation["property"]] += 1
+
+    def add_failure(self, file_name: str) -> None:
+        self.failed.append(file_name)
+
+    def merge(self, other: "RosterAggregate") -> None:
+        self.num_characters = self.num_characters + other.num_characters
+        self.num_invalid = self.num_invalid + other.num_invalid
+        self.failed.extend(other.failed)
+        for name, path in other.paths.items():
+            self.paths.setdefault(name, path)
+            self.kinds.setdefault(name, other.kinds[name])
+        self.checked.update(other.checked)
+        for name, levels in other.levels.items():
+            self.levels.setdefault(name, Counter()).update(levels)
+        for pool, unspent in other.unspent.items():
+            self.unspent[pool].update(unspent)
+        self.specialities.update(other.specialities)
+        self.platoons.update(other.platoons)
+        self.speciality_unspent_xp.update(other.speciality_unspent_xp)
+        self.platoon_unspent_xp.update(other.platoon_unspent_xp)
+        self.violations.update(other.violations)
+
+    def _get_share(self, count: int) -> float:
+        return round(count / self.num_characters, 4) if self.num_characters else 0.0
+
+    def _get_mean(self, counts: Counter[int]) -> float:
+        total = counts.total()
+        if not total:
+            return 0.0
+        return round(sum(value * count for value, count in counts.items()) / total, 2)
+
+    def _get_breakdown(self, counts: Counter[str], unspent_xp: Counter[str]) -> dict:
+        return {
+            key: {
+                "characters": count,
+                "mean_unspent_xp": round(unspent_xp[key] / count, 2),
+            }
+            for key, count in counts.most_common()
+        }
+
+    def _get_property_summary(self, name: str) -> dict:
+        if name in self.levels:
+            levels = self.levels[name]
+            return {
+                "kind": self.kinds[name],
+                "mean": self._get_mean(levels),
+                "levels": {str(level): levels[level] for level in sorted(levels)},
+            }
+        return {
+            "kind": self.kinds[name],
+            "characters": self.checked[name],
+            "share": self._get_share(self.checked[name]),
+        }
+
+    def get_summary(self) -> dict:
+        """
+        Everything counted, with properties nested by tab, sub tab and group.
+        """
+        properties: dict[str, dict[str, dict[str, dict]]] = dict()
+        for name, (tab, sub_tab, group) in self.paths.items():
+            properties.setdefault(tab, dict()).setdefault(sub_tab, dict()).setdefault(
+                group, dict()
+            )[name] = self._get_property_summary(name)
+        return {
+            "Characters": self.num_characters,
+            "Invalid": self.num_invalid,
+            "Failed": sorted(self.failed),
+            "Unspent": {
+                pool: {
+                    "mean": self._get_mean(unspent),
+                    "counts": {str(value): unspent[value] for value in sorted(unspent)},
+                }
+                for pool, unspent in self.unspent.items()
+            },
+            "Specialities": self._get_breakdown(
+                self.specialities, self.speciality_unspent_xp
+            ),
+            "Platoons": self._get_breakdown(self.platoons, self.platoon_unspent_xp),
+            "Violations": dict(self.violations.most_common()),
+            "Properties": properties,
+        }
+
+    def write_json(self, json_path: Path) -> None:
+        with json_path.open(mode="w") as json_file:
+            json.dump(self.get_summary(), json_file, indent=4)
+
+    def write_csv(self, csv_path: Path) -> None:
+        """
+        A row per property, and per level for leveled properties, in the
+        order of the template.
+        """
+        with csv_path.open(mode="w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(
+                [
+                    "tab",
+                    "sub_tab",
+                    "group",
+                    "property",
+                    "kind",
+                    "level",
+                    "characters",
+                    "share",
+                ]
+            )
+            for name, (tab, sub_tab, group) in self.paths.items():
+                row = [tab, sub_tab, group, name, self.kinds[name]]
+                if name in self.levels:
+                    levels = self.levels[name]
+                    for level in sorted(levels):
+                        writer.writerow(
+                            row + [level, levels[level], self._get_share(levels[level])]
+                        )
+                else:
+                    count = self.checked[name]
+                    writer.writerow(row + ["", count, self._get_share(count)])
+
+
+def analyze_character_files(character_files: list[Path]) -> RosterAggregate:
+    """
+    Aggregate character files one at a time. Files that can not be loaded are
+    reported and counted as failed.
+    """
+    aggregate = RosterAggregate()
+    for character_path in character_files:
+        try:
+            character_import = CharacterImport.from_json(character_path)
+            rules = RulesEngine(
+                character_import.get_character(), character_import.get_template()
+            )
+            aggregate.add_character(rules)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            print(f"{character_path.name}: FAILED {error!r}")
+            aggregate.add_failure(character_path.name)
+    return aggregate
+
+
+def analyze_directory(
+    directory: Path, max_workers: int | None = None
+) -> RosterAggregate:
+    """
+    Aggregate every character file in a directory. With more than one worker
+    the files are split across a process pool and the partial aggregates are
+    merged.
+    """
+    character_files = sorted(directory.glob("*.json"))
+    workers = max_workers or 1
+    if workers == 1 or len(character_files) < 2:
+        return analyze_character_files(character_files)
+
+    chunks = [character_files[start::workers] for start in range(workers)]
+    aggregate = RosterAggregate()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(analyze_character_files, chunks):
+            aggregate.merge(partial)
+    return aggregate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Summarize all characters in a directory as CSV and JSON."
+    )
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory with character json-files.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("."),
+        help="Directory for roster_analytics.json and roster_analytics.csv.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"Processes to use, for example {os.cpu_count()}.",
+    )
+    args = parser.parse_args()
+
+    aggregate = analyze_directory(args.directory, max_workers=args.workers)
+    args.output.mkdir(parents=True, exist_ok=True)
+    aggregate.write_json(args.output.joinpath("roster_analytics.json"))
+    aggregate.write_csv(args.output.joinpath("roster_analytics.csv"))
+    print(
+        f"Summarized {aggregate.num_characters} characters, "
+        f"{aggregate.num_invalid} invalid, {len(aggregate.failed)} failed."
+    )
+    return 1 if aggregate.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import get_type_hints
+
+from character_io import CharacterImport, open_atomic
+from extra_types import CharacterData, RosterEntryType
+from rules_engine import RulesEngine
+
+
+class RosterIndex:
+    """
+    A summary of every character file in a directory, stored in an index file
+    next to them, so that the roster can be listed without loading each
+    character.
+
+    A file is only loaded again when its modification time or size differs
+    from the index, and only summarized again when its content hash differs.
+    """
+
+    file_name = "roster.index"
+    version = 1
+    entry_types = get_type_hints(RosterEntryType)
+
+    def __init__(self, directory: Path) -> None:
+        self._directory = directory
+        self._index_path = directory.joinpath(self.file_name)
+        self._entries: dict[str, RosterEntryType] = self._read()
+
+    def _read(self) -> dict[str, RosterEntryType]:
+        try:
+            with self._index_path.open() as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return dict()
+        if not isinstance(index, dict) or index.get("version") != self.version:
+            return dict()
+        entries = index.get("entries")
+        if not isinstance(entries, list):
+            return dict()
+        # Files without a valid entry are indexed again by refresh()
+        return {entry["file"]: entry for entry in entries if self._is_valid(entry)}
+
+    @classmethod
+    def _is_valid(cls, entry) -> bool:
+        """
+        Whether an entry read from the index file has every field, of the
+        right type, and names a file in the directory.
+        """
+        if not isinstance(entry, dict):
+            return False
+        for key, value_type in cls.entry_types.items():
+            if key not in entry or not isinstance(entry[key], value_type):
+                return False
+        return Path(entry["file"]).name == entry["file"]
+
+    def save(self) -> None:
+        """
+        Write the index. The index is only a cache, so a directory that can
+        not be written to is not an error.
+        """
+        index = {"version": self.version, "entries": self.get_entries()}
+        try:
+            with open_atomic(self._index_path) as index_file:
+                json.dump(index, index_file, indent=1)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _summarize(
+        character_path: Path,
+        stat: os.stat_result,
+        digest: str,
+        character: CharacterData | None,
+        remaining_xp: int | None,
+    ) -> RosterEntryType:
+        entry: RosterEntryType = {
+            "file": character_path.name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": digest,
+            "name": character_path.stem.replace("_", " ").title(),
+            "player": "",
+            "platoon": "",
+            "rank": "",
+            "speciality": "",
+            "remaining_xp": remaining_xp,
+        }
+        if character is not None:
+            player_info = character["Player Info"]
+            rank_labels = character["Config"]["Rank Labels"]
+            entry["name"] = player_info["Name"]
+            entry["player"] = player_info["Player"]
+            entry["platoon"] = player_info["Platoon"]
+            entry["rank"] = rank_labels[player_info["Rank"]]
+            entry["speciality"] = player_info["Speciality"]
+        return entry
+
+    def _index_file(self, character_path: Path, stat: os.stat_result) -> None:
+        content = character_path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        entry = self._entries.get(character_path.name)
+        if entry is not None and entry["hash"] == digest:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            entry["size"] = stat.st_size
+            return
+
+        character = None
+        remaining_xp = None
+        try:
+            character_import = CharacterImport.from_json(character_path)
+            character = character_import.get_character()
+            remaining_xp = RulesEngine(
+                character, character_import.get_template()
+            ).get_remaining_experience_points()
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+            # Still list the file, so the problem is visible when opening it
+            print(f"Could not index {character_path.name}: {error!r}")
+        self._entries[character_path.name] = self._summarize(
+            character_path, stat, digest, character, remaining_xp
+        )
+
+    def refresh(self) -> bool:
+        """
+        Bring the index up to date with the directory. Returns True if
+        anything changed, in which case the index has been saved.
+        """
+        changed = False
+        found = set()
+        if not self._directory.is_dir():
+            return changed
+        with os.scandir(self._directory) as directory_entries:
+            for directory_entry in directory_entries:
+                is_json = directory_entry.name.endswith(".json")
+                if not is_json or not directory_entry.is_file():
+                    continue
+                found.add(directory_entry.name)
+                stat = directory_entry.stat()
+                entry = self._entries.get(directory_entry.name)
+                if (
+                    entry is None
+                    or entry["mtime_ns"] != stat.st_mtime_ns
+                    or entry["size"] != stat.st_size
+                ):
+                    self._index_file(Path(directory_entry.path), stat)
+                    changed = True
+
+        for removed in self._entries.keys() - found:
+            del self._entries[removed]
+            changed = True
+
+        if changed:
+            self.save()
+        return changed
+
+    def update(
+        self, character_path: Path, character: CharacterData, remaining_xp: int
+    ) -> None:
+        """
+        Record a character that was just saved, without loading it again.
+        """
+        content = character_path.read_bytes()
+        self._entries[character_path.name] = self._summarize(
+            character_path,
+            character_path.stat(),
+            hashlib.sha256(content).hexdigest(),
+            character,
+            remaining_xp,
+        )
+        self.save()
+
+    def get_entries(self) -> list[RosterEntryType]:
+        return [self._entries[name] for name in sorted(self._entries)]
+
+    def get_path(self, entry: RosterEntryType) -> Path:
+        return self._directory.joinpath(entry["file"])
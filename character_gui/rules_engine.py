@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from character_io import CharacterImport, get_character_save_location
+from character_overlay import CharacterOverlay
+from compact_character import CompactCharacter
+from extra_types import (
+    BalanceType,
+    CharacterData,
+    CharacterReport,
+    ViolationType,
+)
+from template_compiler import CompiledTemplate
+
+
+def debug_enabled() -> bool:
+    """
+    Debug mode enables expensive consistency checks, such as verifying the
+    cost ledger against a full recomputation after every change.
+    """
+    return os.getenv("USCM_DEBUG", "0") not in ("", "0")
+
+
+class RulesEngine:
+    """
+    Price and validate a character without any user interface.
+
+    The engine reads the current values through a character overlay on every
+    call, so changes made through the overlay by the caller are reflected
+    directly. Plain character data is wrapped in an overlay of its own, using
+    the compiled template when given. A compact character is read directly.
+    """
+
+    xp_per_ap = 8
+
+    def __init__(
+        self,
+        character: CharacterData | CharacterOverlay | CompactCharacter,
+        template: CompiledTemplate | None = None,
+    ) -> None:
+        if not isinstance(character, (CharacterOverlay, CompactCharacter)):
+            character = CharacterOverlay(character, template)
+        self._character = character
+        self._config = character.get_config()
+        self._properties = character.get_properties()
+        self._template = character.get_template()
+        self._property_kinds = self._template.get_property_kinds()
+        self._derived_stats = {
+            "Carry Capacity": self.get_carry_capacity,
+            "Combat Load": self.get_combat_load,
+            "Psycho Limit": self.get_psycho_limit,
+            "Stress Limit": self.get_stress_limit,
+            "Stunt Cap": self.get_stunt_cap,
+            "Leadership Points": self.get_leadership_points,
+            "Health": self.get_health,
+            "Psycho Points": self.get_remaining_psycho_points,
+            "Attribute Points": self.get_attribute_points,
+            "Extra Attribute Points": self.get_extra_attribute_points,
+            "Experience Points": self.get_remaining_experience_points,
+            "Available Traits": self.get_remaining_traits,
+        }
+
+        self._requirements = self._template.get_requirements()
+        self._requirement_dependents = self._template.get_requirement_dependents()
+        self._check_requirement_sources()
+
+    def _check_requirement_sources(self) -> None:
+        """
+        Every requirement must refer to a property, a derived stat or 'Rank'.
+        """
+        for source, dependents in self._requirement_dependents.items():
+            known = source in self._properties or source in self._derived_stats
+            if not known and source != "Rank":
+                raise ValueError(
+                    f"{dependents[0]} has a requirement on unknown {source}"
+                )
+
+    def get_character(self) -> CharacterOverlay | CompactCharacter:
+        return self._character
+
+    def get_template(self) -> CompiledTemplate:
+        return self._template
+
+    def get_properties(self) -> dict:
+        """
+        The property definitions keyed by name, with their imported values.
+        Use get_value() for the current value.
+        """
+        return self._properties
+
+    def get_property_names(self, kind: str) -> list[str]:
+        return self._template.get_property_names(kind)
+
+    def get_requirement_dependents(self, source: str) -> list[str]:
+        return self._requirement_dependents.get(source, [])
+
+    def get_property_kind(self, name: str) -> str:
+        """
+        One of 'attribute', 'skill', 'trait', 'psychotic' or 'expertise'.
+        """
+        return self._property_kinds[name]
+
+    def get_cost_table(self, skill: str) -> list[int]:
+        return self._properties[skill].get(
+            "cost_table", self._config["skill_cost_table"]
+        )
+
+    def get_value(self, name: str) -> int:
+        """
+        Get the current value of a property, derived stat or the rank.
+        """
+        if name in self._properties:
+            return self._character.get_value(name)
+        if name == "Rank":
+            return self._character.get_player_info("Rank")
+        return self._derived_stats[name]()
+
+    def get_base_attribute_points(self) -> int:
+        return self._config["Starting AP"]
+
+    def get_base_experience_points(self) -> int:
+        return self._config["Starting XP"]
+
+    def get_base_available_traits(self) -> int:
+        return self._config["Starting Traits"]
+
+    def get_base_psycho_points(self) -> int:
+        return self._config.get("Psycho Points", 0)
+
+    def get_attribute_value(self, attribute: str) -> int:
+        return self._character.get_value(attribute)
+
+    def get_total_attribute_cost(self) -> int:
+        sum_points = 0
+        for attribute in self.get_property_names("attribute"):
+            sum_points = sum_points + self._character.get_value(attribute)
+        return sum_points
+
+    def get_attribute_points(self) -> int:
+        AP = self.get_base_attribute_points() - self.get_total_attribute_cost()
+        return max(AP, 0)
+
+    def get_extra_attribute_points(self) -> int:
+        extra_AP = self.get_total_attribute_cost() - self.get_base_attribute_points()
+        return max(extra_AP, 0)
+
+    def get_extra_attribute_point_cost(self) -> int:
+        return self.xp_per_ap * self.get_extra_attribute_points()
+
+    def get_total_knowledge_cost(self) -> int:
+        """
+        Calulate the xp cost for all skills.
+        """
+        sum_cost = 0
+        for skill in self.get_property_names("skill"):
+            cost_table = self.get_cost_table(skill)
+            sum_cost = sum_cost + cost_table[self._character.get_value(skill)]
+        return sum_cost
+
+    def get_total_property_cost(self, kind: str) -> int:
+        """
+        Calculate the total cost of the checked boolean properties of a kind.
+        For example 'trait'.
+        """
+        sum_cost = 0
+        for name in self.get_property_names(kind):
+            if self._character.get_value(name):
+                sum_cost = sum_cost + self._properties[name]["cost"]
+        return sum_cost
+
+    def get_total_xp_usage(self) -> int:
+        return (
+            self.get_total_knowledge_cost()
+            + self.get_total_property_cost("expertise")
+            + self.get_total_property_cost("trait")
+            + self.get_extra_attribute_point_cost()
+        )
+
+    def get_remaining_experience_points(self) -> int:
+        return self.get_base_experience_points() - self.get_total_xp_usage()
+
+    def get_count_traits(self) -> int:
+        sum_traits = 0
+        for kind in ("trait", "psychotic"):
+            for name in self.get_property_names(kind):
+                if self._character.get_value(name):
+                    sum_traits = sum_traits + 1
+        return sum_traits
+
+    def get_remaining_traits(self) -> int:
+        return self.get_base_available_traits() - self.get_count_traits()
+
+    def get_psycho_point_cost(self) -> int:
+        """
+        Calculate the total cost of Psychotic Disadvantages.
+        """
+        return self.get_total_property_cost("psychotic")
+
+    def get_remaining_psycho_points(self) -> int:
+        return self.get_base_psycho_points() - self.get_psycho_point_cost()
+
+    def get_psycho_limit(self) -> int:
+        return self.get_attribute_value("Psyche")
+
+    def get_stress_limit(self) -> int:
+        return self.get_attribute_value("Psyche") * 2
+
+    def get_stunt_cap(self) -> int:
+        return self.get_attribute_value("Charisma")
+
+    def get_health(self) -> int:
+        return self.get_attribute_value("Endurance") + 3
+
+    def get_carry_capacity(self) -> int:
+        idx = self.get_attribute_value("Strength") - 1
+        return self._config["Carry Capacity Table"][idx]
+
+    def get_combat_load(self) -> int:
+        idx = self.get_attribute_value("Strength") - 1
+        return self._config["Combat Load Table"][idx]
+
+    def get_leadership_points(self) -> int:
+        rank_index = self._character.get_player_info("Rank")
+        rank_bonus = self._config["Rank Bonus"][rank_index]
+        return self.get_attribute_value("Charisma") + rank_bonus - 2
+
+    def get_stats(self) -> dict[str, int]:
+        """
+        Get all derived stats, including the remaining point pools.
+        """
+        return {name: getter() for name, getter in self._derived_stats.items()}
+
+    def has_requirements(self, property: str) -> bool:
+        return property in self._requirements
+
+    def requirements_fulfilled(self, property: str) -> bool:
+        return self._requirements[property].is_fulfilled(self.get_value)
+
+    def get_unfulfilled_requirements(self, property: str) -> list[str]:
+        """
+        Describe each requirement of a property that is currently not met.
+        """
+        if property not in self._requirements:
+            return []
+        return self._requirements[property].get_failures(self.get_value)
+
+    def get_balances(self) -> dict[str, BalanceType]:
+        balances: dict[str, BalanceType] = {
+            "Experience Points": {
+                "total": self.get_base_experience_points(),
+                "spent": self.get_total_xp_usage(),
+                "remaining": self.get_remaining_experience_points(),
+            },
+            "Attribute Points": {
+                "total": self.get_base_attribute_points(),
+                "spent": self.get_total_attribute_cost(),
+                "remaining": (
+                    self.get_base_attribute_points() - self.get_total_attribute_cost()
+                ),
+            },
+            "Psycho Points": {
+                "total": self.get_base_psycho_points(),
+                "spent": self.get_psycho_point_cost(),
+                "remaining": self.get_remaining_psycho_points(),
+            },
+            "Available Traits": {
+                "total": self.get_base_available_traits(),
+                "spent": self.get_count_traits(),
+                "remaining": self.get_remaining_traits(),
+            },
+        }
+        return balances
+
+    def get_violations(self) -> list[ViolationType]:
+        """
+        List everything that makes the character break the rules.
+        Attribute points above the starting AP are bought with XP and are
+        therefore not a violation on their own.
+        """
+        violations: list[ViolationType] = []
+        for pool, balance in self.get_balances().items():
+            if pool != "Attribute Points" and balance["remaining"] < 0:
+                violations.append(
+                    {
+                        "property": pool,
+                        "reason": f"Overspent by {-balance['remaining']}",
+                    }
+                )
+
+        for name, property in self._properties.items():
+            value = self._character.get_value(name)
+            if "min" in property and value < property["min"]:
+                violations.append(
+                    {"property": name, "reason": f"Below minimum {property['min']}"}
+                )
+            if "max" in property and value > property["max"]:
+                violations.append(
+                    {"property": name, "reason": f"Above maximum {property['max']}"}
+                )
+            if value and self.has_requirements(name):
+                for unfulfilled in self.get_unfulfilled_requirements(name):
+                    violations.append(
+                        {"property": name, "reason": f"Requires {unfulfilled}"}
+                    )
+        return violations
+
+    def evaluate(self) -> CharacterReport:
+        report: CharacterReport = {
+            "Balances": self.get_balances(),
+            "Stats": self.get_stats(),
+            "Violations": self.get_violations(),
+        }
+        return report
+
+
+class CostLedger:
+    """
+    Running totals of the XP, AP, PP and trait pools, and the checked traits,
+    psychotic disadvantages and expertise.
+
+    The totals are computed once with the full rules and after that only the
+    cost difference of each changed property is applied, which makes an update
+    independent of the template size. With debug mode enabled every update is
+    cross-checked against a full recomputation.
+    """
+
+    # The kinds that are bought by checking them, at a fixed cost
+    checked_kinds = ("trait", "psychotic", "expertise")
+
+    def __init__(self, rules: RulesEngine, verify: bool | None = None) -> None:
+        self._rules = rules
+        self._verify = debug_enabled() if verify is None else verify
+        self.recompute()
+
+    def recompute(self) -> None:
+        """
+        Rebuild all totals from the current character state.
+        """
+        rules = self._rules
+        self._xp_usage = rules.get_total_xp_usage() - (
+            rules.get_extra_attribute_point_cost()
+        )
+        self._attribute_cost = rules.get_total_attribute_cost()
+        self._psycho_point_cost = rules.get_psycho_point_cost()
+        self._trait_count = rules.get_count_traits()
+        template = rules.get_template()
+        self._checked = {
+            template.get_property_id(name)
+            for kind in self.checked_kinds
+            for name in rules.get_property_names(kind)
+            if rules.get_value(name)
+        }
+
+    def apply(self, name: str, old_value: int, new_value: int) -> None:
+        """
+        Apply the cost difference of a single property changing value.
+        Must be called after the new value has been stored in the character.
+        """
+        kind = self._rules.get_property_kind(name)
+        if kind == "attribute":
+            self._attribute_cost = self._attribute_cost + new_value - old_value
+        elif kind == "skill":
+            cost_table = self._rules.get_cost_table(name)
+            self._xp_usage = (
+                self._xp_usage + cost_table[new_value] - cost_table[old_value]
+            )
+        else:
+            toggled = int(bool(new_value)) - int(bool(old_value))
+            cost = toggled * self._rules.get_properties()[name]["cost"]
+            if kind == "psychotic":
+                self._psycho_point_cost = self._psycho_point_cost + cost
+            else:
+                self._xp_usage = self._xp_usage + cost
+            if kind != "expertise":
+                self._trait_count = self._trait_count + toggled
+            if toggled:
+                id = self._rules.get_template().get_property_id(name)
+                if toggled > 0:
+                    self._checked.add(id)
+                else:
+                    self._checked.discard(id)
+
+        if self._verify:
+            self.verify()
+
+    def verify(self) -> None:
+        """
+        Compare the running totals with a full recomputation.
+        """
+        rules = self._rules
+        expected = {
+            "Experience Points": rules.get_remaining_experience_points(),
+            "Attribute Points": rules.get_attribute_points(),
+            "Extra Attribute Points": rules.get_extra_attribute_points(),
+            "Psycho Points": rules.get_remaining_psycho_points(),
+            "Available Traits": rules.get_remaining_traits(),
+        }
+        actual = {
+            "Experience Points": self.get_remaining_experience_points(),
+            "Attribute Points": self.get_attribute_points(),
+            "Extra Attribute Points": self.get_extra_attribute_points(),
+            "Psycho Points": self.get_remaining_psycho_points(),
+            "Available Traits": self.get_remaining_traits(),
+        }
+        assert actual == expected, f"Cost ledger {actual} differs from {expected}"
+        checked = set(self.get_checked_properties())
+        expected_checked = {
+            name
+            for kind in self.checked_kinds
+            for name in rules.get_property_names(kind)
+            if rules.get_value(name)
+        }
+        assert (
+            checked == expected_checked
+        ), f"Cost ledger checked {checked} differs from {expected_checked}"
+
+    def get_total_attribute_cost(self) -> int:
+        return self._attribute_cost
+
+    def get_attribute_points(self) -> int:
+        AP = self._rules.get_base_attribute_points() - self._attribute_cost
+        return max(AP, 0)
+
+    def get_extra_attribute_points(self) -> int:
+        extra_AP = self._attribute_cost - self._rules.get_base_attribute_points()
+        return max(extra_AP, 0)
+
+    def get_total_xp_usage(self) -> int:
+        extra_ap_cost = self._rules.xp_per_ap * self.get_extra_attribute_points()
+        return self._xp_usage + extra_ap_cost
+
+    def get_remaining_experience_points(self) -> int:
+        return self._rules.get_base_experience_points() - self.get_total_xp_usage()
+
+    def get_psycho_point_cost(self) -> int:
+        return self._psycho_point_cost
+
+    def get_remaining_psycho_points(self) -> int:
+        return self._rules.get_base_psycho_points() - self._psycho_point_cost
+
+    def get_count_traits(self) -> int:
+        return self._trait_count
+
+    def get_remaining_traits(self) -> int:
+        return self._rules.get_base_available_traits() - self._trait_count
+
+    def get_checked_properties(self) -> list[str]:
+        """
+        The checked traits, psychotic disadvantages and expertise, in the
+        order of the template.
+        """
+        records = self._rules.get_template().get_records()
+        return [records[id].name for id in sorted(self._checked)]
+
+
+class BonusRegistry:
+    """
+    Bonuses granted by properties, indexed by the stat or skill they target.
+
+    The active bonuses and their formatted string are kept per target and only
+    the targets of a toggled property are refreshed.
+    """
+
+    def __init__(self, rules: RulesEngine) -> None:
+        self._rules = rules
+        self._bonus_sources = rules.get_template().get_bonus_sources()
+        self._contributors = rules.get_template().get_bonus_contributors()
+        self.recompute()
+
+    def recompute(self) -> None:
+        """
+        Rebuild the active bonuses of all targets from the character state.
+        """
+        self._active: set[str] = set()
+        for name in self._bonus_sources:
+            if self._rules.get_value(name) > 0:
+                self._active.add(name)
+        self._permanent: dict[str, int] = dict()
+        self._temporary: dict[str, int] = dict()
+        self._bonus_strings: dict[str, str] = dict()
+        for target in self._contributors:
+            self._refresh_target(target)
+
+    def _refresh_target(self, target: str) -> None:
+        permanent = 0
+        temporary = 0
+        formatted = []
+        for name, bonus in self._contributors[target]:
+            if name in self._active:
+                this_bonus = bonus["value"]
+                if bonus["type"] == "permanent":
+                    permanent = permanent + this_bonus
+                    formatted.append(f"{this_bonus:+g}")
+                else:
+                    temporary = temporary + this_bonus
+                    formatted.append(f"({this_bonus:+g})")
+        self._permanent[target] = permanent
+        self._temporary[target] = temporary
+        self._bonus_strings[target] = "".join(formatted)
+
+    def toggle(self, property: str, active: bool) -> list[str]:
+        """
+        Update the bonuses of a property that was checked or unchecked.
+        Returns the targets whose bonuses changed.
+        """
+        if property not in self._bonus_sources or (property in self._active) == bool(
+            active
+        ):
+            return []
+        if active:
+            self._active.add(property)
+        else:
+            self._active.discard(property)
+
+        targets = []
+        for bonus in self._bonus_sources[property]:
+            if bonus["target"] not in targets:
+                targets.append(bonus["target"])
+                self._refresh_target(bonus["target"])
+        return targets
+
+    def get_targets(self) -> list[str]:
+        return list(self._contributors)
+
+    def is_target(self, target: str) -> bool:
+        return target in self._contributors
+
+    def get_bonus_string(self, target: str) -> str:
+        """
+        For example '+1(+2)' for a permanent +1 and a temporary +2.
+        """
+        return self._bonus_strings.get(target, "")
+
+    def get_permanent_bonus(self, target: str) -> int:
+        return self._permanent.get(target, 0)
+
+    def get_temporary_bonus(self, target: str) -> int:
+        return self._temporary.get(target, 0)
+
+
+def validate_character_file(character_path: Path) -> CharacterReport:
+    """
+    Load and evaluate a single character file. Files that can not be loaded
+    are reported as a violation instead of raising, so that one broken file
+    does not abort a batch.
+    """
+    try:
+        character_import = CharacterImport.from_json(character_path)
+        return RulesEngine(
+            character_import.get_character(), character_import.get_template()
+        ).evaluate()
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as error:
+        return {
+            "Balances": {},
+            "Stats": {},
+            "Violations": [
+                {"property": character_path.name, "reason": f"Unreadable: {error!r}"}
+            ],
+        }
+
+
+def validate_directory(
+    directory: Path, max_workers: int | None = None
+) -> dict[Path, CharacterReport]:
+    """
+    Evaluate every character file in a directory across a process pool.
+    """
+    character_files = sorted(directory.glob("*.json"))
+    if not character_files:
+        return {}
+
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(character_files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = executor.map(
+            validate_character_file, character_files, chunksize=chunksize
+        )
+        return dict(zip(character_files, reports))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Validate all characters in a directory against the rules."
+    )
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=get_character_save_location(),
+        help="Directory with character json-files.",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    reports = validate_directory(args.directory, max_workers=args.workers)
+    num_invalid = 0
+    for character_file, report in reports.items():
+        if report["Violations"]:
+            num_invalid = num_invalid + 1
+            print(f"{character_file.name}: INVALID")
+            for violation in report["Violations"]:
+                print(f"    {violation['property']}: {violation['reason']}")
+        else:
+            remaining_xp = report["Balances"]["Experience Points"]["remaining"]
+            print(f"{character_file.name}: OK ({remaining_xp} XP left)")
+    print(f"Checked {len(reports)} characters, {num_invalid} invalid.")
+    return 1 if num_invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from collections.abc import Callable, Iterable
+from typing import Any
+
+
+class StatScheduler:
+    """
+    Recompute derived stats only when one of their inputs have changed.
+
+    Each stat is declared with the inputs it depends on. Marking an input as
+    changed makes the dependent stats dirty and flush() recomputes every dirty
+    stat once. The rendered text is only pushed to the display when it differs
+    from what is already shown.
+
+    A stat can itself be the input of another stat, as long as it is declared
+    before the stats depending on it.
+    """
+
+    def __init__(self, push: Callable[[str, str], None]) -> None:
+        self._push = push
+        self._stats: dict[str, tuple[Callable[[], Any], Callable[[Any], str]]] = {}
+        self._order: dict[str, int] = dict()
+        self._dependents: dict[str, list[str]] = dict()
+        self._values: dict[str, Any] = dict()
+        self._rendered: dict[str, str] = dict()
+        self._dirty: set[str] = set()
+
+    def add_stat(
+        self,
+        name: str,
+        inputs: Iterable[str],
+        compute: Callable[[], Any],
+        render: Callable[[Any], str] = str,
+    ) -> None:
+        self._stats[name] = (compute, render)
+        self._order[name] = len(self._order)
+        for input_name in inputs:
+            self._dependents.setdefault(input_name, []).append(name)
+        self._dirty.add(name)
+
+    def mark_dirty(self, inputs: Iterable[str]) -> None:
+        for input_name in inputs:
+            self._dirty.update(self._dependents.get(input_name, ()))
+
+    def mark_all_dirty(self) -> None:
+        self._dirty.update(self._stats)
+
+    def get_value(self, name: str) -> Any:
+        return self._values[name]
+
+    def flush(self) -> list[str]:
+        """
+        Recompute all dirty stats and push the ones whose text changed.
+        Returns the names of the stats whose value changed.
+        """
+        changed = []
+        while self._dirty:
+            name = min(self._dirty, key=self._order.__getitem__)
+            self._dirty.discard(name)
+
+            compute, render = self._stats[name]
+            value = compute()
+            if name not in self._values or self._values[name] != value:
+                self._values[name] = value
+                changed.append(name)
+                self.mark_dirty([name])
+
+            text = render(value)
+            if self._rendered.get(name) != text:
+                self._rendered[name] = text
+                self._push(name, text)
+        return changed
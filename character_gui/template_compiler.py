@@ -0,0 +1,460 @@
+import hashlib
+import json
+import os
+import textwrap
+import weakref
+from functools import lru_cache
+from pathlib import Path
+
+from extra_types import BonusType, CharacterData
+from requirements import Requirement, compile_requirements
+
+
+def serialize_properties(character: dict) -> dict:
+    """
+    Flatten a nested character tree into a dict of all value nodes, keyed by
+    property name. The values are references into the tree, not copies.
+    """
+    properties = dict()
+    for key, value in character.items():
+        if "value" in character[key]:
+            properties.update({key: value})
+        else:
+            properties.update(serialize_properties(character[key]))
+    return properties
+
+
+def property_paths(character: dict) -> dict[str, tuple[str, str, str]]:
+    """
+    Map each property name to its (tab, sub tab, category) in the character.
+    """
+    paths = dict()
+    for tab_label, tab in character.items():
+        for sub_tab_label, sub_tab in tab.items():
+            for category_label, category in sub_tab.items():
+                for label in category:
+                    paths[label] = (tab_label, sub_tab_label, category_label)
+    return paths
+
+
+def classify_properties(character: dict) -> dict[str, str]:
+    """
+    Map each property name to the kind of cost it has.
+    """
+    tab_kinds = {
+        "Attributes": "attribute",
+        "Skills": "skill",
+        "Traits": "trait",
+        "Expertise": "expertise",
+    }
+    property_kinds = dict()
+    for tab_label, tab in character.items():
+        for sub_tab_label, sub_tab in tab.items():
+            kind = tab_kinds[tab_label]
+            if sub_tab_label == "Psychotic Disadvantages":
+                kind = "psychotic"
+            for category in sub_tab.values():
+                for label in category:
+                    property_kinds[label] = kind
+    return property_kinds
+
+
+def get_structure_digest(character: CharacterData) -> str:
+    """
+    The hash of the properties of a character without their values: names,
+    layout, costs, limits, requirements, bonuses and tooltips. Characters
+    with the same structure digest have the same properties, shown the same
+    way, whatever template file they were saved with.
+    """
+
+    def without_values(node: dict) -> dict:
+        if "value" in node:
+            return {key: value for key, value in node.items() if key != "value"}
+        return {key: without_values(child) for key, child in node.items()}
+
+    structure = json.dumps(without_values(character["Character"]))
+    return hashlib.sha256(structure.encode()).hexdigest()
+
+
+@lru_cache(maxsize=2048)
+def wrap_tooltip(tooltip: str, tooltip_width: int = 70) -> str:
+    """
+    Wrap a tooltip for display. Results are memoized, since the same
+    tooltips are shown for every character and session, but only for a few
+    templates' worth of tooltips.
+    """
+    # Remove multiple whitespaces
+    tooltip_str = " ".join(tooltip.split())
+
+    if "Req:" in tooltip_str and not tooltip_str.startswith("Req:"):
+        # Put Req on a new line, wrapped separately
+        desc_str, req, req_str = tooltip_str.partition("Req:")
+        desc_str = textwrap.fill(desc_str, width=tooltip_width)
+        req_str = " ".join([req, req_str])
+        req_str = textwrap.fill(req_str, width=tooltip_width)
+        wrapped_text = "\n".join([desc_str, req_str])
+    else:
+        wrapped_text = textwrap.fill(tooltip_str, width=tooltip_width)
+    return wrapped_text
+
+
+def split_dict(source: dict, num_per_part: int, max_row_count=24) -> list[dict]:
+    """
+    Helper function to dived a set of components into groups
+    in order to control the number of items shown horisontally.
+    For example.
+    * Limit the amount traits/advantages/disadvantages for each column.
+    " Limit the amount of skill sub categories for each column.
+    """
+    split_items: list[dict] = []
+    part = dict()
+    row_count: int = 0
+    category_count: int = 0
+    for item_key, item_value in source.items():
+        part[item_key] = item_value
+        category_count = category_count + 1
+        row_count = row_count + len(item_value)
+        if (category_count >= num_per_part) or (row_count >= max_row_count):
+            split_items.append(part)
+            part = dict()
+            category_count = 0
+            row_count = 0
+    if category_count > 0:
+        split_items.append(part)
+    return split_items
+
+
+class PropertyRecord:
+    """
+    The static definition of a property, shared by every character using the
+    template. The id is the index of the property in the template, and of its
+    value in a compact character.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "kind",
+        "path",
+        "default",
+        "cost",
+        "cost_table",
+        "min",
+        "max",
+        "requirements",
+        "bonus",
+        "extended",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        kind: str,
+        path: tuple[str, str, str],
+        property: dict,
+        requirements: Requirement | None,
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.path = path
+        self.default = int(property["value"])
+        self.cost: int | None = property.get("cost")
+        self.cost_table: list[int] | None = property.get("cost_table")
+        self.min: int | None = property.get("min")
+        self.max: int | None = property.get("max")
+        self.requirements = requirements
+        self.bonus: tuple[BonusType, ...] = tuple(property.get("bonus", ()))
+        self.extended: str | None = property.get("extended")
+
+
+class CompiledTemplate:
+    """
+    Everything derived from the template structure of a character that does
+    not depend on the values: the flattened property index, the kind of each
+    property, compiled requirements, bonus indexes, wrapped tooltips and the
+    column layout of each sub tab.
+
+    The data given must not be modified afterwards, since the compiled
+    template is shared between every character using it.
+    """
+
+    # Increase when the compiled content changes, to invalidate cached files
+    version = 4
+    layout_columns = 3
+
+    def __init__(
+        self, character: CharacterData, digest: str = "", file_name: str = ""
+    ) -> None:
+        self._character = character
+        self._digest = digest
+        self._file_name = file_name
+        self._structure_digest: str | None = None
+
+        sections = character["Character"]
+        self._properties = serialize_properties(sections)
+        self._paths = property_paths(sections)
+        self._property_kinds = classify_properties(sections)
+        self._names_by_kind: dict[str, list[str]] = dict()
+        for name, kind in self._property_kinds.items():
+            self._names_by_kind.setdefault(kind, []).append(name)
+
+        self._requirements: dict[str, Requirement] = dict()
+        self._requirement_dependents: dict[str, list[str]] = dict()
+        self._bonus_sources: dict[str, list[BonusType]] = dict()
+        self._bonus_contributors: dict[str, list[tuple[str, BonusType]]] = dict()
+        self._records: list[PropertyRecord] = []
+        self._property_ids: dict[str, int] = dict()
+        for name, property in self._properties.items():
+            requirement = None
+            if "requirements" in property:
+                requirement = compile_requirements(property["requirements"])
+                self._requirements[name] = requirement
+                for source in requirement.get_sources():
+                    self._requirement_dependents.setdefault(source, []).append(name)
+            self._property_ids[name] = len(self._records)
+            self._records.append(
+                PropertyRecord(
+                    len(self._records),
+                    name,
+                    self._property_kinds[name],
+                    self._paths[name],
+                    property,
+                    requirement,
+                )
+            )
+            for bonus in property.get("bonus", []):
+                self._bonus_sources.setdefault(name, []).append(bonus)
+                self._bonus_contributors.setdefault(bonus["target"], []).append(
+                    (name, bonus)
+                )
+
+        self._tooltips: dict[str, str] = dict()
+        self._layouts: dict[tuple[str, str, int], list[dict]] = dict()
+
+    def prepare(self) -> None:
+        """
+        Wrap all tooltips and split all sub tabs up front, instead of on first
+        use.
+        """
+        for name in self._properties:
+            self.get_wrapped_tooltip(name)
+        for tab_label, tab in self._character["Character"].items():
+            for sub_tab_label in tab:
+                self.get_layout(tab_label, sub_tab_label, self.layout_columns)
+
+    def get_character(self) -> CharacterData:
+        return self._character
+
+    def get_digest(self) -> str:
+        """
+        The content hash of the template file, empty when not compiled from one.
+        """
+        return self._digest
+
+    def get_structure_digest(self) -> str:
+        """
+        See get_structure_digest(), computed on first use.
+        """
+        if self._structure_digest is None:
+            self._structure_digest = get_structure_digest(self._character)
+        return self._structure_digest
+
+    def get_file_name(self) -> str:
+        """
+        The file name of the template, empty when not compiled from one.
+        """
+        return self._file_name
+
+    def get_properties(self) -> dict:
+        return self._properties
+
+    def get_records(self) -> list[PropertyRecord]:
+        """
+        The static definition of every property, indexed by property id.
+        """
+        return self._records
+
+    def get_property_id(self, name: str) -> int:
+        return self._property_ids[name]
+
+    def get_record(self, name: str) -> PropertyRecord:
+        return self._records[self._property_ids[name]]
+
+    def get_paths(self) -> dict[str, tuple[str, str, str]]:
+        return self._paths
+
+    def get_property_kinds(self) -> dict[str, str]:
+        return self._property_kinds
+
+    def get_property_names(self, kind: str) -> list[str]:
+        return self._names_by_kind.get(kind, [])
+
+    def get_requirements(self) -> dict[str, Requirement]:
+        return self._requirements
+
+    def get_requirement_dependents(self) -> dict[str, list[str]]:
+        """
+        Map each requirement source (attribute, skill, trait, stat or 'Rank')
+        to the properties whose requirements refer to it.
+        """
+        return self._requirement_dependents
+
+    def get_bonus_sources(self) -> dict[str, list[BonusType]]:
+        return self._bonus_sources
+
+    def get_bonus_contributors(self) -> dict[str, list[tuple[str, BonusType]]]:
+        return self._bonus_contributors
+
+    def get_wrapped_tooltip(self, name: str) -> str:
+        if name not in self._tooltips:
+            tooltip = self._properties[name].get("tooltip", "")
+            self._tooltips[name] = wrap_tooltip(tooltip)
+        return self._tooltips[name]
+
+    def get_layout(self, tab_label: str, sub_tab_label: str, num_per_part: int):
+        """
+        The categories of a sub tab split into columns, see split_dict().
+        """
+        key = (tab_label, sub_tab_label, num_per_part)
+        if key not in self._layouts:
+            sub_tab = self._character["Character"][tab_label][sub_tab_label]
+            self._layouts[key] = split_dict(sub_tab, num_per_part)
+        return self._layouts[key]
+
+    def get_prepared(self) -> dict:
+        """
+        The wrapped tooltips and split sub tabs as plain data, with only the
+        category names of each column.
+        """
+        return {
+            "tooltips": self._tooltips,
+            "layouts": [
+                [*key, [list(column) for column in layout]]
+                for key, layout in self._layouts.items()
+            ],
+        }
+
+    def set_prepared(self, prepared: dict) -> None:
+        """
+        Restore what get_prepared() returned for the same template. Raises an
+        error if it does not match the template.
+        """
+        tooltips = prepared["tooltips"]
+        if tooltips.keys() != self._properties.keys() or not all(
+            isinstance(tooltip, str) for tooltip in tooltips.values()
+        ):
+            raise ValueError("The tooltips do not match the template")
+        layouts = dict()
+        for tab_label, sub_tab_label, num_per_part, columns in prepared["layouts"]:
+            sub_tab = self._character["Character"][tab_label][sub_tab_label]
+            layouts[(tab_label, sub_tab_label, int(num_per_part))] = [
+                {label: sub_tab[label] for label in column} for column in columns
+            ]
+        self._tooltips = dict(tooltips)
+        self._layouts = layouts
+
+
+_compiled_templates: dict[Path, tuple[tuple[int, int], CompiledTemplate]] = dict()
+_character_templates: weakref.WeakValueDictionary[str, CompiledTemplate] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def get_compiled_location(template_path: Path, digest: str) -> Path:
+    return template_path.with_name(f"{template_path.stem}.{digest[:16]}.compiled")
+
+
+def _read_compiled(compiled_path: Path, template: CompiledTemplate) -> bool:
+    """
+    Restore the prepared data of a template from its cached file. The cache
+    is plain json, so a shared template directory can not run code. Returns
+    False if there is no usable cache.
+    """
+    try:
+        with compiled_path.open() as compiled_file:
+            compiled = json.load(compiled_file)
+        if (
+            compiled["version"] != template.version
+            or compiled["digest"] != template.get_digest()
+        ):
+            return False
+        template.set_prepared(compiled["prepared"])
+    except (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError):
+        # A damaged or foreign cache is compiled again
+        return False
+    return True
+
+
+def _write_compiled(template_path: Path, template: CompiledTemplate) -> None:
+    """
+    Store the prepared template next to the template and remove the ones
+    prepared from earlier versions of it. A read-only installation just
+    prepares the template once per process instead.
+    """
+    compiled_path = get_compiled_location(template_path, template.get_digest())
+    temporary_path = compiled_path.with_name(f"{compiled_path.name}.{os.getpid()}")
+    compiled = {
+        "version": template.version,
+        "digest": template.get_digest(),
+        "prepared": template.get_prepared(),
+    }
+    try:
+        with temporary_path.open(mode="w") as compiled_file:
+            json.dump(compiled, compiled_file)
+        os.replace(temporary_path, compiled_path)
+        for old_path in template_path.parent.glob(f"{template_path.stem}.*.compiled"):
+            if old_path != compiled_path:
+                old_path.unlink(missing_ok=True)
+    except OSError:
+        temporary_path.unlink(missing_ok=True)
+
+
+def load_template(template_path: Path) -> CompiledTemplate:
+    """
+    Get the compiled template for a template file.
+
+    Compiled templates are memoized per process, and their wrapped tooltips
+    and layouts are cached on disk next to the template, keyed by the hash of
+    its content. Editing the template changes the hash and therefore
+    invalidates both.
+
+    The property index, requirements and bonus indexes are not cached on
+    disk. They are objects referring into the parsed template, and reading
+    them back would take as long as building them again.
+    """
+    template_path = Path(template_path).resolve()
+    stat = template_path.stat()
+    file_key = (stat.st_mtime_ns, stat.st_size)
+    if template_path in _compiled_templates:
+        memo_key, template = _compiled_templates[template_path]
+        if memo_key == file_key:
+            return template
+
+    content = template_path.read_bytes()
+    digest = hashlib.sha256(content).hexdigest()
+    template = CompiledTemplate(json.loads(content), digest, template_path.name)
+    if not _read_compiled(get_compiled_location(template_path, digest), template):
+        template.prepare()
+        _write_compiled(template_path, template)
+
+    _compiled_templates[template_path] = (file_key, template)
+    return template
+
+
+def compile_character_template(character: CharacterData) -> CompiledTemplate:
+    """
+    Get a compiled template for a character saved with its whole tree instead
+    of a template file. Characters with the same structure digest share one
+    compiled template, as long as one of them is in use, so loading many of
+    them compiles the structure once. The template is compiled from the first
+    of them, so its values are only defaults for the others.
+    """
+    digest = get_structure_digest(character)
+    template = _character_templates.get(digest)
+    if template is None:
+        template = CompiledTemplate(character)
+        template._structure_digest = digest
+        _character_templates[digest] = template
+    return template
@@ -0,0 +1,37 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+GUI_DIR = Path(__file__).resolve().parent.parent
+# The modules import each other by name, as when run from the gui directory
+sys.path.insert(0, str(GUI_DIR))
+
+from template_compiler import CompiledTemplate, load_template  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def character_dirs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Point the character, pdf and template directories at a temporary
+    directory, with a copy of the template, so tests never touch the
+    installation.
+    """
+    template_dir = tmp_path.joinpath("template")
+    template_dir.mkdir()
+    shutil.copy(
+        GUI_DIR.joinpath("local_characters", "template", "template.json"),
+        template_dir,
+    )
+    character_dir = tmp_path.joinpath("characters")
+    character_dir.mkdir()
+    monkeypatch.setenv("USCM_TEMPLATE_DIR", str(template_dir))
+    monkeypatch.setenv("USCM_CHARACTER_DIR", str(character_dir))
+    monkeypatch.setenv("USCM_PDF_DIR", str(character_dir))
+    return character_dir
+
+
+@pytest.fixture
+def template(character_dirs: Path) -> CompiledTemplate:
+    return load_template(character_dirs.parent.joinpath("template", "template.json"))
@@ -0,0 +1,97 @@
+import copy
+import random
+from pathlib import Path
+
+import pytest
+from batch_pricing import group_characters, load_characters, price_characters
+from character_io import CharacterExport
+from compact_character import CompactCharacter
+from rules_engine import RulesEngine
+from template_compiler import CompiledTemplate
+
+
+def get_random_character(template: CompiledTemplate, seed: int) -> CompactCharacter:
+    rng = random.Random(seed)
+    character = CompactCharacter(template)
+    for name in rng.sample(list(template.get_properties()), 40):
+        record = template.get_record(name)
+        if record.kind in ("attribute", "skill"):
+            character.set_value(name, rng.randint(record.min, record.max))
+        else:
+            character.set_value(name, 1 - record.default)
+    character.set_player_info("Name", f"Character {seed}")
+    character.set_player_info("Rank", rng.randrange(3))
+    return character
+
+
+def get_scalar_prices(character: CompactCharacter) -> dict[str, int]:
+    rules = RulesEngine(character)
+    return {"XP Usage": rules.get_total_xp_usage(), **rules.get_stats()}
+
+
+def assert_scalar_prices(characters: list[CompactCharacter]) -> None:
+    prices = price_characters(characters)
+    for index, character in enumerate(characters):
+        expected = get_scalar_prices(character)
+        assert {name: prices[name][index] for name in expected} == expected
+
+
+def test_prices_match_scalar_rules(template: CompiledTemplate):
+    characters = [get_random_character(template, seed) for seed in range(20)]
+    assert group_characters(characters) == [list(range(20))]
+    assert_scalar_prices(characters)
+
+
+def test_configs_are_grouped_by_content(template: CompiledTemplate):
+    config = template.get_character()["Config"]
+    characters = [get_random_character(template, seed) for seed in range(4)]
+    characters[1] = CompactCharacter(
+        template,
+        characters[1].get_values(),
+        characters[1].get_player_info(),
+        dict(config),
+    )
+    characters[2] = CompactCharacter(
+        template,
+        characters[2].get_values(),
+        characters[2].get_player_info(),
+        {**config, "Starting XP": config["Starting XP"] + 10},
+    )
+    assert group_characters(characters) == [[0, 1, 3], [2]]
+    assert_scalar_prices(characters)
+
+
+@pytest.mark.parametrize("full_format", [False, True])
+def test_saved_characters_are_priced_together(
+    template: CompiledTemplate, character_dirs: Path, full_format: bool
+):
+    for seed in range(6):
+        character = get_random_character(template, seed).to_character()
+        CharacterExport.to_json(
+            character_dirs.joinpath(f"character_{seed}.json"),
+            character,
+            None if full_format else template,
+        )
+    _, characters = load_characters(character_dirs)
+    assert len(characters) == 6
+    if full_format:
+        assert len({id(character.get_template()) for character in characters}) == 1
+    assert group_characters(characters) == [list(range(6))]
+    assert_scalar_prices(characters)
+
+
+def test_changed_costs_are_not_grouped(template: CompiledTemplate):
+    changed = copy.deepcopy(template.get_character())
+    skill = template.get_property_names("skill")[0]
+    tab, sub_tab, group = template.get_paths()[skill]
+    cost_table = changed["Config"]["skill_cost_table"]
+    changed["Character"][tab][sub_tab][group][skill]["cost_table"] = [
+        cost * 2 for cost in cost_table
+    ]
+    characters = [
+        get_random_character(template, 0),
+        get_random_character(CompiledTemplate(changed), 1),
+        get_random_character(CompiledTemplate(template.get_character()), 2),
+    ]
+    assert group_characters(characters) == [[0, 2], [1]]
+    assert_scalar_prices(characters)
@@ -0,0 +1,141 @@
+import json
+import random
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import pytest
+from character_io import (
+    CharacterExport,
+    CharacterImport,
+    convert_to_values_format,
+    get_character_template,
+    write_json,
+)
+from character_overlay import CharacterOverlay
+from template_compiler import CompiledTemplate, serialize_properties
+
+
+def get_values(character) -> dict[str, int]:
+    return {
+        name: int(property["value"])
+        for name, property in serialize_properties(character["Character"]).items()
+    }
+
+
+def get_random_character(template: CompiledTemplate, seed: int):
+    rng = random.Random(seed)
+    character = CharacterOverlay(template.get_character(), template)
+    for name in rng.sample(list(template.get_properties()), 40):
+        record = template.get_record(name)
+        if record.kind in ("attribute", "skill"):
+            character.set_value(name, rng.randint(record.min, record.max))
+        else:
+            character.set_value(name, 1 - record.default)
+    character.set_player_info("Name", f"Character {seed}")
+    character.set_player_info("Rank", rng.randrange(3))
+    return character.to_character()
+
+
+def write_changed_template(template_path: Path) -> None:
+    """
+    Change the starting XP, which changes the hash of the template.
+    """
+    template = json.loads(template_path.read_text())
+    template["Config"]["Starting XP"] = template["Config"]["Starting XP"] + 10
+    template_path.write_text(json.dumps(template))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_values_round_trip(template: CompiledTemplate, seed: int):
+    character = get_random_character(template, seed)
+    saved = CharacterExport.to_values(character, template)
+    assert len(saved["Values"]) < len(template.get_properties())
+    character_import = CharacterImport.from_values(json.loads(json.dumps(saved)))
+    loaded = character_import.get_character()
+    assert character_import.get_template() is template
+    assert character_import.get_warnings() == []
+    assert get_values(loaded) == get_values(character)
+    assert loaded["Player Info"] == character["Player Info"]
+    assert loaded["Config"] == character["Config"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_json_round_trip(template: CompiledTemplate, character_dirs, compact):
+    character = get_random_character(template, 1)
+    character_path = character_dirs.joinpath("character.json")
+    CharacterExport.to_json(character_path, character, template, compact=compact)
+    assert "Values" in json.loads(character_path.read_text())
+    loaded = CharacterImport.from_json(character_path).get_character()
+    assert get_values(loaded) == get_values(character)
+
+
+def test_full_format_is_kept_without_template(template: CompiledTemplate, tmp_path):
+    character = get_random_character(template, 2)
+    character_path = tmp_path.joinpath("character.json")
+    CharacterExport.to_json(character_path, character)
+    assert json.loads(character_path.read_text()) == json.loads(json.dumps(character))
+
+    assert convert_to_values_format(character_path, template)
+    loaded = CharacterImport.from_json(character_path)
+    assert loaded.get_template() is template
+    assert get_values(loaded.get_character()) == get_values(character)
+
+
+def test_changed_template_is_reported(template: CompiledTemplate):
+    saved = CharacterExport.to_values(get_random_character(template, 3), template)
+    write_changed_template(get_character_template())
+    character_import = CharacterImport.from_values(saved)
+    assert character_import.get_template() is not template
+    assert len(character_import.get_warnings()) == 1
+    assert "has changed" in character_import.get_warnings()[0]
+
+
+def test_saved_template_is_kept(template: CompiledTemplate):
+    character = get_random_character(template, 4)
+    saved = CharacterExport.to_values(character, template)
+    template_path = get_character_template()
+    template_path.with_name("template_v1.json").write_bytes(template_path.read_bytes())
+    write_changed_template(template_path)
+    character_import = CharacterImport.from_values(saved)
+    assert character_import.get_warnings() == []
+    assert character_import.get_template().get_digest() == template.get_digest()
+    assert get_values(character_import.get_character()) == get_values(character)
+
+
+def test_unknown_values_are_left_out(template: CompiledTemplate):
+    character = get_random_character(template, 5)
+    saved = CharacterExport.to_values(character, template)
+    saved["Values"]["Removed Trait"] = 1
+    character_import = CharacterImport.from_values(saved)
+    assert "Removed Trait" in character_import.get_warnings()[0]
+    assert get_values(character_import.get_character()) == get_values(character)
+
+
+def test_write_keeps_file_mode(character_dirs: Path):
+    json_path = character_dirs.joinpath("character.json")
+    write_json(json_path, {"Name": "First"})
+    json_path.chmod(0o640)
+    write_json(json_path, {"Name": "Second"})
+    assert json.loads(json_path.read_text()) == {"Name": "Second"}
+    assert stat.S_IMODE(json_path.stat().st_mode) == 0o640
+
+
+def test_failed_write_keeps_file(character_dirs: Path):
+    json_path = character_dirs.joinpath("character.json")
+    write_json(json_path, {"Name": "First"})
+    with pytest.raises(TypeError):
+        write_json(json_path, {"Name": object()})
+    assert json.loads(json_path.read_text()) == {"Name": "First"}
+    assert [path.name for path in character_dirs.iterdir()] == ["character.json"]
+
+
+def test_threads_never_share_temporary_file(character_dirs: Path):
+    json_path = character_dirs.joinpath("character.json")
+    contents = [{"Name": str(index) * 5000} for index in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(5):
+            list(executor.map(partial(write_json, json_path), contents))
+            assert json.loads(json_path.read_text()) in contents
+    assert [path.name for path in character_dirs.iterdir()] == ["character.json"]
@@ -0,0 +1,96 @@
+import io
+import re
+from pathlib import Path
+
+import pytest
+from character_io import CharacterExport
+from character_overlay import CharacterOverlay
+from character_pdf import (
+    CharacterToPdf,
+    PdfExportIndex,
+    export_directory,
+    get_pdf_stats,
+)
+from reportlab import rl_config
+from template_compiler import CompiledTemplate
+
+PAGE_PATTERN = re.compile(rb"/Type /Page\b(?!s)")
+
+
+@pytest.fixture(autouse=True)
+def invariant_pdfs(monkeypatch: pytest.MonkeyPatch):
+    """
+    Leave out the creation time and random document id, so that the same
+    sheets give the same bytes.
+    """
+    monkeypatch.setattr(rl_config, "invariant", 1)
+
+
+def get_sheet(template: CompiledTemplate, checked: bool):
+    """
+    The template character, with every trait, psychotic disadvantage and
+    expertise checked if checked is set.
+    """
+    character = CharacterOverlay(template.get_character(), template)
+    if checked:
+        for record in template.get_records():
+            if record.kind in ("trait", "psychotic", "expertise"):
+                character.set_value(record.name, 1)
+    sheet = character.to_character()
+    return sheet, get_pdf_stats(sheet, template)
+
+
+def count_pages(pdf: bytes) -> int:
+    return len(PAGE_PATTERN.findall(pdf))
+
+
+def save_character(template: CompiledTemplate, character_path: Path, name: str):
+    character = CharacterOverlay(template.get_character(), template)
+    character.set_player_info("Name", name)
+    CharacterExport.to_json(character_path, character.to_character(), template)
+
+
+def test_pdfs_are_named_after_files(
+    template: CompiledTemplate, character_dirs: Path, tmp_path: Path
+):
+    for file_name in ("first.json", "second.json"):
+        save_character(template, character_dirs.joinpath(file_name), "Same Name")
+    pdf_dir = tmp_path.joinpath("pdf")
+    assert export_directory(character_dirs, pdf_dir, max_workers=2) == 0
+    assert sorted(path.name for path in pdf_dir.glob("*.pdf")) == [
+        "first.pdf",
+        "second.pdf",
+    ]
+    export_index = PdfExportIndex(pdf_dir)
+    for file_name in ("first.json", "second.json"):
+        assert export_index._exports[file_name]["pdf"] == Path(file_name).stem + ".pdf"
+
+
+@pytest.mark.parametrize("checked, num_pages", [(False, 1), (True, 3)])
+def test_sheet_overflows_to_new_pages(
+    template: CompiledTemplate, checked: bool, num_pages: int
+):
+    assert count_pages(CharacterToPdf.to_bytes(*get_sheet(template, checked))) == (
+        num_pages
+    )
+
+
+def test_bytes_match_document(template: CompiledTemplate, tmp_path: Path):
+    sheet = get_sheet(template, True)
+    pdf_buffer = io.BytesIO()
+    CharacterToPdf.write_pdfs([sheet], pdf_buffer)
+    assert pdf_buffer.getvalue() == CharacterToPdf.to_bytes(*sheet)
+
+    pdf_path = tmp_path.joinpath("sheet.pdf")
+    CharacterToPdf(*sheet, pdf_path).write_pdf()
+    assert pdf_path.read_bytes() == pdf_buffer.getvalue()
+
+
+def test_document_shares_header_form(template: CompiledTemplate):
+    pdf_buffer = io.BytesIO()
+    CharacterToPdf.write_pdfs(
+        [get_sheet(template, False), get_sheet(template, True)], pdf_buffer
+    )
+    pdf = pdf_buffer.getvalue()
+    assert count_pages(pdf) == 4
+    assert pdf.count(b"/Subtype /Form") == 1
@@ -0,0 +1,73 @@
+import copy
+import random
+from pathlib import Path
+
+from character_io import CharacterExport
+from compact_character import CompactCharacter
+from template_compiler import CompiledTemplate, get_structure_digest
+
+
+def get_random_character(template: CompiledTemplate, seed: int) -> CompactCharacter:
+    rng = random.Random(seed)
+    character = CompactCharacter(template)
+    for name in rng.sample(list(template.get_properties()), 40):
+        record = template.get_record(name)
+        if record.kind in ("attribute", "skill"):
+            character.set_value(name, rng.randint(record.min, record.max))
+        else:
+            character.set_value(name, 1 - record.default)
+    character.set_player_info("Name", f"Character {seed}")
+    return character
+
+
+def assert_same_character(first: CompactCharacter, second: CompactCharacter) -> None:
+    assert list(first.get_values()) == list(second.get_values())
+    assert first.get_player_info() == second.get_player_info()
+    assert first.get_config() == second.get_config()
+
+
+def test_round_trip(template: CompiledTemplate):
+    character = get_random_character(template, 0)
+    nested = character.to_character()
+    assert_same_character(CompactCharacter.from_character(nested, template), character)
+    assert_same_character(CompactCharacter.from_character(nested), character)
+
+
+def test_round_trip_through_files(template: CompiledTemplate, character_dirs: Path):
+    character = get_random_character(template, 0)
+    for full_format in (False, True):
+        character_path = character_dirs.joinpath(f"character_{full_format}.json")
+        CharacterExport.to_json(
+            character_path, character.to_character(), None if full_format else template
+        )
+        loaded = CompactCharacter.from_json(character_path)
+        assert_same_character(loaded, character)
+        if not full_format:
+            assert loaded.get_template() is template
+
+
+def test_characters_of_the_same_structure_share_a_template(
+    template: CompiledTemplate,
+):
+    # Copies, so the nested characters do not share the tree of the template
+    nested = [
+        copy.deepcopy(get_random_character(template, seed).to_character())
+        for seed in range(3)
+    ]
+    characters = [CompactCharacter.from_character(character) for character in nested]
+    shared = characters[0].get_template()
+    assert shared is not template
+    assert all(character.get_template() is shared for character in characters)
+    assert shared.get_structure_digest() == get_structure_digest(nested[2])
+    for character, nested_character in zip(characters, nested):
+        assert character.to_character() == nested_character
+
+
+def test_copy_is_independent(template: CompiledTemplate):
+    character = get_random_character(template, 0)
+    copied = character.copy()
+    assert_same_character(copied, character)
+    copied.set_value("Strength", copied.get_value("Strength") + 1)
+    copied.set_player_info("Name", "Other")
+    assert copied.get_value("Strength") == character.get_value("Strength") + 1
+    assert character.get_player_info("Name") == "Character 0"
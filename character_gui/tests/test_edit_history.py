@@ -0,0 +1,53 @@
+from edit_history import EditHistory
+
+
+def test_toggles_are_not_merged():
+    history = EditHistory()
+    history.record([("value", "Hardened Veteran", False, True)])
+    history.record([("value", "Hardened Veteran", True, False)])
+    assert history.undo() == [("value", "Hardened Veteran", True, False)]
+    assert history.undo() == [("value", "Hardened Veteran", False, True)]
+    assert not history.can_undo()
+
+
+def test_continuous_changes_are_merged():
+    history = EditHistory()
+    history.record([("value", "Strength", 3, 4)], merge=True)
+    history.record([("value", "Strength", 4, 5)], merge=True)
+    assert history.undo() == [("value", "Strength", 3, 5)]
+    assert not history.can_undo()
+
+
+def test_merge_back_to_start_drops_step():
+    history = EditHistory()
+    history.record([("value", "Strength", 3, 4)], merge=True)
+    history.record([("value", "Strength", 4, 3)], merge=True)
+    assert not history.can_undo()
+
+
+def test_continuous_change_is_not_merged_into_toggle():
+    history = EditHistory()
+    history.record([("value", "Strength", 3, 4)])
+    history.record([("value", "Strength", 4, 5)], merge=True)
+    assert history.undo() == [("value", "Strength", 4, 5)]
+    assert history.undo() == [("value", "Strength", 3, 4)]
+
+
+def test_changes_after_merge_seconds_are_not_merged():
+    history = EditHistory(merge_seconds=0)
+    history.record([("player_info", "Name", "", "A")], merge=True)
+    history.record([("player_info", "Name", "A", "Al")], merge=True)
+    assert history.undo() == [("player_info", "Name", "A", "Al")]
+
+
+def test_undo_and_redo():
+    history = EditHistory()
+    changes = [("value", "Strength", 3, 4), ("value", "Agility", 3, 5)]
+    history.record(changes)
+    assert history.undo() == list(reversed(changes))
+    assert history.can_redo()
+    assert history.redo() == changes
+    assert not history.can_redo()
+    history.undo()
+    history.record([("value", "Psyche", 3, 4)])
+    assert not history.can_redo()
@@ -0,0 +1,212 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from character_io import CharacterExport, CharacterImport
+from character_overlay import CharacterOverlay
+from edit_journal import EditJournal, get_owner, recover_journal, recover_journals
+from template_compiler import CompiledTemplate
+
+
+def get_dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def set_owner(journal_path: Path, host: str, pid: int) -> None:
+    lines = journal_path.read_text().splitlines()
+    header = json.loads(lines[0])
+    header.update(host=host, pid=pid)
+    lines[0] = json.dumps(header)
+    journal_path.write_text("\n".join(lines) + "\n")
+
+
+def create_journal(
+    template: CompiledTemplate, directory: Path, base: str | None = None
+) -> EditJournal:
+    stem = Path(base).stem if base else "new_character"
+    return EditJournal.create(directory, stem, base, template.get_file_name())
+
+
+def save_character(template: CompiledTemplate, character_path: Path, name: str):
+    character = CharacterOverlay(template.get_character(), template)
+    character.set_player_info("Name", name)
+    CharacterExport.to_json(character_path, character.to_character(), template)
+
+
+def load_values(character_path: Path) -> CharacterOverlay:
+    character_import = CharacterImport.from_json(character_path)
+    return CharacterOverlay(
+        character_import.get_character(), character_import.get_template()
+    )
+
+
+def test_sessions_have_separate_journals(template: CompiledTemplate, character_dirs):
+    first = create_journal(template, character_dirs)
+    second = create_journal(template, character_dirs)
+    assert first.get_path() != second.get_path()
+    first.append_value("Strength", 4, 3)
+    second.append_value("Charisma", 4, 3)
+    second.append_value("Psyche", 4, 3)
+
+    first.compact("first.json", first.get_sequence())
+    assert not first.get_path().exists()
+    second.flush()
+    header, entries = EditJournal.read(second.get_path())
+    assert header["base"] is None
+    assert [entry["property"] for entry in entries] == ["Charisma", "Psyche"]
+
+
+def test_changes_are_written_on_flush(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs)
+    journal.append_value("Strength", 4, 3)
+    assert journal.has_buffered()
+    assert not journal.get_path().exists()
+    journal.flush()
+    assert not journal.has_buffered()
+    journal.append_value("Strength", 5, 4)
+    journal.flush()
+    header, entries = EditJournal.read(journal.get_path())
+    assert header["base"] is None
+    assert [entry["value"] for entry in entries] == [4, 5]
+
+
+def test_failed_flush_keeps_changes(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs.joinpath("missing"))
+    journal.append_value("Strength", 4, 3)
+    with pytest.raises(OSError):
+        journal.flush()
+    assert journal.has_buffered()
+    character_dirs.joinpath("missing").mkdir()
+    journal.append_value("Strength", 5, 4)
+    journal.flush()
+    _, entries = EditJournal.read(journal.get_path())
+    assert [entry["seq"] for entry in entries] == [1, 2]
+
+
+def test_compact_keeps_later_changes(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs)
+    for value in range(1, 6):
+        journal.append_value("Strength", value, value - 1)
+    journal.compact("saved.json", 3)
+    assert journal.get_count() == 2
+    header, entries = EditJournal.read(journal.get_path())
+    assert header["base"] == "saved.json"
+    assert header["pid"] == os.getpid()
+    assert [entry["seq"] for entry in entries] == [4, 5]
+
+    journal.append_value("Strength", 6, 5)
+    journal.compact("saved.json", journal.get_sequence())
+    assert not journal.get_path().exists()
+    assert journal.get_count() == 0
+
+
+def test_cut_short_line_is_ignored(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs)
+    journal.append_value("Strength", 4, 3)
+    journal.append_value("Strength", 5, 4)
+    journal.flush()
+    content = journal.get_path().read_text()
+    journal.get_path().write_text(content[:-10])
+    _, entries = EditJournal.read(journal.get_path())
+    assert [entry["value"] for entry in entries] == [4]
+
+
+def test_replay_matches_edits(template: CompiledTemplate, character_dirs):
+    character = CharacterOverlay(template.get_character(), template)
+    journal = create_journal(template, character_dirs)
+    edits = [("Strength", 5), ("Shooting: Aimed", 2), ("Strength", 4)]
+    for name, value in edits:
+        journal.append_value(name, value, character.set_value(name, value))
+    old_name = character.get_player_info("Name")
+    character.set_player_info("Name", "Replayed Marine")
+    journal.append_player_info("Name", "Replayed Marine", old_name)
+    journal.flush()
+
+    replayed = CharacterOverlay(template.get_character(), template)
+    EditJournal.replay(replayed, EditJournal.read(journal.get_path())[1])
+    assert replayed.get_changes() == character.get_changes()
+    assert replayed.get_player_info() == character.get_player_info()
+
+
+def test_recover_orphaned_journal(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs)
+    journal.append_player_info("Name", "Lost Marine", "Test Player")
+    journal.append_value("Strength", 5, 3)
+    journal.flush()
+    set_owner(journal.get_path(), get_owner()["host"], get_dead_pid())
+
+    recovered, replacing = recover_journals(character_dirs)
+    assert recovered == [character_dirs.joinpath("lost_marine.json")]
+    assert replacing == []
+    assert not journal.get_path().exists()
+    assert load_values(recovered[0]).get_value("Strength") == 5
+
+
+@pytest.mark.parametrize(
+    "host, pid",
+    [
+        ("another-computer", 1),
+        (None, os.getpid()),
+        (None, os.getppid()),
+    ],
+)
+def test_journals_in_use_are_left_alone(
+    template: CompiledTemplate, character_dirs, host, pid
+):
+    journal = create_journal(template, character_dirs)
+    journal.append_value("Strength", 5, 3)
+    journal.flush()
+    set_owner(journal.get_path(), host or get_owner()["host"], pid)
+    assert recover_journals(character_dirs) == ([], [])
+    assert journal.get_path().exists()
+
+
+def test_replacing_a_character_is_asked(template: CompiledTemplate, character_dirs):
+    base_path = character_dirs.joinpath("marine.json")
+    save_character(template, base_path, "Marine")
+    journal = create_journal(template, character_dirs, base_path.name)
+    journal.append_value("Strength", 5, 3)
+    journal.flush()
+    set_owner(journal.get_path(), get_owner()["host"], get_dead_pid())
+
+    assert recover_journals(character_dirs) == ([], [(journal.get_path(), base_path)])
+    assert load_values(base_path).get_value("Strength") == 3
+    assert recover_journal(journal.get_path()) == base_path
+    assert load_values(base_path).get_value("Strength") == 5
+
+
+def test_character_without_name_is_asked(template: CompiledTemplate, character_dirs):
+    journal = create_journal(template, character_dirs)
+    journal.append_value("Strength", 5, 3)
+    journal.flush()
+    set_owner(journal.get_path(), get_owner()["host"], get_dead_pid())
+
+    character_path = character_dirs.joinpath("test_player.json")
+    assert recover_journals(character_dirs) == (
+        [],
+        [(journal.get_path(), character_path)],
+    )
+    assert not character_path.exists()
+    assert recover_journal(journal.get_path()) == character_path
+    assert load_values(character_path).get_value("Strength") == 5
+
+
+def test_recovery_keeps_full_format(template: CompiledTemplate, character_dirs):
+    character = CharacterOverlay(template.get_character(), template)
+    character.set_player_info("Name", "Legacy Marine")
+    base_path = character_dirs.joinpath("legacy_marine.json")
+    CharacterExport.to_json(base_path, character.to_character())
+
+    journal = create_journal(template, character_dirs, base_path.name)
+    journal.append_value("Strength", 5, character.get_value("Strength"))
+    journal.flush()
+    assert recover_journal(journal.get_path()) == base_path
+    assert "Values" not in json.loads(base_path.read_text())
+    recovered = CharacterImport.from_json(base_path)
+    assert recovered.get_template() is None
+    assert load_values(base_path).get_value("Strength") == 5
@@ -0,0 +1,73 @@
+import io
+from pathlib import Path
+
+import pytest
+from character_pdf import CharacterToPdf, get_pdf_stats
+from extra_types import NpcProfileType
+from npc_generator import export_npcs_pdf, generate_batch, save_npcs
+from reportlab import rl_config
+from rules_engine import RulesEngine
+
+PROFILE: NpcProfileType = {"speciality": None, "platoon": None, "rank": None}
+
+
+def get_template_path(character_dirs: Path) -> Path:
+    return character_dirs.parent.joinpath("template", "template.json")
+
+
+def test_npcs_follow_the_rules(character_dirs: Path):
+    characters = generate_batch(get_template_path(character_dirs), PROFILE, 1, 10)
+    for character in characters:
+        rules = RulesEngine(character)
+        assert rules.get_violations() == []
+        assert rules.get_remaining_experience_points() >= 0
+
+
+def test_batches_of_other_seeds_have_other_names(character_dirs: Path):
+    template_path = get_template_path(character_dirs)
+    names = [
+        character.get_player_info("Name")
+        for seed in (1, 2)
+        for character in generate_batch(template_path, PROFILE, seed, 5)
+    ]
+    assert len(set(names)) == 10
+
+
+def test_existing_characters_are_not_overwritten(character_dirs: Path):
+    template_path = get_template_path(character_dirs)
+    saved, skipped = save_npcs(
+        generate_batch(template_path, PROFILE, 1, 3), character_dirs
+    )
+    assert len(saved) == 3
+    assert skipped == []
+    contents = [character_path.read_bytes() for character_path in saved]
+
+    other_profile: NpcProfileType = {**PROFILE, "rank": 0}
+    saved_again, skipped = save_npcs(
+        generate_batch(template_path, other_profile, 1, 4), character_dirs
+    )
+    assert skipped == saved
+    assert len(saved_again) == 1
+    assert [character_path.read_bytes() for character_path in saved] == contents
+
+    saved_other, skipped = save_npcs(
+        generate_batch(template_path, PROFILE, 2, 3), character_dirs
+    )
+    assert len(saved_other) == 3
+    assert skipped == []
+
+
+def test_pdf_matches_the_npc_sheets(
+    character_dirs: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    characters = generate_batch(get_template_path(character_dirs), PROFILE, 1, 3)
+    pdf_path = tmp_path.joinpath("npcs.pdf")
+    export_npcs_pdf(characters, pdf_path)
+    expected = io.BytesIO()
+    sheets = []
+    for character in characters:
+        sheet = character.to_character()
+        sheets.append((sheet, get_pdf_stats(sheet, character.get_template())))
+    CharacterToPdf.write_pdfs(sheets, expected)
+    assert pdf_path.read_bytes() == expected.getvalue()
@@ -0,0 +1,80 @@
+import pytest
+from requirements import (
+    AllOf,
+    AnyOf,
+    Comparison,
+    Not,
+    Requirement,
+    compile_requirements,
+)
+
+PILOT = {
+    "any": [
+        {"Pilot: Atmospheric": {"type": ">=", "value": 3}},
+        {"Pilot: Space": {"type": ">=", "value": 3}},
+    ],
+    "not": {"Loner": {"type": "==", "value": 1}},
+}
+
+
+def get_getter(values: dict[str, int]):
+    return lambda name: values.get(name, 0)
+
+
+def test_single_comparison_is_not_grouped():
+    requirement = compile_requirements({"Strength": {"type": ">", "value": 3}})
+    assert isinstance(requirement, Comparison)
+    assert requirement.describe() == "Strength > 3"
+    assert requirement.is_fulfilled(get_getter({"Strength": 4}))
+    assert not requirement.is_fulfilled(get_getter({"Strength": 3}))
+
+
+def test_any_and_not():
+    requirement = compile_requirements(PILOT)
+    assert isinstance(requirement, AllOf)
+    assert [type(child) for child in requirement.children] == [AnyOf, Not]
+    assert requirement.get_sources() == {"Pilot: Atmospheric", "Pilot: Space", "Loner"}
+    assert requirement.is_fulfilled(get_getter({"Pilot: Space": 3}))
+    assert requirement.is_fulfilled(get_getter({"Pilot: Atmospheric": 4}))
+    assert not requirement.is_fulfilled(get_getter({"Pilot: Space": 2}))
+    assert not requirement.is_fulfilled(get_getter({"Pilot: Space": 3, "Loner": 1}))
+
+
+def test_all():
+    requirement = compile_requirements(
+        {
+            "all": [
+                {"Strength": {"type": ">=", "value": 3}},
+                {"Endurance": {"type": ">=", "value": 4}},
+            ]
+        }
+    )
+    assert isinstance(requirement, AllOf)
+    assert requirement.describe() == "(Strength >= 3 and Endurance >= 4)"
+    assert requirement.is_fulfilled(get_getter({"Strength": 3, "Endurance": 4}))
+    assert not requirement.is_fulfilled(get_getter({"Strength": 3, "Endurance": 3}))
+
+
+def test_failures_describe_failing_clauses():
+    requirement = compile_requirements(PILOT)
+    assert requirement.get_failures(get_getter({"Pilot: Space": 3})) == []
+    assert requirement.get_failures(get_getter({"Pilot: Space": 2, "Loner": 1})) == [
+        "(Pilot: Atmospheric >= 3 or Pilot: Space >= 3)",
+        "not Loner == 1",
+    ]
+    comparison = compile_requirements({"Psyche": {"type": "<=", "value": 2}})
+    assert comparison.get_failures(get_getter({"Psyche": 4})) == ["Psyche <= 2 (is 4)"]
+
+
+def test_unknown_comparison():
+    with pytest.raises(ValueError):
+        compile_requirements({"Strength": {"type": "=>", "value": 3}})
+
+
+def test_incomplete_requirement_can_not_be_created():
+    class OnlyFulfilled(Requirement):
+        def is_fulfilled(self, get_value) -> bool:
+            return True
+
+    with pytest.raises(TypeError):
+        OnlyFulfilled()
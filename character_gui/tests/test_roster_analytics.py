@@ -0,0 +1,61 @@
+import random
+from pathlib import Path
+
+import pytest
+from character_io import CharacterExport
+from compact_character import CompactCharacter
+from roster_analytics import (
+    RosterAggregate,
+    analyze_character_files,
+    analyze_directory,
+)
+from template_compiler import CompiledTemplate
+
+
+def save_random_characters(
+    template: CompiledTemplate, character_dirs: Path, count: int
+) -> None:
+    rng = random.Random(0)
+    config = template.get_character()["Config"]
+    for seed in range(count):
+        character = CompactCharacter(template)
+        for name in rng.sample(list(template.get_properties()), 30):
+            record = template.get_record(name)
+            if record.kind in ("attribute", "skill"):
+                character.set_value(name, rng.randint(record.min, record.max))
+            else:
+                character.set_value(name, 1 - record.default)
+        character.set_player_info("Name", f"Character {seed}")
+        character.set_player_info("Speciality", rng.choice(config["specialities"]))
+        character.set_player_info("Platoon", rng.choice(config["platoons"]))
+        CharacterExport.to_json(
+            character_dirs.joinpath(f"character_{seed}.json"),
+            character.to_character(),
+            template,
+        )
+    character_dirs.joinpath("broken.json").write_text("{")
+
+
+def test_failures_are_reported(
+    template: CompiledTemplate, character_dirs: Path, capsys: pytest.CaptureFixture
+):
+    save_random_characters(template, character_dirs, 2)
+    aggregate = analyze_directory(character_dirs)
+    assert aggregate.num_characters == 2
+    assert aggregate.failed == ["broken.json"]
+    assert capsys.readouterr().out.startswith("broken.json: FAILED JSONDecodeError(")
+
+
+def test_merged_aggregates_match_a_single_pass(
+    template: CompiledTemplate, character_dirs: Path
+):
+    save_random_characters(template, character_dirs, 12)
+    character_files = sorted(character_dirs.glob("*.json"))
+    expected = analyze_character_files(character_files).get_summary()
+    assert expected["Characters"] == 12
+
+    merged = RosterAggregate()
+    for start in range(3):
+        merged.merge(analyze_character_files(character_files[start::3]))
+    assert merged.get_summary() == expected
+    assert analyze_directory(character_dirs, max_workers=2).get_summary() == expected
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+import pytest
+from character_io import CharacterExport
+from character_overlay import CharacterOverlay
+from roster_index import RosterIndex
+from template_compiler import CompiledTemplate
+
+
+@pytest.fixture
+def roster_dir(template: CompiledTemplate, character_dirs: Path) -> Path:
+    for name in ("Alpha One", "Bravo Two"):
+        character = CharacterOverlay(template.get_character(), template)
+        character.set_player_info("Name", name)
+        file_name = name.replace(" ", "_").lower() + ".json"
+        CharacterExport.to_json(
+            character_dirs.joinpath(file_name), character.to_character(), template
+        )
+    return character_dirs
+
+
+def get_names(directory: Path) -> list[str]:
+    roster = RosterIndex(directory)
+    roster.refresh()
+    return [entry["name"] for entry in roster.get_entries()]
+
+
+def test_index_is_reused(roster_dir: Path):
+    roster = RosterIndex(roster_dir)
+    assert roster.refresh()
+    assert not RosterIndex(roster_dir).refresh()
+    assert get_names(roster_dir) == ["Alpha One", "Bravo Two"]
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        lambda entry: entry.pop("hash"),
+        lambda entry: entry.update(size="12"),
+        lambda entry: entry.update(file="../alpha_one.json"),
+        lambda entry: entry.clear(),
+    ],
+)
+def test_bad_entries_are_indexed_again(roster_dir: Path, damage):
+    RosterIndex(roster_dir).refresh()
+    index_path = roster_dir.joinpath(RosterIndex.file_name)
+    index = json.loads(index_path.read_text())
+    damage(index["entries"][0])
+    index["entries"].append("not an entry")
+    index_path.write_text(json.dumps(index))
+
+    roster = RosterIndex(roster_dir)
+    assert len(roster.get_entries()) == 1
+    assert roster.refresh()
+    assert get_names(roster_dir) == ["Alpha One", "Bravo Two"]
+
+
+@pytest.mark.parametrize("content", ["", "[]", '{"version": 1, "entries": 3}'])
+def test_unreadable_index_is_rebuilt(roster_dir: Path, content: str):
+    roster_dir.joinpath(RosterIndex.file_name).write_text(content)
+    assert get_names(roster_dir) == ["Alpha One", "Bravo Two"]
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+from character_io import CharacterExport
+from character_overlay import CharacterOverlay
+from rules_engine import CostLedger, RulesEngine, validate_directory
+from template_compiler import CompiledTemplate
+
+
+def get_random_value(rules: RulesEngine, name: str, rng: random.Random) -> int:
+    property = rules.get_properties()[name]
+    kind = rules.get_property_kind(name)
+    if kind == "skill":
+        max_value = min(property["max"], len(rules.get_cost_table(name)) - 1)
+        return rng.randint(property["min"], max_value)
+    if kind == "attribute":
+        return rng.randint(property["min"], property["max"])
+    return rng.randint(0, 1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_ledger_matches_full_recompute(template: CompiledTemplate, seed: int):
+    rng = random.Random(seed)
+    character = CharacterOverlay(template.get_character(), template)
+    rules = RulesEngine(character)
+    ledger = CostLedger(rules, verify=False)
+    names = list(rules.get_properties())
+    for _ in range(300):
+        name = rng.choice(names)
+        new_value = get_random_value(rules, name, rng)
+        old_value = character.set_value(name, new_value)
+        ledger.apply(name, old_value, new_value)
+        assert ledger.get_total_xp_usage() == rules.get_total_xp_usage()
+        assert (
+            ledger.get_remaining_experience_points()
+            == rules.get_remaining_experience_points()
+        )
+        assert ledger.get_attribute_points() == rules.get_attribute_points()
+        assert ledger.get_extra_attribute_points() == rules.get_extra_attribute_points()
+        assert (
+            ledger.get_remaining_psycho_points() == rules.get_remaining_psycho_points()
+        )
+        assert ledger.get_remaining_traits() == rules.get_remaining_traits()
+        assert ledger.get_checked_properties() == [
+            name
+            for name in names
+            if rules.get_property_kind(name) in CostLedger.checked_kinds
+            and character.get_value(name)
+        ]
+
+
+def test_ledger_verify_detects_drift(template: CompiledTemplate):
+    character = CharacterOverlay(template.get_character(), template)
+    rules = RulesEngine(character)
+    ledger = CostLedger(rules, verify=False)
+    # Changed without telling the ledger
+    character.set_value("Strength", character.get_value("Strength") + 2)
+    with pytest.raises(AssertionError):
+        ledger.verify()
+    ledger.recompute()
+    ledger.verify()
+
+
+def test_skill_cost_uses_cost_table(template: CompiledTemplate):
+    character = CharacterOverlay(template.get_character(), template)
+    rules = RulesEngine(character)
+    skill = template.get_property_names("skill")[0]
+    cost_table = rules.get_cost_table(skill)
+    before = rules.get_total_xp_usage()
+    old_value = character.set_value(skill, 2)
+    assert rules.get_total_xp_usage() - before == cost_table[2] - cost_table[old_value]
+
+
+def test_violations_report_requirements(template: CompiledTemplate):
+    character = CharacterOverlay(template.get_character(), template)
+    character.set_value("ARM Sympathizer", 1)
+    character.set_value("Live long and prosper", 1)
+    violations = RulesEngine(character).get_violations()
+    assert {"ARM Sympathizer", "Live long and prosper"} <= {
+        violation["property"] for violation in violations
+    }
+
+
+def test_validate_directory(template: CompiledTemplate, character_dirs):
+    character = CharacterOverlay(template.get_character(), template)
+    CharacterExport.to_json(
+        character_dirs.joinpath("valid.json"), character.to_character(), template
+    )
+    character_dirs.joinpath("broken.json").write_text("{")
+    reports = validate_directory(character_dirs, max_workers=1)
+    reports = {path.name: report for path, report in reports.items()}
+    assert reports["valid.json"]["Violations"] == []
+    assert reports["broken.json"]["Violations"][0]["property"] == "broken.json"
@@ -0,0 +1,104 @@
+import copy
+import json
+import pickle
+from pathlib import Path
+
+import pytest
+import template_compiler
+from template_compiler import (
+    CompiledTemplate,
+    get_compiled_location,
+    get_structure_digest,
+    load_template,
+)
+
+
+@pytest.fixture
+def template_path(character_dirs: Path) -> Path:
+    template_compiler._compiled_templates.clear()
+    return character_dirs.parent.joinpath("template", "template.json")
+
+
+def get_compiled_path(template_path: Path) -> Path:
+    return get_compiled_location(
+        template_path, load_template(template_path).get_digest()
+    )
+
+
+def test_cache_restores_prepared_template(template_path: Path):
+    compiled = load_template(template_path)
+    compiled_path = get_compiled_path(template_path)
+    assert compiled_path.is_file()
+
+    template_compiler._compiled_templates.clear()
+    cached = load_template(template_path)
+    assert cached is not compiled
+    assert cached.get_prepared() == compiled.get_prepared()
+    for name in compiled.get_properties():
+        assert cached.get_wrapped_tooltip(name) == compiled.get_wrapped_tooltip(name)
+    tab, sub_tab = "Traits", next(iter(cached.get_character()["Character"]["Traits"]))
+    layout = cached.get_layout(tab, sub_tab, CompiledTemplate.layout_columns)
+    sub_tab_data = cached.get_character()["Character"][tab][sub_tab]
+    assert all(
+        category is sub_tab_data[label]
+        for column in layout
+        for label, category in column.items()
+    )
+
+
+class WritesFile:
+    def __reduce__(self):
+        return (Path.touch, (Path(self.path),))
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"not json",
+        b'{"version": 4}',
+        b'{"version": 4, "digest": "", "prepared": []}',
+        b"[1, 2, 3]",
+    ],
+)
+def test_damaged_cache_is_compiled_again(template_path: Path, content: bytes):
+    compiled_path = get_compiled_path(template_path)
+    compiled_path.write_bytes(content)
+    template_compiler._compiled_templates.clear()
+    template = load_template(template_path)
+    expected = CompiledTemplate(template.get_character())
+    expected.prepare()
+    assert template.get_prepared() == expected.get_prepared()
+    assert json.loads(compiled_path.read_text())["version"] == template.version
+
+
+def test_cache_is_never_unpickled(template_path: Path, tmp_path: Path):
+    compiled_path = get_compiled_path(template_path)
+    payload = WritesFile()
+    payload.path = tmp_path.joinpath("unpickled")
+    compiled_path.write_bytes(pickle.dumps(payload))
+    template_compiler._compiled_templates.clear()
+    load_template(template_path)
+    assert not payload.path.exists()
+
+
+def test_cache_of_other_template_is_ignored(template_path: Path):
+    compiled_path = get_compiled_path(template_path)
+    compiled = json.loads(compiled_path.read_text())
+    compiled["prepared"]["tooltips"]["Strength"] = "Changed"
+    compiled["digest"] = "0" * 64
+    compiled_path.write_text(json.dumps(compiled))
+    template_compiler._compiled_templates.clear()
+    assert load_template(template_path).get_wrapped_tooltip("Strength") != "Changed"
+
+
+def test_structure_digest_ignores_values(template_path: Path):
+    template = load_template(template_path)
+    character = copy.deepcopy(template.get_character())
+    tab, sub_tab, group = template.get_paths()["Strength"]
+    strength = character["Character"][tab][sub_tab][group]["Strength"]
+    strength["value"] = strength["value"] + 1
+    character["Player Info"]["Name"] = "Other"
+    assert get_structure_digest(character) == template.get_structure_digest()
+
+    strength["max"] = strength["max"] + 1
+    assert get_structure_digest(character) != template.get_structure_digest()
@@ -0,0 +1,52 @@
+import pytest
+from compact_character import CompactCharacter
+from rules_engine import RulesEngine
+from template_compiler import CompiledTemplate
+from xp_planner import XpPlanner, describe_plan, parse_goals
+
+
+def get_character(template: CompiledTemplate, remaining_xp: int) -> CompactCharacter:
+    """
+    A template character with the given XP left.
+    """
+    character = CompactCharacter(template)
+    config = dict(template.get_character()["Config"])
+    config["Starting XP"] = RulesEngine(character).get_total_xp_usage() + remaining_xp
+    return CompactCharacter(template, config=config)
+
+
+def test_plan_within_xp(template: CompiledTemplate):
+    plan = XpPlanner(get_character(template, 6)).plan("Pilot: Space 3")
+    assert plan["possible"]
+    assert plan["steps"] == [{"property": "Pilot: Space", "old": 0, "new": 3, "xp": 6}]
+    assert plan["xp"] == 6
+    assert plan["remaining_xp"] == 0
+
+
+def test_plan_over_xp_is_not_possible(template: CompiledTemplate):
+    plan = XpPlanner(get_character(template, 5)).plan("Pilot: Space 3")
+    assert not plan["possible"]
+    assert plan["steps"] == []
+    assert plan["remaining_xp"] == 5
+    assert "with the 5 XP left" in describe_plan(plan)
+
+
+@pytest.mark.parametrize("remaining_xp", [0, -10])
+def test_reached_goals_need_no_xp(template: CompiledTemplate, remaining_xp: int):
+    character = get_character(template, remaining_xp)
+    plan = XpPlanner(character).plan("Pilot: Space 0")
+    assert plan["possible"]
+    assert plan["steps"] == []
+    assert plan["remaining_xp"] == remaining_xp
+
+
+def test_plan_does_not_change_character(template: CompiledTemplate):
+    character = get_character(template, 100)
+    values = list(character.get_values())
+    XpPlanner(character).plan("Pilot: Space 3 + Strength 5")
+    assert list(character.get_values()) == values
+
+
+def test_unknown_goal(template: CompiledTemplate):
+    with pytest.raises(ValueError):
+        parse_goals("Flying 3", XpPlanner(CompactCharacter(template)).get_known_goals())
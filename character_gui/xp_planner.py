@@ -0,0 +1,311 @@
+import re
+
+from character_overlay import CharacterOverlay
+from compact_character import CompactCharacter
+from extra_types import PlanStepType, XpPlanType
+from requirements import COMPARISONS, AllOf, AnyOf, Comparison, Requirement
+from rules_engine import RulesEngine
+
+GOAL_PATTERN = re.compile(
+    r"^(?P<source>.+?)\s*(?P<type>>=|<=|==|!=|>|<)?\s*(?P<value>-?\d+)$"
+)
+
+
+def parse_goals(goals: str, known: set[str]) -> Requirement:
+    """
+    Parse goals separated by '+', such as 'Pilot: Space 3 + Hardened Veteran'.
+    A goal is a property or stat name, optionally followed by a comparison
+    and a value. Without a comparison the value is a minimum, and without a
+    value the property must be bought.
+    """
+    children: list[Requirement] = []
+    for goal in goals.split("+"):
+        goal = goal.strip()
+        if not goal:
+            continue
+        if goal in known:
+            children.append(Comparison(goal, ">=", 1))
+            continue
+        match = GOAL_PATTERN.match(goal)
+        if match is None or match["source"] not in known:
+            raise ValueError(f"Unknown goal '{goal}'")
+        comparison = match["type"] or ">="
+        if comparison not in COMPARISONS:
+            raise ValueError(f"Unknown comparison in goal '{goal}'")
+        children.append(Comparison(match["source"], comparison, int(match["value"])))
+    if not children:
+        raise ValueError("No goals given")
+    if len(children) == 1:
+        return children[0]
+    return AllOf(children)
+
+
+class XpPlanner:
+    """
+    Find the cheapest purchases that make a character reach a set of goals.
+
+    Purchases only raise values: skill levels, attributes and checked
+    traits, expertise and psychotic disadvantages. A plan is valid when the
+    goals and the requirements of everything the character has are
+    fulfilled, and it does not use more XP, traits or psycho points than are
+    available.
+
+    The search is a branch and bound over the first unfulfilled requirement:
+    each way to fulfil it is tried in turn, branches costing more than the XP
+    left or at least as much as the best plan found are cut, and states
+    already visited are skipped.
+    When every branch ends in a requirement that can not be fulfilled by
+    buying, such as a rank or a disadvantage that must not be taken, the
+    goals are impossible.
+    """
+
+    # Derived stats that grow with a single attribute
+    stat_attributes = {
+        "Carry Capacity": "Strength",
+        "Combat Load": "Strength",
+        "Psycho Limit": "Psyche",
+        "Stress Limit": "Psyche",
+        "Stunt Cap": "Charisma",
+        "Leadership Points": "Charisma",
+        "Health": "Endurance",
+    }
+
+    def __init__(
+        self,
+        character: CharacterOverlay | CompactCharacter,
+        extensions: dict[str, bool] | None = None,
+    ) -> None:
+        """
+        Properties of an extension set to False in extensions are never
+        bought. Without extensions, every property can be bought.
+        """
+        if isinstance(character, CharacterOverlay):
+            character = CompactCharacter.from_overlay(character)
+        else:
+            character = character.copy()
+        self._character = character
+        self._template = character.get_template()
+        self._rules = RulesEngine(character)
+        self._requirements = self._template.get_requirements()
+        self._extensions = extensions or dict()
+
+    def get_known_goals(self) -> set[str]:
+        return set(self._rules.get_properties()) | set(self._rules.get_stats())
+
+    def _get_max_value(self, name: str) -> int:
+        record = self._template.get_record(name)
+        if record.kind in ("trait", "psychotic", "expertise"):
+            return 1
+        max_value = record.max if record.max is not None else 0
+        if record.kind == "skill":
+            cost_table = self._rules.get_cost_table(name)
+            max_value = min(max_value, len(cost_table) - 1)
+        return max_value
+
+    def _can_buy(self, name: str, value: int) -> bool:
+        record = self._template.get_record(name)
+        if record.extended is not None and not self._extensions.get(
+            record.extended, True
+        ):
+            return False
+        return self._character.get_value(name) < value <= self._get_max_value(name)
+
+    def _find_unfulfilled(self, requirement: Requirement) -> Requirement | None:
+        """
+        The first comparison or alternative of a requirement that is not
+        fulfilled.
+        """
+        if isinstance(requirement, AllOf):
+            for child in requirement.children:
+                unfulfilled = self._find_unfulfilled(child)
+                if unfulfilled is not None:
+                    return unfulfilled
+            return None
+        if requirement.is_fulfilled(self._rules.get_value):
+            return None
+        return requirement
+
+    def _find_next(self, goals: Requirement) -> Requirement | None:
+        unfulfilled = self._find_unfulfilled(goals)
+        if unfulfilled is not None:
+            return unfulfilled
+        for name, requirement in self._requirements.items():
+            if self._character.get_value(name):
+                unfulfilled = self._find_unfulfilled(requirement)
+                if unfulfilled is not None:
+                    return unfulfilled
+        return None
+
+    def _get_comparison_fix(self, comparison: Comparison) -> tuple[str, int] | None:
+        """
+        The smallest purchase fulfilling a comparison, if there is one.
+        """
+        source = comparison.source
+        if source in self.stat_attributes:
+            attribute = self.stat_attributes[source]
+            old_value = self._character.get_value(attribute)
+            fix = None
+            for value in range(old_value + 1, self._get_max_value(attribute) + 1):
+                self._character.set_value(attribute, value)
+                if comparison.is_fulfilled(self._rules.get_value):
+                    fix = (attribute, value)
+                    break
+            self._character.set_value(attribute, old_value)
+            return fix
+        if source not in self._rules.get_properties():
+            return None
+
+        value = self._character.get_value(source)
+        if comparison.type in (">=", "=="):
+            value = comparison.value
+        elif comparison.type in (">", "!="):
+            value = max(value, comparison.value) + 1
+        if not self._can_buy(source, value):
+            return None
+        return (source, value)
+
+    def _get_fixes(self, requirement: Requirement) -> list[tuple[str, int]]:
+        """
+        Every single purchase that brings a requirement closer to fulfilled,
+        cheapest first.
+        """
+        if isinstance(requirement, Comparison):
+            fix = self._get_comparison_fix(requirement)
+            return [fix] if fix is not None else []
+        if not isinstance(requirement, AnyOf):
+            return []
+        fixes = []
+        for child in requirement.children:
+            unfulfilled = self._find_unfulfilled(child)
+            if unfulfilled is not None:
+                for fix in self._get_fixes(unfulfilled):
+                    if fix not in fixes:
+                        fixes.append(fix)
+        return sorted(fixes, key=self._get_fix_cost)
+
+    def _get_fix_cost(self, fix: tuple[str, int]) -> int:
+        name, value = fix
+        old_value = self._character.set_value(name, value)
+        cost = self._rules.get_total_xp_usage()
+        self._character.set_value(name, old_value)
+        return cost
+
+    def _within_pools(self) -> bool:
+        return (
+            self._rules.get_remaining_traits() >= self._min_remaining_traits
+            and self._rules.get_remaining_psycho_points()
+            >= self._min_remaining_psycho_points
+        )
+
+    def _search(self, goals: Requirement, purchases: list[tuple[str, int]]) -> None:
+        cost = self._rules.get_total_xp_usage()
+        if cost >= self._best_cost:
+            return
+        if cost > self._max_cost:
+            self._over_budget = True
+            return
+        state = tuple(self._character.get_values())
+        if state in self._visited:
+            return
+        self._visited.add(state)
+        if not self._within_pools():
+            return
+
+        requirement = self._find_next(goals)
+        if requirement is None:
+            self._best_cost = cost
+            self._best_purchases = list(purchases)
+            return
+        fixes = self._get_fixes(requirement)
+        if not fixes and not self._dead_end:
+            self._dead_end = requirement.describe()
+        for name, value in fixes:
+            old_value = self._character.set_value(name, value)
+            purchases.append((name, value))
+            self._search(goals, purchases)
+            purchases.pop()
+            self._character.set_value(name, old_value)
+
+    def _get_steps(self, purchases: list[tuple[str, int]]) -> list[PlanStepType]:
+        """
+        The purchases in buying order, requirements before what needs them,
+        with the XP of each step.
+        """
+        new_values: dict[str, int] = dict()
+        for name, value in reversed(purchases):
+            new_values[name] = max(value, new_values.get(name, value))
+        steps: list[PlanStepType] = []
+        old_values = []
+        for name, value in new_values.items():
+            cost = self._rules.get_total_xp_usage()
+            old_value = self._character.set_value(name, value)
+            old_values.append((name, old_value))
+            steps.append(
+                {
+                    "property": name,
+                    "old": old_value,
+                    "new": value,
+                    "xp": self._rules.get_total_xp_usage() - cost,
+                }
+            )
+        for name, old_value in reversed(old_values):
+            self._character.set_value(name, old_value)
+        return steps
+
+    def plan(self, goals: Requirement | str) -> XpPlanType:
+        """
+        The cheapest purchases reaching the goals, see parse_goals() for goals
+        given as text.
+        """
+        if isinstance(goals, str):
+            goals = parse_goals(goals, self.get_known_goals())
+        initial_cost = self._rules.get_total_xp_usage()
+        remaining_xp = self._rules.get_remaining_experience_points()
+        # A character already over its XP can only reach goals it has
+        self._max_cost = initial_cost + max(0, remaining_xp)
+        self._min_remaining_traits = min(0, self._rules.get_remaining_traits())
+        self._min_remaining_psycho_points = min(
+            0, self._rules.get_remaining_psycho_points()
+        )
+        self._best_cost = float("inf")
+        self._best_purchases: list[tuple[str, int]] | None = None
+        self._visited: set[tuple[int, ...]] = set()
+        self._dead_end = ""
+        self._over_budget = False
+        self._search(goals, [])
+
+        if self._best_purchases is None:
+            reason = "No purchases fulfil the goals"
+            if self._over_budget:
+                reason = f"{reason} with the {max(0, remaining_xp)} XP left"
+            elif self._dead_end:
+                reason = f"{reason}, {self._dead_end} can not be bought"
+            return {
+                "possible": False,
+                "reason": reason,
+                "steps": [],
+                "xp": 0,
+                "remaining_xp": remaining_xp,
+            }
+        xp = int(self._best_cost - initial_cost)
+        return {
+            "possible": True,
+            "reason": "",
+            "steps": self._get_steps(self._best_purchases),
+            "xp": xp,
+            "remaining_xp": remaining_xp - xp,
+        }
+
+
+def describe_plan(plan: XpPlanType) -> str:
+    if not plan["possible"]:
+        return plan["reason"] + "."
+    if not plan["steps"]:
+        return "The goals are already reached."
+    lines = []
+    for step in plan["steps"]:
+        lines.append(
+            f"{step['property']}: {step['old']} -> {step['new']} ({step['xp']} XP)"
+        )
+    lines.append(f"Total {plan['xp']} XP, {plan['remaining_xp']} XP left.")
+    return "\n".join(lines)